@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+
+import os
+import csv
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import platform
+import subprocess
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from urllib.parse import quote
+
+from matcher import MATCH_ENGINES, MATCHER_VERSION, URLMatcher, clean_url, current_rss_mb, peak_rss_mb
+
+logger = logging.getLogger('url_matcher.benchmark')
+
+# Version of the benchmark corpus and results layout; bump it whenever a change
+# alters the generated corpora, so results of different versions aren't compared
+BENCHMARK_VERSION = '1'
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+LIVE_HOST = 'https://www.example.com'
+STAGING_HOST = 'https://staging.example.com'
+
+SECTIONS = [
+    'blog', 'news', 'products', 'services', 'support', 'about', 'resources',
+    'case-studies', 'events', 'careers', 'solutions', 'partners', 'docs', 'shop',
+]
+SUBSECTIONS = [
+    'guides', 'tips', 'how-to', 'reviews', 'announcements', 'releases', 'faq',
+    'tutorials', 'insights', 'webinars', 'pricing', 'features', '2022', '2023', '2024',
+]
+SLUG_WORDS = [
+    'best', 'practices', 'guide', 'complete', 'ultimate', 'introduction', 'advanced',
+    'cloud', 'migration', 'security', 'data', 'analytics', 'marketing', 'seo', 'content',
+    'strategy', 'customer', 'experience', 'platform', 'integration', 'api', 'mobile',
+    'design', 'performance', 'team', 'growth', 'tools', 'checklist', 'benchmark',
+    'report', 'trends', 'future', 'small', 'business', 'enterprise', 'pricing', 'update',
+    'launch', 'new', 'how', 'to', 'why', 'what', 'top', 'ten', 'ways', 'improve', 'build',
+]
+# Words with characters that live sites usually serve percent-encoded
+ACCENTED_WORDS = {
+    'café': 'cafe', 'résumé': 'resume', 'naïve': 'naive', 'über': 'uber',
+    'señor': 'senor', 'façade': 'facade', 'jalapeño': 'jalapeno', 'crème': 'creme',
+}
+
+# How each Live page changes in the migration, with the share of pages it applies to:
+#   unchanged       same URL on the staging site
+#   trailing_slash  trailing slash added or removed
+#   slug_change     a slug word replaced, dropped or added, or hyphens turned into underscores
+#   folder_move     page moved to another section, or a sub-folder added or removed
+#   encoded         slug has a percent-encoded character, kept or transliterated on staging
+#   host_swap       same path served from the staging host
+#   removed         no staging counterpart; as many staging-only pages are added
+MIGRATION_MIX = {
+    'unchanged': 0.30,
+    'trailing_slash': 0.10,
+    'slug_change': 0.20,
+    'folder_move': 0.15,
+    'encoded': 0.05,
+    'host_swap': 0.10,
+    'removed': 0.10,
+}
+
+
+class MigrationCorpus:
+    """A synthetic site migration: Live and Staging URLs with the known correct mapping.
+
+    Attributes:
+        rows (int): Number of Live pages
+        seed (int): Random seed the corpus was generated from
+        live_urls (list): Live URLs, as written to the CSV
+        staging_urls (list): Staging URLs, in CSV order
+        truth (dict): Cleaned Live URL -> cleaned Staging URL it moved to, or None if removed
+        kinds (dict): Cleaned Live URL -> MIGRATION_MIX change applied to it
+    """
+
+    def __init__(self, rows, seed, mix=None):
+        self.rows = rows
+        self.seed = seed
+        self.mix = mix or MIGRATION_MIX
+        self.live_urls = []
+        self.staging_urls = []
+        self.truth = {}
+        self.kinds = {}
+        self._rng = random.Random(seed)
+        self._used_paths = set()
+        self._generate()
+
+    def _slug(self, page_id, accented=None):
+        rng = self._rng
+        words = rng.sample(SLUG_WORDS, rng.randint(2, 5))
+        if accented:
+            words.insert(rng.randint(0, len(words)), accented)
+        if rng.random() < 0.3:
+            words.append(str(page_id))
+        return '-'.join(words)
+
+    def _unique(self, segments, page_id):
+        """Join path segments, suffixing the slug with the page ID if the path is taken."""
+        path = '/' + '/'.join(segments)
+        if path in self._used_paths:
+            segments = segments[:-1] + [f"{segments[-1]}-{page_id}"]
+            path = '/' + '/'.join(segments)
+        self._used_paths.add(path)
+        return segments
+
+    def _live_segments(self, page_id, accented=None):
+        rng = self._rng
+        segments = [rng.choice(SECTIONS)]
+        if rng.random() < 0.6:
+            segments.append(rng.choice(SUBSECTIONS))
+        segments.append(self._slug(page_id, accented))
+        return self._unique(segments, page_id)
+
+    def _change_slug(self, slug):
+        rng = self._rng
+        words = slug.split('-')
+        change = rng.choice(('replace', 'drop', 'add', 'underscores'))
+        if change == 'replace':
+            words[rng.randrange(len(words))] = rng.choice(SLUG_WORDS)
+        elif change == 'drop' and len(words) > 2:
+            del words[rng.randrange(len(words))]
+        elif change == 'add':
+            words.insert(rng.randint(0, len(words)), rng.choice(SLUG_WORDS))
+        else:
+            return '_'.join(words)
+        return '-'.join(words)
+
+    def _move_folder(self, segments):
+        rng = self._rng
+        segments = list(segments)
+        change = rng.choice(('section', 'subsection'))
+        if change == 'section':
+            segments[0] = rng.choice([s for s in SECTIONS if s != segments[0]])
+        elif len(segments) == 3:
+            del segments[1]
+        else:
+            segments.insert(1, rng.choice(SUBSECTIONS))
+        return segments
+
+    def _generate(self):
+        rng = self._rng
+        kinds, weights = zip(*self.mix.items())
+        removed = 0
+
+        for page_id in range(self.rows):
+            kind = rng.choices(kinds, weights)[0]
+            trailing = '/' if rng.random() < 0.5 else ''
+            accented = rng.choice(list(ACCENTED_WORDS)) if kind == 'encoded' else None
+            segments = self._live_segments(page_id, accented)
+            live_path = '/' + '/'.join(segments) + trailing
+            live_url = LIVE_HOST + quote(live_path)
+
+            staging_host = LIVE_HOST
+            staging_segments = segments
+            staging_trailing = trailing
+            if kind == 'trailing_slash':
+                staging_trailing = '' if trailing else '/'
+            elif kind == 'slug_change':
+                staging_segments = segments[:-1] + [self._change_slug(segments[-1])]
+            elif kind == 'folder_move':
+                staging_segments = self._move_folder(segments)
+            elif kind == 'encoded' and rng.random() < 0.5:
+                staging_segments = segments[:-1] + [segments[-1].replace(accented, ACCENTED_WORDS[accented])]
+            elif kind == 'host_swap':
+                staging_host = STAGING_HOST
+
+            self.live_urls.append(live_url)
+            cleaned_live = clean_url(live_url)
+            self.kinds[cleaned_live] = kind
+            if kind == 'removed':
+                self.truth[cleaned_live] = None
+                removed += 1
+                continue
+
+            if staging_segments is not segments:
+                staging_segments = self._unique(staging_segments, page_id)
+            staging_url = staging_host + '/' + '/'.join(staging_segments) + staging_trailing
+            self.staging_urls.append(staging_url)
+            self.truth[cleaned_live] = clean_url(staging_url)
+
+        # Pages only found on the staging site
+        for page_id in range(self.rows, self.rows + removed):
+            self.staging_urls.append(LIVE_HOST + '/' + '/'.join(self._live_segments(page_id)) + '/')
+
+        # Staging URLs are listed independently of the Live URLs
+        rng.shuffle(self.staging_urls)
+
+    def write_csv(self, path):
+        """Write the corpus as a Live_URL, Staging_URL CSV file."""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(['Live_URL', 'Staging_URL'])
+            for i in range(max(len(self.live_urls), len(self.staging_urls))):
+                writer.writerow([
+                    self.live_urls[i] if i < len(self.live_urls) else '',
+                    self.staging_urls[i] if i < len(self.staging_urls) else '',
+                ])
+
+    def score(self, matches):
+        """Measure how well a run recovered the migration.
+
+        Args:
+            matches (dict): Cleaned Live URL -> cleaned Staging URL it was matched to
+
+        Returns:
+            dict: precision (share of matches that are correct), recall (share of
+                moved pages matched correctly), f1, false_match_rate (share of removed
+                pages matched to something) and recall per migration change
+        """
+        moved = [url for url, target in self.truth.items() if target is not None]
+        removed = len(self.truth) - len(moved)
+        correct = sum(1 for url, target in matches.items() if self.truth.get(url) == target)
+        false_matches = sum(1 for url in matches if url in self.truth and self.truth[url] is None)
+
+        precision = correct / len(matches) if matches else 0.0
+        recall = correct / len(moved) if moved else 0.0
+
+        recall_by_kind = {}
+        for kind in self.mix:
+            if kind == 'removed':
+                continue
+            urls = [url for url in moved if self.kinds[url] == kind]
+            if urls:
+                recall_by_kind[kind] = sum(1 for url in urls if matches.get(url) == self.truth[url]) / len(urls)
+
+        return {
+            'precision': precision,
+            'recall': recall,
+            'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            'false_match_rate': false_matches / removed if removed else 0.0,
+            'recall_by_kind': recall_by_kind,
+        }
+
+
+def run_case(csv_path, options, verbose=False):
+    """Run the matcher once on a corpus CSV; meant to run in a fresh process.
+
+    Args:
+        csv_path (str): Corpus CSV file
+        options (dict): URLMatcher keyword arguments
+        verbose (bool): Keep the matcher's info logging
+
+    Returns:
+        dict: timings, metrics, summary, match_types, matches (cleaned Live URL ->
+            Staging URL), rss_before_mb and peak_rss_mb
+    """
+    if not verbose:
+        logging.getLogger('url_matcher').setLevel(logging.WARNING)
+
+    rss_before = current_rss_mb()
+    with tempfile.TemporaryDirectory() as output_dir:
+        result = URLMatcher(csv_path, output_dir=output_dir, **options).run()
+    if result is None:
+        raise RuntimeError(f"The matcher could not load {csv_path}")
+
+    matches = {m['Live_URL']: m['Staging_URL'] for m in result.results['exact_matches']}
+    matches.update((m['Live_URL'], m['Staging_URL']) for m in result.results['partial_matches'])
+    return {
+        'timings': result.timings,
+        'metrics': result.metrics,
+        'summary': result.summary,
+        'match_types': result.match_types,
+        'matches': matches,
+        'rss_before_mb': rss_before,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_benchmark(sizes, engines, seed=1, repeat=1, threshold=0.7, workers=1, top_k=50,
+                  corpus_dir=None, verbose=False):
+    """Time the matcher on synthetic migration corpora of each size with each engine.
+
+    Every run happens in a new process, so peak memory is measured per run.
+    With repeat > 1 the fastest time of each stage and the highest peak
+    memory are kept.
+
+    Args:
+        sizes (list): Corpus sizes, in Live pages
+        engines (list): Partial matching engines to benchmark
+        seed (int): Random seed of the corpora
+        repeat (int): Runs per case
+        threshold (float): Similarity threshold
+        workers (int): Partial matching processes
+        top_k (int): Indexed engine candidate count
+        corpus_dir (str): Directory to keep the generated CSVs in (default: a temporary directory)
+        verbose (bool): Keep the matcher's info logging
+
+    Returns:
+        dict: Benchmark results, as saved by save_results()
+    """
+    results = {
+        'benchmark_version': BENCHMARK_VERSION,
+        'matcher_version': MATCHER_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'cases': [],
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir = corpus_dir or tmp_dir
+        os.makedirs(corpus_dir, exist_ok=True)
+        context = multiprocessing.get_context('spawn')
+
+        for rows in sizes:
+            started = time.monotonic()
+            corpus = MigrationCorpus(rows, seed)
+            csv_path = os.path.join(corpus_dir, f"migration_{rows}_seed{seed}.csv")
+            corpus.write_csv(csv_path)
+            logger.info(f"Generated a {rows}-page corpus in {time.monotonic() - started:.2f}s: {csv_path}")
+
+            for engine in engines:
+                options = {'similarity_threshold': threshold, 'engine': engine, 'top_k': top_k, 'workers': workers}
+                name = f"{engine}-{rows}"
+                case = None
+                for attempt in range(repeat):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        run = executor.submit(run_case, csv_path, options, verbose).result()
+                    if case is None:
+                        case = {
+                            'name': name,
+                            'rows': rows,
+                            'seed': seed,
+                            'options': options,
+                            'timings': run['timings'],
+                            'counters': run['metrics']['counters'],
+                            'rss_before_mb': run['rss_before_mb'],
+                            'peak_rss_mb': run['peak_rss_mb'],
+                            'summary': run['summary'],
+                            'match_types': run['match_types'],
+                            'quality': corpus.score(run['matches']),
+                        }
+                    else:
+                        case['timings'] = {stage: min(seconds, run['timings'].get(stage, seconds))
+                                           for stage, seconds in case['timings'].items()}
+                        case['peak_rss_mb'] = max(case['peak_rss_mb'], run['peak_rss_mb'])
+                case['repeat'] = repeat
+                results['cases'].append(case)
+                logger.info(f"{name}: {case['timings']['total']:.2f}s total, "
+                            f"{case['peak_rss_mb']:.0f} MB peak, recall {case['quality']['recall']:.3f}, "
+                            f"precision {case['quality']['precision']:.3f}")
+
+    return results
+
+
+def git_commit():
+    """Return the commit checked out next to this file, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results, path):
+    """Save benchmark results as JSON."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path):
+    """Load benchmark results saved with save_results()."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_results(baseline, current, time_tolerance=0.10, memory_tolerance=0.10,
+                    quality_tolerance=0.005, min_seconds=0.05):
+    """Compare two benchmark results case by case.
+
+    Cases are paired by name, seed and options. A stage is a regression when
+    it got more than time_tolerance slower and at least min_seconds slower,
+    so sub-second noise on small corpora isn't flagged.
+
+    Args:
+        baseline (dict): Earlier results
+        current (dict): Results to check
+        time_tolerance (float): Allowed relative slowdown per stage
+        memory_tolerance (float): Allowed relative growth of peak memory
+        quality_tolerance (float): Allowed absolute drop of precision, recall and f1
+        min_seconds (float): Slowdowns smaller than this are never regressions
+
+    Returns:
+        tuple: (rows, regressions); rows are (case, metric, baseline, current, change,
+            regressed) for every compared value, regressions the messages of regressed ones
+    """
+    if baseline.get('benchmark_version') != current.get('benchmark_version'):
+        raise ValueError("The results were made with different benchmark versions and can't be compared")
+
+    def case_key(case):
+        return case['name'], case['seed'], json.dumps(case['options'], sort_keys=True)
+
+    baseline_cases = {case_key(case): case for case in baseline['cases']}
+    rows = []
+    regressions = []
+
+    def add(case, metric, old, new, regressed):
+        change = (new - old) / old if old else None
+        rows.append((case['name'], metric, old, new, change, regressed))
+        if regressed:
+            change_text = f" ({change:+.1%})" if change is not None else ''
+            regressions.append(f"{case['name']} {metric}: {old:.4g} -> {new:.4g}{change_text}")
+
+    for case in current['cases']:
+        old_case = baseline_cases.get(case_key(case))
+        if old_case is None:
+            logger.warning(f"No baseline for {case['name']} with these options")
+            continue
+
+        for stage, seconds in case['timings'].items():
+            old = old_case['timings'].get(stage)
+            if old is not None:
+                add(case, f"{stage} seconds", old, seconds,
+                    seconds > old * (1 + time_tolerance) and seconds - old >= min_seconds)
+
+        old, new = old_case.get('peak_rss_mb'), case.get('peak_rss_mb')
+        if old is not None and new is not None:
+            add(case, 'peak memory MB', old, new, new > old * (1 + memory_tolerance))
+
+        for metric in ('precision', 'recall', 'f1'):
+            old, new = old_case['quality'][metric], case['quality'][metric]
+            add(case, metric, old, new, new < old - quality_tolerance)
+
+    return rows, regressions
+
+
+def print_comparison(rows):
+    """Print the rows of compare_results() as a table."""
+    print(f"{'case':<22} {'metric':<22} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, metric, old, new, change, regressed in rows:
+        change_text = f"{change:+.1%}" if change is not None else ''
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:<22} {metric:<22} {old:>10.4g} {new:>10.4g} {change_text:>8}{flag}")
+
+
+def print_results(results):
+    """Print benchmark results as a table."""
+    stages = []
+    for case in results['cases']:
+        stages.extend(stage for stage in case['timings'] if stage not in stages)
+
+    header = f"{'case':<22}" + ''.join(f"{stage:>10}" for stage in stages)
+    print(header + f"{'peak MB':>10}{'precision':>11}{'recall':>8}")
+    for case in results['cases']:
+        timings = ''.join(f"{case['timings'][stage]:>10.3f}" if stage in case['timings'] else f"{'':>10}"
+                          for stage in stages)
+        print(f"{case['name']:<22}{timings}{case['peak_rss_mb'] or 0:>10.0f}"
+              f"{case['quality']['precision']:>11.3f}{case['quality']['recall']:>8.3f}")
+
+
+def main():
+    """Main function to run the benchmarks from command line."""
+    parser = argparse.ArgumentParser(description='Benchmark the URL matcher on synthetic site migrations')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='Corpus sizes in Live pages')
+    parser.add_argument('--engine', '-e', dest='engines', action='append', choices=MATCH_ENGINES,
+                        help='Partial matching engine to benchmark; repeat for several (default: indexed)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed of the generated corpora')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs per case; the fastest time of each stage is kept')
+    parser.add_argument('--threshold', '-t', type=float, default=0.7,
+                        help='Similarity threshold for partial matching (0.0 to 1.0)')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Number of processes used for partial matching')
+    parser.add_argument('--top-k', type=int, default=50,
+                        help='Number of candidates scored per Live URL by the indexed engine')
+    parser.add_argument('--corpus-dir', default=None,
+                        help='Keep the generated corpus CSVs in this directory')
+    parser.add_argument('--output', '-o', default=None,
+                        help='File to save the results to (default: ./benchmarks/benchmark_[timestamp].json)')
+    parser.add_argument('--results', default=None,
+                        help='Compare these saved results instead of running the benchmarks')
+    parser.add_argument('--baseline', '-b', default=None,
+                        help='Saved results to compare against; exits with status 1 on regressions')
+    parser.add_argument('--time-tolerance', type=float, default=0.10,
+                        help='Allowed relative slowdown of a stage before it is flagged')
+    parser.add_argument('--memory-tolerance', type=float, default=0.10,
+                        help='Allowed relative growth of peak memory before it is flagged')
+    parser.add_argument('--quality-tolerance', type=float, default=0.005,
+                        help='Allowed drop of precision, recall or f1 before it is flagged')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Enable the matcher\'s logging')
+
+    args = parser.parse_args()
+
+    if args.results:
+        results = load_results(args.results)
+    else:
+        results = run_benchmark(args.sizes, args.engines or ['indexed'], seed=args.seed, repeat=args.repeat,
+                                threshold=args.threshold, workers=args.workers, top_k=args.top_k,
+                                corpus_dir=args.corpus_dir, verbose=args.verbose)
+        output = args.output or os.path.join(
+            'benchmarks', f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        save_results(results, output)
+        print(f"Benchmark results saved to {output}")
+
+    print_results(results)
+
+    if args.baseline:
+        rows, regressions = compare_results(load_results(args.baseline), results,
+                                            time_tolerance=args.time_tolerance,
+                                            memory_tolerance=args.memory_tolerance,
+                                            quality_tolerance=args.quality_tolerance)
+        print()
+        print_comparison(rows)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.baseline}:")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
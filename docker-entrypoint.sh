@@ -8,6 +8,13 @@ export DJANGO_SETTINGS_MODULE=url_matcher_project.settings_production
 echo "Waiting for database..."
 sleep 5
 
+# Run the job queue worker instead of the web server
+if [ "$1" = "worker" ]; then
+    cd /app/url_matcher_web
+    echo "Starting URL matcher worker..."
+    exec python manage.py run_matcher_worker
+fi
+
 # Create necessary directories if they don't exist
 echo "Ensuring media and static directories exist..."
 python manage.py shell -c "
@@ -38,9 +45,15 @@ python manage.py migrate --noinput
 echo "Collecting static files..."
 python manage.py collectstatic --noinput --clear
 
+# Shared directory for the Prometheus samples of the Gunicorn workers, emptied on start
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/url_matcher_prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 # Start Gunicorn server
 echo "Starting Gunicorn server..."
-exec gunicorn --bind 0.0.0.0:8000 \
+exec gunicorn --config gunicorn.conf.py \
+    --bind 0.0.0.0:8000 \
     --workers ${WORKERS:-3} \
     --timeout ${TIMEOUT:-120} \
     --access-logfile - \
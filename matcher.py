@@ -1,14 +1,53 @@
 #!/usr/bin/env python3
 
 import pandas as pd
+import numpy as np
 import re
 import os
+import csv
+import gzip
+import json
+import hashlib
+import heapq
+import sys
+import time
 import argparse
+import cProfile
 import logging
+import multiprocessing
+import random
+import shutil
+import tempfile
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from difflib import SequenceMatcher
+from itertools import islice, repeat
 from urllib.parse import urlparse, unquote
 
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Only needed for the parquet report format
+    pa = pq = None
+
+try:
+    import zstandard
+except ImportError:  # Only needed for the csv.zst report format
+    zstandard = None
+
+try:
+    import scipy.sparse as sparse
+except ImportError:  # Only needed for the ngram engine
+    sparse = None
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -20,23 +59,1385 @@ logging.basicConfig(
 )
 logger = logging.getLogger('url_matcher')
 
+# Version of the matching logic and report files; bump it whenever a change
+# alters the results for the same input, so cached results are not reused
+MATCHER_VERSION = '1'
+
+# Partial matching engines: 'exhaustive' compares every Live URL with every
+# Staging URL, 'indexed' only scores the top-K candidates from a StagingIndex,
+# 'ngram' scores every pair at once by the cosine similarity of their
+# character n-gram TF-IDF vectors (see NGramIndex), and 'lsh' only scores the
+# top-K candidates sharing a MinHash LSH band (see MinHashIndex).
+MATCH_ENGINES = ('exhaustive', 'indexed', 'ngram', 'lsh')
+
+# Live URL x Staging URL scores computed per sparse matrix product by the
+# ngram engine, which bounds the memory of each chunk
+NGRAM_CHUNK_PAIRS = 10000000
+
+# Modulus of the MinHash permutations (the Mersenne prime 2^31 - 1, so
+# products of two residues fit in 64 bits) and the number of (permutation,
+# token) values hashed per batch, which bounds the memory of signing URLs
+MINHASH_PRIME = 2147483647
+MINHASH_BATCH_TOKENS = 200000
+
+# Live URLs the lsh engine also matches exhaustively to estimate its recall
+LSH_RECALL_SAMPLE = 100
+
+# On-disk format of StagingLibrary directories and the arrays each one holds
+STAGING_LIBRARY_FORMAT = 1
+STAGING_LIBRARY_ARRAYS = ('url_bytes', 'url_offsets', 'token_hashes', 'posting_offsets', 'postings',
+                          'token_weights', 'norms')
+
+# Blocking keys: 'host' only compares URLs with the same normalized host and
+# 'section' URLs with the same first path segment (see StagingBlocks).
+BLOCKING_KEYS = ('host', 'section')
+
+# Scorers of the 'Partial - Sequence' method: 'difflib' uses
+# SequenceMatcher.ratio(), 'lcs' the ratio 2 * LCS / (len1 + len2) of the
+# longest common subsequence, computed bit-parallel (see lcs_length).
+SEQUENCE_SCORERS = ('difflib', 'lcs')
+
+# Partial match assignment modes: 'best' gives every Live URL its best Staging
+# URL independently, 'greedy' and 'optimal' assign each Staging URL to at most
+# one Live URL from the kept top candidates (see URLMatcher.assign_matches).
+ASSIGNMENT_MODES = ('best', 'greedy', 'optimal')
+
+# Candidates kept per Live URL for the greedy and optimal assignment modes,
+# unless keep_candidates asks for more
+ASSIGNMENT_CANDIDATES = 10
+
+# Pipeline stages reported to URLMatcher.progress_callback, in run order; 'recall'
+# is part of the partial stage's time and only runs with the lsh engine
+PIPELINE_STAGES = ('load', 'clean', 'exact', 'partial', 'recall', 'report')
+
+# Report formats: 'csv' writes six uncompressed CSVs, 'csv.gz' and 'csv.zst'
+# compress them, and 'parquet' writes every match and unmatched URL to a single
+# columnar file with a Match_Type column (plus the text summary in all cases).
+REPORT_FORMATS = ('csv', 'csv.gz', 'csv.zst', 'parquet')
+
+# Rows per record batch written to parquet reports
+REPORT_BATCH_SIZE = 65536
+
+# Partial matching shards are sized to roughly this many URL pair comparisons
+# (and at most PROGRESS_SHARD_SIZE Live URLs) so progress is reported regularly
+PROGRESS_SHARD_PAIRS = 1000000
+PROGRESS_SHARD_SIZE = 1000
+
+
+class MatchAborted(Exception):
+    """Raised at a progress checkpoint when a run is cancelled or exceeds its budget."""
+    
+    def __init__(self, reason, message):
+        """Create the exception.
+        
+        Args:
+            reason (str): 'cancelled', 'time_budget' or 'memory_budget'
+            message (str): Human-readable explanation
+        """
+        super().__init__(message)
+        self.reason = reason
+
+
+class MatchRunResult:
+    """Structured outcome of a URLMatcher run.
+    
+    Attributes:
+        summary (dict): Counts (total_urls, exact_matches, partial_matches,
+            unmatched_live, unmatched_staging) and, when there are Live URLs,
+            their percentages of the Live URLs
+        match_types (dict): Number of partial matches per match type
+        timings (dict): Wall-clock seconds spent per pipeline stage, plus 'total'
+        artifacts (dict): Paths of the report files written, keyed like the
+            return value of URLMatcher.generate_report(); empty if none were written.
+            Holds 'profile' too when the run was profiled
+        results (dict): The matches themselves, as in URLMatcher.results
+        aborted (str): MatchAborted reason if the run stopped early, else None
+        metrics (dict): Instrumentation of the run, see URLMatcher.collect_metrics()
+    """
+    
+    def __init__(self, summary, match_types, timings, artifacts, results, aborted=None, metrics=None):
+        self.summary = summary
+        self.match_types = match_types
+        self.timings = timings
+        self.artifacts = artifacts
+        self.results = results
+        self.aborted = aborted
+        self.metrics = metrics if metrics is not None else {}
+    
+    def to_dict(self):
+        """Get the result, without the matches themselves, as a JSON-serializable dict."""
+        return {
+            'summary': self.summary,
+            'match_types': self.match_types,
+            'timings': self.timings,
+            'artifacts': self.artifacts,
+            'aborted': self.aborted,
+            'metrics': self.metrics,
+        }
+
+
+def result_cache_key(csv_path, params):
+    """Get a key identifying the results of matching a CSV file with some parameters.
+    
+    The key is a SHA-256 digest of the file content, the parameters and
+    MATCHER_VERSION, so equal keys mean equal results.
+    
+    Args:
+        csv_path (str): Path to the CSV file
+        params (dict): URLMatcher parameters that affect the results; parameters
+            that are None are left out
+        
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    
+    normalized = {name: value for name, value in params.items() if value is not None}
+    if 'similarity_threshold' in normalized:
+        normalized['similarity_threshold'] = round(float(normalized['similarity_threshold']), 6)
+    digest.update(json.dumps({'version': MATCHER_VERSION, 'params': normalized}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def check_report_format(report_format):
+    """Check that a report format is known and its optional dependency is installed.
+    
+    Args:
+        report_format (str): One of REPORT_FORMATS
+        
+    Raises:
+        ValueError: If the format is unknown
+        ImportError: If the format needs a package that isn't installed
+    """
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format '{report_format}'. Expected one of: {', '.join(REPORT_FORMATS)}")
+    if report_format == 'parquet' and pq is None:
+        raise ImportError("The parquet report format requires pyarrow")
+    if report_format == 'csv.zst' and zstandard is None:
+        raise ImportError("The csv.zst report format requires zstandard")
+
+
+def open_report_file(path, report_format):
+    """Open a CSV report file for writing, compressed according to report_format.
+    
+    Args:
+        path (str): Path of the file
+        report_format (str): 'csv', 'csv.gz' or 'csv.zst'
+        
+    Returns:
+        file: A text file object
+    """
+    if report_format == 'csv.gz':
+        return gzip.open(path, 'wt', newline='')
+    if report_format == 'csv.zst':
+        return zstandard.open(path, 'wt', newline='')
+    return open(path, 'w', newline='')
+
+
+def read_report_file(path):
+    """Read a report file written in any of REPORT_FORMATS.
+    
+    Args:
+        path (str): Path of the file; the format is taken from its extension
+        
+    Returns:
+        DataFrame: The report's rows
+    """
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    # Scores are read back exactly as they were written
+    return pd.read_csv(path, keep_default_na=False, float_precision='round_trip')
+
+
+def current_rss_mb():
+    """Return the resident memory of this process in MB, or None if it can't be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    
+    # Fall back to the peak resident size where /proc isn't available
+    return peak_rss_mb(children=False)
+
+
+def peak_rss_mb(children=True):
+    """Return the peak resident memory in MB, or None if it can't be read.
+    
+    Args:
+        children (bool): Also consider finished child processes, such as
+            partial matching workers, and return the largest peak of any of them
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def cpu_seconds():
+    """Return the CPU time used by this process and its finished child processes."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class URLFeatures:
+    """Parsed parts of a cleaned URL, computed once and shared by every matching strategy."""
+    
+    __slots__ = ('url', 'host', 'path', 'segments', 'segment_set', 'segment_count', 'length')
+    
+    def __init__(self, url):
+        """Parse a cleaned URL.
+        
+        Args:
+            url (str): Cleaned URL
+        """
+        parsed = urlparse(url)
+        self.url = url
+        self.host = parsed.netloc
+        self.path = parsed.path
+        self.segments = tuple(parsed.path.strip('/').split('/'))
+        self.segment_set = frozenset(self.segments)
+        self.segment_count = len(self.segments)
+        self.length = len(url)
+
+
+def url_tokens(features, ngram_size=3):
+    """Split a URL into the tokens used for candidate generation.
+
+    Args:
+        features (URLFeatures): Parsed URL
+        ngram_size (int): Length of the character n-grams taken from the host and path
+
+    Returns:
+        set: Host, path segment and host+path n-gram tokens
+    """
+    host = features.host.lower()
+    path = features.path.lower()
+    tokens = set()
+    if host:
+        tokens.add('h:' + host)
+    segments = [segment for segment in path.split('/') if segment]
+    # Root-only URLs share an empty path segment, which calculate_similarity scores as a path match
+    tokens.update('s:' + segment for segment in segments or [''])
+    text = host + path
+    tokens.update('g:' + text[i:i + ngram_size] for i in range(len(text) - ngram_size + 1))
+    return tokens
+
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(value):
+        return bin(value).count('1')
+
+
+def lcs_masks(pattern):
+    """Build the match masks of a pattern for lcs_length.
+
+    Args:
+        pattern (str): Pattern, usually a Live URL
+
+    Returns:
+        dict: Bit i of a character's mask is set where pattern[i] is that character
+    """
+    masks = {}
+    for i, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+
+def lcs_length(masks, length, text, minimum=0):
+    """Get the length of the longest common subsequence of a pattern and a text.
+
+    Runs the bit-parallel LCS algorithm (Allison-Dix, Hyyrö): one bit per pattern
+    character, updated with a few integer operations per text character, so a
+    pair costs O(len(text) * len(pattern) / word size) instead of the cubic worst
+    case of SequenceMatcher. The zero bits count the LCS of the text read so far,
+    which can grow by at most one per remaining character; once that can't reach
+    minimum the scan stops.
+
+    Args:
+        masks (dict): lcs_masks() of the pattern
+        length (int): Length of the pattern
+        text (str): Text, usually a Staging URL
+        minimum (int): LCS length the caller needs
+
+    Returns:
+        int: LCS length, or None if it is below minimum
+    """
+    full = (1 << length) - 1
+    bits = full
+    # Set bits beyond this limit leave too few zeros to reach minimum
+    limit = length - minimum + len(text)
+    for char in text:
+        limit -= 1
+        mask = masks.get(char)
+        if mask is not None:
+            matches = bits & mask
+            bits = ((bits + matches) | (bits - matches)) & full
+        if popcount(bits) > limit:
+            return None
+    lcs = length - popcount(bits)
+    return lcs if lcs >= minimum else None
+
+
+def clean_url(url):
+    """Clean and standardize a single URL.
+    
+    Args:
+        url (str): Raw URL from the CSV file
+        
+    Returns:
+        str: Cleaned URL, or an empty string for missing values
+    """
+    if pd.isna(url) or not isinstance(url, str):
+        return ""
+    
+    # Remove leading/trailing whitespace
+    url = url.strip()
+    
+    # Ensure URL starts with http if it doesn't already
+    if url and not url.startswith('http'):
+        if url.startswith('/'):
+            url = 'http:/' + url  # Add http: to path-only URLs
+        else:
+            url = 'http://' + url  # Add http:// to domain-only URLs
+        
+    # Remove duplicate slashes (but preserve http:// and https://)
+    url = re.sub(r'(?<!:)/{2,}', '/', url)
+    
+    # URL decode
+    url = unquote(url)
+    
+    return url
+
+
+def normalize_urls(urls):
+    """Clean a column of URLs with vectorized string operations.
+    
+    Produces the same output as applying clean_url to every value, but each
+    distinct raw value is normalized only once and the results are mapped back
+    to the rows.
+    
+    Args:
+        urls (pd.Series): Raw URLs
+        
+    Returns:
+        pd.Series: Cleaned URLs with the same index, empty strings for missing values
+    """
+    codes, uniques = pd.factorize(urls)
+    uniques = pd.Series(uniques, dtype=object)
+    
+    # Missing and non-string values clean to an empty string
+    is_text = uniques.map(lambda url: isinstance(url, str)).astype(bool)
+    cleaned = uniques.where(is_text, "").astype(str).str.strip()
+    
+    # Ensure URLs start with http: path-only URLs get 'http:/', domains get 'http://'
+    needs_scheme = (cleaned != "") & ~cleaned.str.startswith('http')
+    path_only = needs_scheme & cleaned.str.startswith('/')
+    cleaned = cleaned.mask(path_only, 'http:/' + cleaned)
+    cleaned = cleaned.mask(needs_scheme & ~path_only, 'http://' + cleaned)
+    
+    # Remove duplicate slashes (but preserve http:// and https://)
+    cleaned = cleaned.str.replace(r'(?<!:)/{2,}', '/', regex=True)
+    
+    # URL decode, only needed where an escape can occur
+    encoded = cleaned.str.contains('%', regex=False)
+    cleaned[encoded] = cleaned[encoded].map(unquote)
+    
+    # The trailing empty string maps missing values (code -1) back to ""
+    values = np.append(cleaned.to_numpy(dtype=object), "")
+    return pd.Series(values[codes], index=urls.index, dtype=object)
+
+
+class StagingIndex:
+    """Inverted token index over Staging URLs used to generate partial match candidates."""
+
+    def __init__(self, staging_features, ngram_size=3, max_df=0.5):
+        """Build the index once over the distinct Staging URLs.
+
+        Args:
+            staging_features (list): URLFeatures of the distinct Staging URLs, in the
+                order they should be scored
+            ngram_size (int): Length of the character n-grams taken from URL hosts and paths
+            max_df (float): Tokens found in more than this fraction of Staging URLs are
+                only used when a Live URL shares no rarer token with any Staging URL
+        """
+        self.size = len(staging_features)
+        self.ngram_size = ngram_size
+        
+        postings = {}
+        for position, features in enumerate(staging_features):
+            for token in url_tokens(features, ngram_size):
+                postings.setdefault(token, []).append(position)
+        
+        # Weight tokens by inverse document frequency so rare tokens dominate
+        total = max(self.size, 1)
+        self.postings = {token: np.array(positions, dtype=np.int32) for token, positions in postings.items()}
+        self.weights = {token: np.log(1 + total / len(positions)) for token, positions in postings.items()}
+        self.max_postings = max(1, int(max_df * total))
+        
+        # Normalize scores by each Staging URL's total token weight
+        norms = np.zeros(self.size)
+        for token, positions in self.postings.items():
+            norms[positions] += self.weights[token] ** 2
+        self.norms = np.sqrt(np.maximum(norms, 1e-12))
+    
+    def lookup(self, tokens):
+        """Get the postings and weight of each token found in the index.
+        
+        Args:
+            tokens (iterable): Tokens of a URL (see url_tokens)
+            
+        Returns:
+            list: (positions, weight) per token found, in token order
+        """
+        return [(self.postings[token], self.weights[token]) for token in tokens if token in self.postings]
+    
+    def _scores(self, found):
+        """Accumulate weighted token overlap scores for the given (positions, weight) pairs."""
+        if not found:
+            return None
+        positions = [p for p, _ in found]
+        weights = [np.full(len(p), weight) for p, weight in found]
+        return np.bincount(np.concatenate(positions), weights=np.concatenate(weights),
+                           minlength=self.size) / self.norms
+    
+    def candidates(self, features, top_k):
+        """Return the positions of the top-K Staging URLs sharing tokens with a URL.
+
+        Args:
+            features (URLFeatures): Parsed Live URL to find candidates for
+            top_k (int): Maximum number of candidates to return
+
+        Returns:
+            list: Staging URL positions in ascending order, so ties resolve exactly
+                as they do in an exhaustive scan
+        """
+        shared = self.lookup(url_tokens(features, self.ngram_size))
+        rare = [(positions, weight) for positions, weight in shared if len(positions) <= self.max_postings]
+        scores = self._scores(rare) if rare else self._scores(shared)
+        if scores is None:
+            return []
+        
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            # Highest scores first, lowest position first among equal scores
+            order = np.lexsort((matched, -scores[matched]))
+            matched = np.sort(matched[order[:top_k]])
+        return matched.tolist()
+
+
+def token_hash(token):
+    """Get a stable 64-bit hash of an index token, by which StagingLibrary looks tokens up."""
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little')
+
+
+class MappedStagingIndex(StagingIndex):
+    """StagingIndex over the memory-mapped postings of a StagingLibrary.
+    
+    Tokens are found by binary search of their token_hash in a sorted array, so
+    opening the index creates no per-token objects. Two tokens sharing a hash
+    (odds of about T^2 / 2^65 for T tokens) would share postings, which only
+    affects which candidates are picked, never their scores.
+    """
+    
+    def __init__(self, library):
+        """Map the index of a library.
+        
+        Args:
+            library (StagingLibrary): Library holding the index
+        """
+        self.library = library
+        self.size = library.count
+        self.ngram_size = library.metadata['ngram_size']
+        self.max_postings = library.metadata['max_postings']
+        self.token_hashes = library.arrays['token_hashes']
+        self.posting_offsets = library.arrays['posting_offsets']
+        self.positions = library.arrays['postings']
+        self.token_weights = library.arrays['token_weights']
+        self.norms = library.arrays['norms']
+    
+    def __reduce__(self):
+        # Worker processes map the library's files again instead of receiving a copy
+        return MappedStagingIndex, (self.library,)
+    
+    def lookup(self, tokens):
+        """Get the postings and weight of each token found in the index.
+        
+        Args:
+            tokens (iterable): Tokens of a URL (see url_tokens)
+            
+        Returns:
+            list: (positions, weight) per token found, in token order
+        """
+        hashes = np.array([token_hash(token) for token in tokens], dtype=np.uint64)
+        if not len(hashes) or not len(self.token_hashes):
+            return []
+        slots = np.minimum(np.searchsorted(self.token_hashes, hashes), len(self.token_hashes) - 1)
+        found = self.token_hashes[slots] == hashes
+        return [(self.positions[self.posting_offsets[slot]:self.posting_offsets[slot + 1]], self.token_weights[slot])
+                for slot in slots[found].tolist()]
+
+
+class StagingLibrary:
+    """Cleaned, distinct Staging URLs of a site and their candidate index, saved to disk once.
+    
+    build() normalizes the Staging URLs and writes them, with the postings of a
+    StagingIndex over them, as .npy arrays to a directory. Opening a library
+    memory-maps the arrays read-only, so it costs next to nothing, and every
+    process matching against the same library shares one copy of the index
+    through the page cache. Matching several Live URL files against the same
+    staging site this way skips re-cleaning and re-indexing its URLs.
+    """
+    
+    def __init__(self, path):
+        """Open a library saved by build().
+        
+        Args:
+            path (str): Directory of the library
+            
+        Raises:
+            OSError: If the library is missing or incomplete
+            ValueError: If the library was saved in another format
+        """
+        with open(os.path.join(path, 'library.json')) as f:
+            self.metadata = json.load(f)
+        if self.metadata.get('format') != STAGING_LIBRARY_FORMAT:
+            raise ValueError(f"Staging library {path} has format {self.metadata.get('format')}, "
+                             f"expected {STAGING_LIBRARY_FORMAT}")
+        self.path = path
+        self.count = self.metadata['count']
+        self.digest = self.metadata['digest']
+        # Plain array views of the maps: slicing a np.memmap is slower and the
+        # slices would keep the memmap type
+        self.arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r').view(np.ndarray)
+                       for name in STAGING_LIBRARY_ARRAYS}
+        self._urls = None
+        self._index = None
+    
+    def __reduce__(self):
+        return StagingLibrary, (self.path,)
+    
+    def urls(self):
+        """Get the cleaned Staging URLs, in scan order."""
+        if self._urls is None:
+            text = self.arrays['url_bytes'].tobytes()
+            offsets = self.arrays['url_offsets'].tolist()
+            self._urls = [text[start:end].decode('utf-8', 'surrogatepass')
+                          for start, end in zip(offsets[:-1], offsets[1:])]
+        return self._urls
+    
+    def index(self):
+        """Get the indexed engine's candidate index over the Staging URLs."""
+        if self._index is None:
+            self._index = MappedStagingIndex(self)
+        return self._index
+    
+    @classmethod
+    def build(cls, urls, path, source='', replace=False):
+        """Clean, deduplicate and index Staging URLs and save them as a library.
+        
+        The files are written to a temporary directory next to path and moved into
+        place when complete, so a library is never opened half-written. If another
+        process saved a library to path in the meantime, that library is kept and
+        returned, unless replace is set.
+        
+        Args:
+            urls (iterable): Raw Staging URLs
+            path (str): Directory to save the library to
+            source (str): Where the URLs came from, kept in the metadata
+            replace (bool): Replace a library already saved to path. Processes
+                that have it open keep reading its files, but processes opening
+                path while it is swapped can fail
+            
+        Returns:
+            StagingLibrary: The saved library
+        """
+        cleaned = normalize_urls(pd.Series(list(urls), dtype=object))
+        staging_urls = list(dict.fromkeys(url for url in cleaned if url))
+        index = StagingIndex([URLFeatures(url) for url in staging_urls])
+        
+        encoded = [url.encode('utf-8', 'surrogatepass') for url in staging_urls]
+        hashed = sorted((token_hash(token), token) for token in index.postings)
+        postings = [index.postings[token] for _, token in hashed]
+        arrays = {
+            'url_bytes': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            'url_offsets': np.cumsum([0] + [len(url) for url in encoded], dtype=np.int64),
+            'token_hashes': np.array([value for value, _ in hashed], dtype=np.uint64),
+            'posting_offsets': np.cumsum([0] + [len(positions) for positions in postings], dtype=np.int64),
+            'postings': np.concatenate(postings) if postings else np.zeros(0, dtype=np.int32),
+            'token_weights': np.array([index.weights[token] for _, token in hashed], dtype=np.float64),
+            'norms': index.norms,
+        }
+        metadata = {
+            'format': STAGING_LIBRARY_FORMAT,
+            'count': len(staging_urls),
+            'digest': MatchCandidates.digest(staging_urls),
+            'ngram_size': index.ngram_size,
+            'max_postings': index.max_postings,
+            'source': source,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        
+        path = os.path.normpath(path)
+        partial_path = tempfile.mkdtemp(prefix=f"{os.path.basename(path)}.part-", dir=os.path.dirname(path) or '.')
+        try:
+            # mkdtemp makes the directory private to its owner
+            os.chmod(partial_path, 0o755)
+            for name, array in arrays.items():
+                np.save(os.path.join(partial_path, f'{name}.npy'), array)
+            with open(os.path.join(partial_path, 'library.json'), 'w') as f:
+                json.dump(metadata, f)
+            
+            try:
+                os.rename(partial_path, path)
+            except OSError:
+                if not os.path.isdir(path):
+                    raise
+                if not replace:
+                    # Another process saved the library first
+                    logger.info(f"Staging library {path} was already built, keeping it")
+                    shutil.rmtree(partial_path)
+                    return cls(path)
+                # Processes that have the old library open keep reading its unlinked files
+                stale_path = tempfile.mkdtemp(prefix=f"{os.path.basename(path)}.stale-",
+                                              dir=os.path.dirname(path) or '.')
+                os.rename(path, os.path.join(stale_path, 'library'))
+                os.rename(partial_path, path)
+                shutil.rmtree(stale_path)
+        except BaseException:
+            shutil.rmtree(partial_path, ignore_errors=True)
+            raise
+        
+        logger.info(f"Built staging library {path}: {len(staging_urls)} Staging URLs, {len(hashed)} tokens")
+        return cls(path)
+    
+    @classmethod
+    def build_from_csv(cls, csv_path, path, replace=False):
+        """Build a library from the Staging_URL column, or the only column, of a CSV file.
+        
+        Args:
+            csv_path (str): Path to the CSV file
+            path (str): Directory to save the library to
+            replace (bool): Replace a library already saved to path (see build)
+            
+        Returns:
+            StagingLibrary: The saved library
+            
+        Raises:
+            ValueError: If the CSV has no Staging_URL column and more than one column
+        """
+        df = pd.read_csv(csv_path, dtype=str)
+        if 'Staging_URL' in df.columns:
+            column = 'Staging_URL'
+        elif len(df.columns) == 1:
+            column = df.columns[0]
+        else:
+            raise ValueError("Could not identify the Staging URL column. Expected a Staging_URL column or 1 column.")
+        return cls.build(df[column], path, source=os.path.basename(csv_path), replace=replace)
+
+
+class PathTrieNode:
+    """Node of a PathTrie: one path segment, with the best Staging URL below it."""
+    
+    __slots__ = ('children', 'position', 'segment_count')
+    
+    def __init__(self):
+        self.children = {}
+        self.position = None
+        self.segment_count = 0
+
+
+class PathTrie:
+    """Trie over the path segments of Staging URLs, for ordered prefix or suffix matching.
+    
+    Every node keeps the Staging URL with the fewest segments below it (the
+    first in scan order among equals), which is the one that scores highest
+    for a Live URL sharing the node's segments. Lookups take O(path depth).
+    """
+    
+    def __init__(self, staging_features, reverse=False):
+        """Build the trie over Staging URL paths.
+        
+        Args:
+            staging_features (list): URLFeatures of the Staging URLs, in scan order
+            reverse (bool): Index the segments last to first, to match on the
+                trailing segments (the slug) instead of the leading ones
+        """
+        self.reverse = reverse
+        self.root = PathTrieNode()
+        for position, features in enumerate(staging_features):
+            segments = self.path_segments(features)
+            node = self.root
+            for segment in segments:
+                child = node.children.get(segment)
+                if child is None:
+                    child = node.children[segment] = PathTrieNode()
+                node = child
+                if node.position is None or len(segments) < node.segment_count:
+                    node.position = position
+                    node.segment_count = len(segments)
+    
+    def path_segments(self, features):
+        """Get the non-empty path segments of a URL in trie order."""
+        segments = [segment for segment in features.segments if segment]
+        return segments[::-1] if self.reverse else segments
+    
+    def longest_match(self, features):
+        """Find the Staging URL sharing the most leading (or trailing) segments with a URL.
+        
+        Args:
+            features (URLFeatures): Parsed Live URL
+            
+        Returns:
+            tuple: (position, score) of the best Staging URL, where score is the
+                number of shared segments over the larger segment count, or None
+                when no Staging URL shares a segment
+        """
+        segments = self.path_segments(features)
+        best = None
+        node = self.root
+        for depth, segment in enumerate(segments, 1):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            score = depth / max(len(segments), node.segment_count)
+            # Deeper nodes win ties: they share more of the path
+            if best is None or score >= best[1]:
+                best = (node.position, score)
+        return best
+
+
+class NGramIndex:
+    """Character n-gram TF-IDF vectors of Staging URLs, for batched cosine similarity."""
+    
+    def __init__(self, staging_features, ngram_size=3):
+        """Vectorize the distinct Staging URLs once.
+        
+        Args:
+            staging_features (list): URLFeatures of the distinct Staging URLs, in scan order
+            ngram_size (int): Length of the character n-grams taken from URL hosts and paths
+        """
+        if sparse is None:
+            raise ImportError("The ngram engine requires scipy")
+        self.ngram_size = ngram_size
+        self.vocabulary = {}
+        counts = self.count_ngrams(staging_features, grow=True)
+        
+        # Smoothed inverse document frequency, so n-grams every URL shares weigh little
+        document_frequency = np.bincount(counts.indices, minlength=len(self.vocabulary))
+        self.idf = (np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.size = counts.shape[0]
+        # Transposed once, so each chunk of Live URLs needs a single product
+        self.staging_vectors_t = self.weigh(counts).T.tocsr()
+    
+    def ngrams(self, features):
+        """Get the n-grams of a URL's lowercased host and path."""
+        text = (features.host + features.path).lower()
+        return [text[i:i + self.ngram_size] for i in range(len(text) - self.ngram_size + 1)]
+    
+    def count_ngrams(self, url_features, grow=False):
+        """Count the n-grams of URLs into a sparse matrix with one row per URL.
+        
+        Args:
+            url_features (list): URLFeatures of the URLs
+            grow (bool): Add unseen n-grams to the vocabulary instead of ignoring them
+            
+        Returns:
+            scipy.sparse.csr_matrix: N-gram counts
+        """
+        indptr = [0]
+        indices = []
+        for features in url_features:
+            for ngram in self.ngrams(features):
+                column = self.vocabulary.get(ngram)
+                if column is None and grow:
+                    column = self.vocabulary[ngram] = len(self.vocabulary)
+                if column is not None:
+                    indices.append(column)
+            indptr.append(len(indices))
+        counts = sparse.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr),
+                                   shape=(len(url_features), len(self.vocabulary)))
+        # Summing the duplicate entries of each row turns them into counts
+        counts.sum_duplicates()
+        return counts
+    
+    def weigh(self, counts):
+        """Turn n-gram counts into L2-normalized TF-IDF vectors."""
+        vectors = counts.multiply(self.idf).tocsr()
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms).astype(np.float32) @ vectors
+    
+    def similarities(self, live_features):
+        """Compute the cosine similarity of Live URLs with every Staging URL.
+        
+        Args:
+            live_features (list): URLFeatures of a chunk of Live URLs
+            
+        Returns:
+            numpy.ndarray: Dense (Live URLs x Staging URLs) similarities
+        """
+        vectors = self.weigh(self.count_ngrams(live_features))
+        return (vectors @ self.staging_vectors_t).toarray()
+    
+    @staticmethod
+    def top_k(similarities, k, floor):
+        """Get the k most similar Staging URLs of one Live URL.
+        
+        Args:
+            similarities (numpy.ndarray): Similarities of the Live URL with every Staging URL
+            k (int): Maximum number of Staging URLs to return
+            floor (float): Similarity a Staging URL has to exceed
+            
+        Returns:
+            list: (position, similarity) pairs, most similar first and lowest
+                position first among equal similarities, as a scan would find them
+        """
+        positions = np.flatnonzero(similarities > floor)
+        if len(positions) > k:
+            kth = np.partition(similarities[positions], len(positions) - k)[len(positions) - k]
+            above = positions[similarities[positions] > kth]
+            tied = positions[similarities[positions] == kth]
+            positions = np.concatenate([above, tied[:k - len(above)]])
+        order = np.lexsort((positions, -similarities[positions]))
+        return [(int(position), float(similarities[position])) for position in positions[order]]
+
+
+class MinHashIndex:
+    """MinHash signatures of Staging URLs with LSH banding, for approximate candidate generation.
+    
+    Each URL's tokens (see url_tokens) are reduced to bands * rows MinHash
+    values. Two URLs land in the same bucket of a band when all rows of the
+    band agree, which happens with probability 1 - (1 - J^rows)^bands for token
+    sets with Jaccard similarity J. More bands raise recall; more rows per band
+    cut the candidates of dissimilar URLs. Buckets are kept as sorted arrays of
+    band keys, so a lookup is a binary search per band.
+    """
+    
+    def __init__(self, staging_features, bands=32, rows=4, ngram_size=3, seed=1):
+        """Sign and bucket the distinct Staging URLs once.
+        
+        Args:
+            staging_features (list): URLFeatures of the distinct Staging URLs, in scan order
+            bands (int): Number of LSH bands
+            rows (int): MinHash values per band
+            ngram_size (int): Length of the character n-grams taken from URL hosts and paths
+            seed (int): Seed of the MinHash permutations
+        """
+        self.bands = bands
+        self.rows = rows
+        self.ngram_size = ngram_size
+        self.size = len(staging_features)
+        
+        generator = np.random.RandomState(seed)
+        self.multipliers = generator.randint(1, MINHASH_PRIME, size=bands * rows).astype(np.int64)
+        self.offsets = generator.randint(0, MINHASH_PRIME, size=bands * rows).astype(np.int64)
+        self.band_multipliers = generator.randint(1, 2 ** 31, size=rows).astype(np.uint64)
+        
+        keys = self.band_keys(self.signatures(staging_features)).T
+        self.order = np.argsort(keys, axis=1, kind='stable')
+        self.sorted_keys = np.take_along_axis(keys, self.order, axis=1)
+    
+    def token_hashes(self, features):
+        """Hash a URL's tokens to residues modulo MINHASH_PRIME."""
+        return np.array([zlib.crc32(token.encode()) for token in url_tokens(features, self.ngram_size)],
+                        dtype=np.int64) % MINHASH_PRIME
+    
+    def signatures(self, url_features):
+        """Compute the MinHash signatures of URLs.
+        
+        Args:
+            url_features (list): URLFeatures of the URLs
+            
+        Returns:
+            numpy.ndarray: One row of bands * rows MinHash values per URL
+        """
+        hashes = [self.token_hashes(features) for features in url_features]
+        signatures = np.full((len(hashes), self.bands * self.rows), MINHASH_PRIME, dtype=np.int64)
+        batch_tokens = max(1, MINHASH_BATCH_TOKENS // (self.bands * self.rows))
+        start = 0
+        while start < len(hashes):
+            stop, tokens = start, 0
+            while stop < len(hashes) and (stop == start or tokens + len(hashes[stop]) <= batch_tokens):
+                tokens += len(hashes[stop])
+                stop += 1
+            
+            lengths = np.array([len(h) for h in hashes[start:stop]])
+            signed = lengths > 0
+            if signed.any():
+                values = (self.multipliers[:, None] * np.concatenate(hashes[start:stop])[None, :]
+                          + self.offsets[:, None]) % MINHASH_PRIME
+                # Each URL's minimum over its own run of token columns
+                starts = (np.cumsum(lengths) - lengths)[signed]
+                batch = signatures[start:stop]
+                batch[signed] = np.minimum.reduceat(values, starts, axis=1).T
+            start = stop
+        return signatures
+    
+    def band_keys(self, signatures):
+        """Combine the rows of every band of each signature into one bucket key."""
+        bands = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        return (bands * self.band_multipliers).sum(axis=2)
+    
+    def candidates(self, features, top_k):
+        """Return the positions of the top-K Staging URLs sharing an LSH bucket with a URL.
+        
+        Args:
+            features (URLFeatures): Parsed Live URL to find candidates for
+            top_k (int): Maximum number of candidates to return
+            
+        Returns:
+            list: Staging URL positions in ascending order, the ones sharing the most
+                bands (then the lowest positions) when more than top_k share one
+        """
+        keys = self.band_keys(self.signatures([features]))[0]
+        found = []
+        for band, key in enumerate(keys):
+            low = np.searchsorted(self.sorted_keys[band], key, side='left')
+            high = np.searchsorted(self.sorted_keys[band], key, side='right')
+            if high > low:
+                found.append(self.order[band, low:high])
+        if not found:
+            return []
+        
+        positions, shared_bands = np.unique(np.concatenate(found), return_counts=True)
+        if len(positions) > top_k:
+            order = np.lexsort((positions, -shared_bands))
+            positions = np.sort(positions[order[:top_k]])
+        return positions.tolist()
+
+
+class StagingBlocks:
+    """Partition of the Staging URLs into blocks, so each Live URL is only scored within its own.
+    
+    A URL's block is its normalized host (lowercased, without a port or a
+    leading 'www.') or its first path segment (lowercased; '' for the root
+    path). A mapping can rename these values, e.g. to put a staging host in the
+    block of the live host it replaces or to merge sections that were renamed.
+    Comparisons drop from every Live URL x Staging URL pair to the sum of the
+    per-block products.
+    """
+    
+    def __init__(self, staging_features, key, mapping=None):
+        """Split the Staging URLs into blocks once.
+        
+        Args:
+            staging_features (list): URLFeatures of the Staging URLs, in scan order
+            key (str): What URLs are blocked by, one of BLOCKING_KEYS
+            mapping (dict): Block of some hosts or sections; others are a block of their own
+        """
+        self.key = key
+        self.mapping = {str(value).lower(): str(block) for value, block in (mapping or {}).items()}
+        self.size = len(staging_features)
+        self.block_of = [self.block(features) for features in staging_features]
+        self.blocks = {}
+        for position, block in enumerate(self.block_of):
+            self.blocks.setdefault(block, []).append(position)
+    
+    def block(self, features):
+        """Get the block of a URL."""
+        if self.key == 'host':
+            value = re.sub(r':\d+$', '', features.host.lower())
+            if value.startswith('www.'):
+                value = value[4:]
+        else:
+            value = features.segments[0].lower()
+        return self.mapping.get(value, value)
+    
+    def candidates(self, features, top_k=None):
+        """Return the positions of the Staging URLs in a URL's block.
+        
+        Args:
+            features (URLFeatures): Parsed Live URL to find candidates for
+            top_k (int): Ignored; every Staging URL of the block is a candidate
+            
+        Returns:
+            list: Staging URL positions in ascending order
+        """
+        return self.blocks.get(self.block(features), [])
+    
+    def outside(self, features):
+        """Return the positions of the Staging URLs outside a URL's block, in ascending order."""
+        block = self.block(features)
+        return [position for position, other in enumerate(self.block_of) if other != block]
+    
+    def pairs(self, live_features):
+        """Count the URL pairs compared within the blocks of some Live URLs."""
+        live_blocks = Counter(self.block(features) for features in live_features)
+        return sum(count * len(self.blocks.get(block, ())) for block, count in live_blocks.items())
+
+
+# Partial match types in the order calculate_similarity tries them
+PARTIAL_MATCH_TYPES = ('Partial - Path', 'Partial - Sequence', 'Partial - Substring')
+
+# Match type of the ngram engine, whose candidates hold a single cosine similarity
+NGRAM_MATCH_TYPES = ('Partial - NGram',)
+
+# Match types found with PathTrie lookups when path_trie is enabled
+PATH_TRIE_MATCH_TYPES = ('Partial - Prefix', 'Partial - Slug')
+
+
+def method_score(method_scores, threshold, match_types=PARTIAL_MATCH_TYPES):
+    """Score a URL pair from its per-method scores, as calculate_similarity does.
+    
+    Args:
+        method_scores (tuple): Path, sequence and substring scores of the pair
+        threshold (float): Similarity threshold
+        match_types (tuple): Match type of each score
+        
+    Returns:
+        tuple: (similarity_score, match_type) of the first method scoring above threshold
+    """
+    for score, match_type in zip(method_scores, match_types):
+        if score > threshold:
+            return score, match_type
+    return 0, "None"
+
+
+def solve_assignment(row_edges, columns):
+    """Find the one-to-one assignment of rows to columns with the highest total score.
+    
+    Sparse Hungarian algorithm: each row is added along a shortest augmenting
+    path, found with Dijkstra's algorithm over the rows' edges only, so no dense
+    rows x columns matrix is built. Every row also has a private column of
+    score 0 for leaving it unmatched, which keeps the searches short.
+    
+    Args:
+        row_edges (list): (column, score) pairs of each row, with columns in
+            range(columns) and scores in (0, 1]
+        columns (int): Number of columns
+        
+    Returns:
+        list: Column assigned to each row, or None where the row is left unmatched
+    """
+    # Minimizing the total cost 1 - score of the pairs maximizes their total score
+    costs = [[(column, 1.0 - score) for column, score in edges] + [(columns + row, 1.0)]
+             for row, edges in enumerate(row_edges)]
+    row_potential = [0.0] * len(costs)
+    column_potential = [0.0] * (columns + len(costs))
+    row_of = {}
+    column_of = [None] * len(costs)
+    
+    def relax(row, base):
+        for column, cost in costs[row]:
+            reduced = base + cost - row_potential[row] - column_potential[column]
+            if column not in scanned and reduced < distance.get(column, float('inf')):
+                distance[column] = reduced
+                via[column] = row
+                heapq.heappush(heap, (reduced, column))
+    
+    for start in range(len(costs)):
+        distance = {}
+        via = {}
+        scanned = {}
+        heap = []
+        relax(start, 0.0)
+        while True:
+            reduced, column = heapq.heappop(heap)
+            if column in scanned or reduced > distance[column]:
+                continue
+            if column not in row_of:
+                # Reached a free column
+                break
+            scanned[column] = reduced
+            relax(row_of[column], reduced)
+        
+        # Keep every reduced cost non-negative and the new path tight
+        row_potential[start] += reduced
+        for scanned_column, scanned_distance in scanned.items():
+            shift = reduced - scanned_distance
+            row_potential[row_of[scanned_column]] += shift
+            column_potential[scanned_column] -= shift
+        
+        # Flip the augmenting path
+        while True:
+            row = via[column]
+            previous = column_of[row]
+            row_of[column] = row
+            column_of[row] = column
+            if row == start:
+                break
+            column = previous
+    
+    return [column if column < columns else None for column in column_of]
+
+
+class MatchCandidates:
+    """Best-scoring Staging URL candidates per Live URL, kept to re-match without rescoring.
+    
+    For every scored Live URL, candidates holds up to keep Staging URLs whose
+    best method score is above floor, as [position, staging_url, path_score,
+    sequence_score, substring_score] lists ([position, staging_url, ngram_score]
+    with the ngram engine) ordered by best method score and then by position in
+    the scanned Staging URLs. Method scores at or below floor are
+    stored as 0. The best match for any threshold >= floor can be picked from
+    these lists (see URLMatcher.pick_candidate), and Staging URLs appended to the
+    input only need to be scored against them.
+    
+    Attributes:
+        floor (float): Lowest threshold the candidates can be re-evaluated at
+        keep (int): Maximum candidates kept per Live URL
+        engine (str): Engine that scored the candidates
+        top_k (int): Indexed engine candidate count
+        staging_count (int): Number of Staging URLs scanned
+        staging_digest (str): Digest of the scanned Staging URLs (see digest())
+        candidates (dict): Candidate lists per Live URL
+        path_trie (bool): Whether the path method was replaced by PathTrie
+            lookups, in which case every path score is 0
+        lsh (list): [bands, rows] of the lsh engine's MinHashIndex
+        sequence_scorer (str): Scorer of the sequence method, one of SEQUENCE_SCORERS
+        blocking (list): [key, mapping, fallback] of the StagingBlocks the
+            candidates were scored within, if any
+    """
+    
+    def __init__(self, floor, keep, engine, top_k, staging_count, staging_digest, candidates=None,
+                 path_trie=False, lsh=None, sequence_scorer='difflib', blocking=None, version=MATCHER_VERSION):
+        self.floor = floor
+        self.keep = keep
+        self.engine = engine
+        self.top_k = top_k
+        self.staging_count = staging_count
+        self.staging_digest = staging_digest
+        self.candidates = candidates if candidates is not None else {}
+        self.path_trie = path_trie
+        self.lsh = lsh
+        self.sequence_scorer = sequence_scorer
+        self.blocking = blocking
+        self.version = version
+    
+    @staticmethod
+    def digest(staging_urls):
+        """Get a digest identifying a sequence of Staging URLs."""
+        digest = hashlib.sha256()
+        for url in staging_urls:
+            digest.update(url.encode())
+            digest.update(b'\n')
+        return digest.hexdigest()
+    
+    def save(self, path):
+        """Save the candidates to a gzip-compressed JSON file."""
+        with gzip.open(path, 'wt') as f:
+            json.dump(self.__dict__, f)
+    
+    @classmethod
+    def load(cls, path):
+        """Load candidates saved with save()."""
+        with gzip.open(path, 'rt') as f:
+            return cls(**json.load(f))
+    
+    def unusable_reason(self, matcher, staging_urls):
+        """Check whether these candidates can seed a matcher's run.
+        
+        Args:
+            matcher (URLMatcher): Matcher about to score staging_urls
+            staging_urls (list): Staging URLs in scan order
+            
+        Returns:
+            str: Why the candidates can't be used, or None if they can
+        """
+        if self.version != MATCHER_VERSION:
+            return f"they were scored by matcher version {self.version}"
+        if self.engine != matcher.engine or (self.engine in ('indexed', 'lsh') and self.top_k != matcher.top_k) or \
+                (self.engine == 'lsh' and self.lsh != [matcher.lsh_bands, matcher.lsh_rows]):
+            return "they were scored with another engine"
+        if self.path_trie != matcher.path_trie:
+            return "they were scored with another path matching strategy"
+        if self.sequence_scorer != matcher.sequence_scorer:
+            return "they were scored with another sequence scorer"
+        if self.blocking != matcher.blocking_settings():
+            return "they were scored with other blocking"
+        if self.keep != matcher.keep_candidates:
+            return f"they keep {self.keep} candidates per Live URL, not {matcher.keep_candidates}"
+        if self.floor > matcher.similarity_threshold:
+            return f"they were scored above {self.floor:g}, higher than the threshold"
+        if self.staging_count > len(staging_urls) or \
+                ((self.engine != 'exhaustive' or self.blocking) and self.staging_count != len(staging_urls)):
+            return "the Staging URLs changed"
+        if self.digest(staging_urls[:self.staging_count]) != self.staging_digest:
+            return "the Staging URLs changed"
+        return None
+
+
+# Per-process partial matching state, set once by _init_partial_worker so the
+# Staging URLs and index are shared with each worker instead of sent per task
+_worker_state = {}
+
+
+def _init_partial_worker(matcher, staging_urls, index, abort_event):
+    """Initialize a partial matching worker process."""
+    _worker_state['matcher'] = matcher
+    _worker_state['staging_urls'] = staging_urls
+    _worker_state['index'] = index
+    _worker_state['abort_event'] = abort_event
+
+
+def _match_live_urls(live_urls, scan=False):
+    """Find the best Staging URL for a shard of Live URLs inside a worker process.
+    
+    Stops early, returning a truncated shard, once the run has been aborted.
+    
+    Args:
+        live_urls (list): Shard of Live URLs
+        scan (bool): Compare with every Staging URL (see URLMatcher.iter_best_matches)
+    
+    Returns:
+        tuple: (best matches as returned by URLMatcher.match_live_url, counters of the
+            shard, (process ID, resident memory in MB) of the worker after the shard)
+    """
+    matcher = _worker_state['matcher']
+    matcher.counters = Counter()
+    best_matches = []
+    for live_url in live_urls:
+        if _worker_state['abort_event'].is_set():
+            break
+        if scan:
+            best_matches.append((matcher.scan_live_url(live_url, _worker_state['staging_urls']), None))
+        else:
+            best_matches.append(matcher.match_live_url(live_url, _worker_state['staging_urls'],
+                                                       _worker_state['index']))
+    return best_matches, matcher.counters, (os.getpid(), current_rss_mb())
+
 
 class URLMatcher:
     """A class to match Live URLs with Staging URLs based on various matching strategies."""
     
-    def __init__(self, csv_path, output_dir="./output", similarity_threshold=0.7):
+    def __init__(self, csv_path, output_dir="./output", similarity_threshold=0.7,
+                 engine='exhaustive', top_k=50, workers=1, chunksize=None, prune=True,
+                 progress_callback=None, cancel_check=None, max_seconds=None, max_memory_mb=None,
+                 report_format='csv', keep_candidates=0, candidate_floor=None, seed_candidates=None,
+                 profile=False, assignment='best', path_trie=False, lsh_bands=32, lsh_rows=4,
+                 recall_sample=LSH_RECALL_SAMPLE, sequence_scorer='difflib', blocking=None, blocking_map=None,
+                 blocking_fallback=False, staging_library=None):
         """Initialize the URLMatcher with the CSV file path and matching parameters.
         
         Args:
             csv_path (str): Path to the CSV file containing Live and Staging URLs
             output_dir (str): Directory to save output files
             similarity_threshold (float): Threshold for partial matching (0.0 to 1.0)
+            engine (str): Partial matching engine, one of MATCH_ENGINES
+            top_k (int): Number of candidates scored per Live URL by the indexed and lsh engines
+            workers (int): Number of processes used for partial matching; the ngram
+                engine always runs in one process
+            chunksize (int): Stream the CSV in chunks of this many rows instead of
+                reading it whole (see load_data_chunked)
+            prune (bool): Skip URL pairs that provably can't beat the current best
+                match; the best matches found are the same either way
+            progress_callback (callable): Called as progress_callback(stage, current, total)
+                when a stage from PIPELINE_STAGES starts and as it advances; total is 0
+                when it isn't known up front
+            cancel_check (callable): Called at every progress checkpoint; a truthy
+                return value cancels the run
+            max_seconds (float): Wall-clock budget for run(); exceeding it aborts the run
+            max_memory_mb (float): Resident memory budget of the run, counting this
+                process and its partial matching workers (see memory_in_use_mb);
+                exceeding it aborts the run
+            report_format (str): Format of the report files, one of REPORT_FORMATS
+            keep_candidates (int): Keep up to this many scored candidates per Live URL
+                (see MatchCandidates) and write them next to the reports; 0 disables
+            candidate_floor (float): Keep candidates scoring above this floor so the
+                run can later be re-evaluated at any threshold down to it; defaults
+                to (and is capped at) similarity_threshold
+            seed_candidates (MatchCandidates): Candidates from an earlier run over the
+                same Live URLs and a prefix of the same Staging URLs; only Staging URLs
+                they haven't been scored against are scored
+            profile (bool): Profile run() with cProfile and write the stats to
+                output_dir; partial matching worker processes are not profiled
+            assignment (str): Partial match assignment mode, one of ASSIGNMENT_MODES;
+                'greedy' and 'optimal' keep at least ASSIGNMENT_CANDIDATES candidates
+            path_trie (bool): Replace the unordered path segment comparison with
+                PathTrie lookups of the longest shared leading segments ('Partial -
+                Prefix') and trailing segments ('Partial - Slug') per Live URL; a
+                lookup above the threshold wins without scanning the Staging URLs
+            lsh_bands (int): LSH bands of the lsh engine; more bands find more
+                candidates, raising recall and matching time
+            lsh_rows (int): MinHash values per LSH band of the lsh engine; more
+                rows find fewer candidates of dissimilar URLs
+            recall_sample (int): Live URLs the lsh engine also matches exhaustively
+                to estimate its recall (see estimate_recall); 0 disables
+            sequence_scorer (str): Scorer of the 'Partial - Sequence' method, one of
+                SEQUENCE_SCORERS; 'lcs' is much faster and scores every pair at least
+                as high as 'difflib'. The ngram engine doesn't use it
+            blocking (str): Only score Live URLs against the Staging URLs of their
+                block, one of BLOCKING_KEYS (see StagingBlocks); exhaustive engine only
+            blocking_map (dict): Block of some hosts or sections, for blocking
+            blocking_fallback (bool): Score Live URLs left without a match in their
+                block against the Staging URLs of every other block
+            staging_library (StagingLibrary): Match against the library's Staging URLs
+                instead of the CSV's Staging column, which may then be left out; the
+                indexed engine uses the library's index
         """
+        if engine not in MATCH_ENGINES:
+            raise ValueError(f"Unknown matching engine '{engine}'. Expected one of: {', '.join(MATCH_ENGINES)}")
+        if engine == 'ngram' and sparse is None:
+            raise ImportError("The ngram engine requires scipy")
+        if assignment not in ASSIGNMENT_MODES:
+            raise ValueError(f"Unknown assignment mode '{assignment}'. Expected one of: {', '.join(ASSIGNMENT_MODES)}")
+        if sequence_scorer not in SEQUENCE_SCORERS:
+            raise ValueError(f"Unknown sequence scorer '{sequence_scorer}'. "
+                             f"Expected one of: {', '.join(SEQUENCE_SCORERS)}")
+        if blocking is not None and blocking not in BLOCKING_KEYS:
+            raise ValueError(f"Unknown blocking key '{blocking}'. Expected one of: {', '.join(BLOCKING_KEYS)}")
+        if blocking is not None and engine != 'exhaustive':
+            raise ValueError("Blocking only applies to the exhaustive engine; the other engines already "
+                             "limit the Staging URLs each Live URL is scored against")
+        check_report_format(report_format)
+        
         self.csv_path = csv_path
         self.output_dir = output_dir
         self.similarity_threshold = similarity_threshold
+        self.engine = engine
+        self.match_types = NGRAM_MATCH_TYPES if engine == 'ngram' else PARTIAL_MATCH_TYPES
+        self.top_k = top_k
+        self.workers = max(1, workers)
+        self.chunksize = chunksize
+        self.prune = prune
+        self.progress_callback = progress_callback
+        self.cancel_check = cancel_check
+        self.max_seconds = max_seconds
+        self.max_memory_mb = max_memory_mb
+        # Resident memory in MB of each partial matching worker, by process ID
+        self.worker_rss_mb = {}
+        self.report_format = report_format
+        if seed_candidates is not None and not keep_candidates:
+            keep_candidates = seed_candidates.keep
+        if assignment != 'best' and not keep_candidates:
+            # Assignment picks from each Live URL's candidates
+            keep_candidates = ASSIGNMENT_CANDIDATES
+        self.keep_candidates = keep_candidates
+        self.assignment = assignment
+        self.path_trie = path_trie
+        self.path_tries = None
+        self.lsh_bands = lsh_bands
+        self.lsh_rows = lsh_rows
+        self.recall_sample = recall_sample
+        self.estimated_recall = None
+        self.sequence_scorer = sequence_scorer
+        self.blocking = blocking
+        self.blocking_map = blocking_map
+        self.blocking_fallback = blocking_fallback
+        self.staging_library = staging_library
+        self.candidate_floor = similarity_threshold if candidate_floor is None else min(candidate_floor, similarity_threshold)
+        self.seed_candidates = seed_candidates
+        self.candidates = None
+        self.profile = profile
+        self.started_at = None
+        self.timings = {}
+        self.stage_metrics = {}
+        self.counters = Counter()
+        self._stage_stack = []
+        self.result = None
         self.df = None
         self.working_df = None
+        self.working_df_no_exact = None
+        self.url_features = {}
         self.results = {
             "exact_matches": [],
             "partial_matches": [],
@@ -47,15 +1448,86 @@ class URLMatcher:
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
     
+    def __getstate__(self):
+        """Leave the data frames behind when the matcher is sent to worker processes."""
+        state = self.__dict__.copy()
+        for attr in ('df', 'working_df', 'working_df_no_exact', 'results', 'candidates',
+                     'progress_callback', 'cancel_check'):
+            state.pop(attr, None)
+        return state
+    
+    def blocking_settings(self):
+        """Get the blocking settings recorded with candidates, or None without blocking."""
+        if self.blocking is None:
+            return None
+        return [self.blocking, self.blocking_map or {}, self.blocking_fallback]
+    
+    def report_progress(self, stage, current=0, total=0):
+        """Report pipeline progress to the progress callback, if one is set.
+        
+        Every progress report is also a checkpoint for cancellation and budgets.
+        
+        Args:
+            stage (str): Current stage, one of PIPELINE_STAGES
+            current (int): Items processed so far in this stage
+            total (int): Items to process in this stage, 0 if unknown
+        """
+        if self.progress_callback is not None:
+            self.progress_callback(stage, current, total)
+        self.check_abort()
+    
+    def check_abort(self):
+        """Abort the run if it was cancelled or is over its time or memory budget.
+        
+        Raises:
+            MatchAborted: If the run should stop
+        """
+        if self.cancel_check is not None and self.cancel_check():
+            raise MatchAborted('cancelled', 'Job was cancelled')
+        
+        if self.max_seconds and self.started_at is not None:
+            elapsed = time.monotonic() - self.started_at
+            if elapsed > self.max_seconds:
+                raise MatchAborted('time_budget', f"Job exceeded its time budget of {self.max_seconds:g} seconds")
+        
+        if self.max_memory_mb:
+            rss = self.memory_in_use_mb()
+            if rss is not None and rss > self.max_memory_mb:
+                raise MatchAborted('memory_budget',
+                                   f"Job exceeded its memory budget of {self.max_memory_mb:g} MB ({rss:.0f} MB in use)")
+    
+    def memory_in_use_mb(self):
+        """Get the resident memory of the run in MB, or None if it can't be read.
+        
+        Adds the memory of this process to the memory each running partial
+        matching worker reported after its last shard. Pages the processes
+        share, such as a memory-mapped staging library, count once per process.
+        """
+        rss = current_rss_mb()
+        if rss is None:
+            return None
+        return rss + sum(self.worker_rss_mb.values())
+    
     def load_data(self):
         """Load and prepare the CSV data for processing."""
         logger.info(f"Loading data from {self.csv_path}")
         try:
+            if self.chunksize:
+                self.load_data_chunked()
+                with self.time_stage('clean'):
+                    self.build_url_features()
+                logger.info(f"Loaded {len(self.df)} rows of data")
+                return True
+            
             # Read the CSV file
             self.df = pd.read_csv(self.csv_path)
             
             # Check if the expected columns exist
-            if 'Live_URL' in self.df.columns and 'Staging_URL' in self.df.columns:
+            if self.staging_library is not None:
+                # The Staging URLs come from the library, so a Staging column is ignored
+                live_column = 'Live_URL' if 'Live_URL' in self.df.columns else self.df.columns[0]
+                self.df = pd.DataFrame({'Live_URL': self.df[live_column], 'Staging_URL': None})
+            elif 'Live_URL' in self.df.columns and 'Staging_URL' in self.df.columns:
                 # Columns are already correctly named
                 pass
             elif len(self.df.columns) == 2:
@@ -68,10 +1540,15 @@ class URLMatcher:
             self.working_df = self.df.copy()
             
             # Clean the URLs
-            self.clean_urls()
+            self.report_progress('clean', 0, len(self.working_df))
+            with self.time_stage('clean'):
+                self.clean_urls()
+                self.build_url_features()
             
             logger.info(f"Loaded {len(self.df)} rows of data")
             return True
+        except MatchAborted:
+            raise
         except Exception as e:
             logger.error(f"Error loading data: {str(e)}")
             return False
@@ -80,39 +1557,120 @@ class URLMatcher:
         """Clean and standardize URLs in both columns."""
         logger.info("Cleaning URLs")
         
-        # Function to clean individual URL
-        def clean_url(url):
-            if pd.isna(url) or not isinstance(url, str):
-                return ""
-            
-            # Remove leading/trailing whitespace
-            url = url.strip()
-            
-            # Ensure URL starts with http if it doesn't already
-            if url and not url.startswith('http'):
-                if url.startswith('/'):
-                    url = 'http:/' + url  # Add http: to path-only URLs
+        # Apply cleaning to both URL columns
+        self.working_df['Live_URL'] = normalize_urls(self.working_df['Live_URL'])
+        self.working_df['Staging_URL'] = normalize_urls(self.working_df['Staging_URL'])
+        
+        # Remove rows where both URLs are empty
+        self.working_df = self.working_df[(self.working_df['Live_URL'] != "") | 
+                                         (self.working_df['Staging_URL'] != "")]
+        
+        logger.info(f"After cleaning, {len(self.working_df)} rows remain")
+    
+    def load_data_chunked(self):
+        """Stream the CSV in chunks, cleaning and interning URLs as they are read.
+        
+        Every distinct raw URL is stored and cleaned once; rows only keep integer
+        codes, and both frames hold categorical columns over the shared
+        vocabularies. Peak memory therefore follows the number of distinct URLs
+        instead of full DataFrame copies. Only the Live_URL and Staging_URL
+        columns are kept.
+        """
+        raw_ids = {}
+        # Cleaned URL vocabulary shared by both columns, with the empty URL first
+        clean_ids = {"": 0}
+        raw_to_clean = []
+        live_parts, staging_parts = [], []
+        columns = None
+        rows_read = 0
+        
+        # Read as strings so type inference can't differ from one chunk to the next
+        for chunk in pd.read_csv(self.csv_path, chunksize=self.chunksize, dtype=str):
+            if columns is None:
+                if self.staging_library is not None:
+                    # The Staging URLs come from the library, so a Staging column is ignored
+                    columns = ['Live_URL' if 'Live_URL' in chunk.columns else chunk.columns[0]]
+                elif 'Live_URL' in chunk.columns and 'Staging_URL' in chunk.columns:
+                    columns = ['Live_URL', 'Staging_URL']
+                elif len(chunk.columns) == 2:
+                    # Assume the first column is Live URL and the second is Staging URL
+                    columns = list(chunk.columns)
                 else:
-                    url = 'http://' + url  # Add http:// to domain-only URLs
-                
-            # Remove duplicate slashes (but preserve http:// and https://)
-            url = re.sub(r'(?<!:)/{2,}', '/', url)
+                    raise ValueError("Could not identify Live and Staging URL columns. Expected 2 columns.")
             
-            # URL decode
-            url = unquote(url)
+            for column, parts in zip(columns, (live_parts, staging_parts)):
+                codes, uniques = pd.factorize(chunk[column])
+                
+                # Normalize the URLs seen for the first time in one batch
+                new_urls = pd.Series([url for url in dict.fromkeys(uniques) if url not in raw_ids], dtype=object)
+                with self.time_stage('clean'):
+                    for url, cleaned in zip(new_urls, normalize_urls(new_urls)):
+                        raw_ids[url] = len(raw_ids)
+                        raw_to_clean.append(clean_ids.setdefault(cleaned, len(clean_ids)))
+                
+                # The trailing -1 maps missing values (code -1) to -1
+                ids = np.array([raw_ids[url] for url in uniques] + [-1], dtype=np.int32)
+                parts.append(ids[codes])
+            if len(columns) == 1:
+                staging_parts.append(np.full(len(chunk), -1, dtype=np.int32))
             
-            return url
+            rows_read += len(chunk)
+            self.report_progress('load', rows_read)
         
-        # Apply cleaning to both URL columns
-        self.working_df['Live_URL'] = self.working_df['Live_URL'].apply(clean_url)
-        self.working_df['Staging_URL'] = self.working_df['Staging_URL'].apply(clean_url)
+        if columns is None:
+            raise ValueError("No data found in CSV file")
+        
+        raw_categories = list(raw_ids)
+        clean_categories = list(clean_ids)
+        # Missing values clean to the empty URL
+        raw_to_clean = np.append(np.array(raw_to_clean, dtype=np.int32), 0)
+        
+        raw_columns, clean_columns = {}, {}
+        for name, parts in (('Live_URL', live_parts), ('Staging_URL', staging_parts)):
+            codes = np.concatenate(parts)
+            raw_columns[name] = pd.Categorical.from_codes(codes, categories=raw_categories)
+            clean_columns[name] = raw_to_clean[codes]
+        self.df = pd.DataFrame(raw_columns)
         
         # Remove rows where both URLs are empty
-        self.working_df = self.working_df[(self.working_df['Live_URL'] != "") | 
-                                         (self.working_df['Staging_URL'] != "")]
+        keep = (clean_columns['Live_URL'] != 0) | (clean_columns['Staging_URL'] != 0)
+        self.working_df = pd.DataFrame(
+            {name: pd.Categorical.from_codes(codes[keep], categories=clean_categories)
+             for name, codes in clean_columns.items()},
+            index=np.flatnonzero(keep)
+        )
         
+        logger.info(f"Interned {len(raw_categories)} distinct raw URLs into {len(clean_categories)} cleaned URLs")
         logger.info(f"After cleaning, {len(self.working_df)} rows remain")
     
+    def build_url_features(self):
+        """Parse every distinct cleaned URL once into the per-URL feature cache."""
+        urls = pd.concat([self.working_df['Live_URL'], self.working_df['Staging_URL']]).unique()
+        self.url_features = {url: URLFeatures(url) for url in urls if url}
+        logger.info(f"Parsed {len(self.url_features)} distinct URLs")
+    
+    def get_url_features(self, url):
+        """Get the cached URLFeatures for a URL, parsing it on first use.
+        
+        Args:
+            url (str): Cleaned URL
+            
+        Returns:
+            URLFeatures: Parsed URL
+        """
+        features = self.url_features.get(url)
+        if features is None:
+            # Only misses are counted: this runs twice per compared pair
+            self.counters['feature_cache_misses'] += 1
+            features = self.url_features[url] = URLFeatures(url)
+        return features
+    
+    def get_staging_urls(self):
+        """Get the cleaned Staging URLs, in scan order: the staging library's, or the CSV's non-empty ones."""
+        if self.staging_library is not None:
+            return self.staging_library.urls()
+        return self.working_df[self.working_df['Staging_URL'] != ""]['Staging_URL'].tolist()
+    
     def find_exact_matches(self):
         """Find exact matches between Live and Staging URLs."""
         logger.info("Finding exact matches")
@@ -137,24 +1695,15 @@ class URLMatcher:
             (self.working_df['Match_Type'] != 'Exact')
         ]['Live_URL'].unique()
         
-        # Get all unique Staging URLs
-        all_staging_urls = self.working_df[self.working_df['Staging_URL'] != ""]['Staging_URL'].unique()
+        # Hash all distinct Staging URLs once so each lookup is constant time
+        all_staging_urls = set(self.get_staging_urls())
         
-        # Find cross-row exact matches
-        cross_row_exact_matches = []
-        for live_url in unmatched_live_urls:
-            if live_url in all_staging_urls:
-                # Find indices of rows with this Live URL
-                live_indices = self.working_df[self.working_df['Live_URL'] == live_url].index
-                
-                # Mark as exact match
-                self.working_df.loc[live_indices, 'Match_Type'] = 'Exact'
-                
-                # Add to cross-row exact matches
-                cross_row_exact_matches.append({
-                    'Live_URL': live_url,
-                    'Staging_URL': live_url
-                })
+        # Find cross-row exact matches
+        cross_row_urls = [live_url for live_url in unmatched_live_urls if live_url in all_staging_urls]
+        cross_row_exact_matches = [{'Live_URL': live_url, 'Staging_URL': live_url} for live_url in cross_row_urls]
+        
+        # Mark every row holding one of these Live URLs as an exact match
+        self.working_df.loc[self.working_df['Live_URL'].isin(cross_row_urls), 'Match_Type'] = 'Exact'
         
         # Combine all exact matches for results
         self.results['exact_matches'] = same_row_exact_matches[['Live_URL', 'Staging_URL']].to_dict('records') + cross_row_exact_matches
@@ -166,12 +1715,17 @@ class URLMatcher:
         logger.info(f"Found {total_exact_matches} exact matches ({len(same_row_exact_matches)} same-row, {len(cross_row_exact_matches)} cross-row)")
         return total_exact_matches
     
-    def calculate_similarity(self, url1, url2):
+    def calculate_similarity(self, url1, url2, floor=None, masks=None):
         """Calculate similarity between two URLs using various methods.
         
         Args:
             url1 (str): First URL
             url2 (str): Second URL
+            floor (float): Optional score the pair has to beat. When cheap upper
+                bounds prove the result can't exceed it, (0, "None") is returned
+                without running the full sequence comparison
+            masks (dict): Optional lcs_masks() of url1 for the lcs sequence
+                scorer, built here when not given
             
         Returns:
             tuple: (similarity_score, match_type)
@@ -183,57 +1737,816 @@ class URLMatcher:
         if url1 == url2:
             return 1.0, "Exact"
         
-        # Method 1: Path-based matching
-        # Split URLs into path components and compare
-        path1 = urlparse(url1).path.strip('/').split('/')
-        path2 = urlparse(url2).path.strip('/').split('/')
+        self.counters['similarity_evaluations'] += 1
+        features1 = self.get_url_features(url1)
+        features2 = self.get_url_features(url2)
         
-        # Calculate path overlap
-        common_segments = set(path1).intersection(set(path2))
+        # Method 1: Path-based matching
+        # Compare the cached path components of both URLs (PathTrie lookups
+        # take this method's place when path_trie is set; see match_live_url)
+        common_segments = not self.path_trie and features1.segment_set & features2.segment_set
         if common_segments:
-            path_similarity = len(common_segments) / max(len(path1), len(path2))
+            path_similarity = len(common_segments) / max(features1.segment_count, features2.segment_count)
             if path_similarity > self.similarity_threshold:
                 return path_similarity, "Partial - Path"
         
-        # Method 2: Sequence matching using difflib
-        sequence_similarity = SequenceMatcher(None, url1, url2).ratio()
+        len1, len2 = features1.length, features2.length
+        if floor is not None:
+            # Both the sequence and the substring ratio are bounded by the length
+            # ratio (SequenceMatcher.real_quick_ratio), which needs no matcher
+            if 2.0 * min(len1, len2) / (len1 + len2) <= floor:
+                self.counters['pruned_by_length'] += 1
+                return 0, "None"
+        
+        # Method 2: Sequence matching using difflib or the LCS ratio
+        if self.sequence_scorer == 'lcs':
+            # An LCS ratio above the floor needs more than floor * (len1 + len2) / 2
+            # common characters. A contained URL is a common subsequence, so its
+            # LCS ratio is never below the substring ratio and can't be pruned
+            # while that would win
+            if masks is None:
+                masks = lcs_masks(url1)
+            sequence_similarity = self.lcs_ratio(masks, len1, url2, 0 if floor is None else floor)
+            if sequence_similarity is None:
+                return 0, "None"
+        else:
+            sequence_matcher = SequenceMatcher(None, url1, url2)
+            if floor is not None and sequence_matcher.quick_ratio() <= floor:
+                # The sequence ratio can't win; only a winning substring ratio
+                # makes the exact result worth computing
+                contained = url1 in url2 or url2 in url1
+                if not contained or min(len1, len2) / max(len1, len2) <= floor:
+                    self.counters['pruned_by_quick_ratio'] += 1
+                    return 0, "None"
+            
+            self.counters['sequence_ratios'] += 1
+            sequence_similarity = sequence_matcher.ratio()
         if sequence_similarity > self.similarity_threshold:
             return sequence_similarity, "Partial - Sequence"
         
         # Method 3: Check if one is a substring of the other
         if url1 in url2 or url2 in url1:
-            substring_ratio = min(len(url1), len(url2)) / max(len(url1), len(url2))
+            substring_ratio = min(len1, len2) / max(len1, len2)
             if substring_ratio > self.similarity_threshold:
                 return substring_ratio, "Partial - Substring"
         
         return 0, "None"
     
+    def lcs_ratio(self, masks, length, url2, floor):
+        """Score a URL pair by the ratio 2 * LCS / (len1 + len2) with lcs_length.
+        
+        Args:
+            masks (dict): lcs_masks() of the first URL, the pattern
+            length (int): Length of the first URL
+            url2 (str): Second URL, the text
+            floor (float): Score the pair has to beat
+            
+        Returns:
+            float: LCS ratio, or None if it can't beat floor
+        """
+        total = length + len(url2)
+        lcs = lcs_length(masks, length, url2, int(floor * total / 2))
+        if lcs is None or 2.0 * lcs / total <= floor:
+            self.counters['pruned_by_lcs_bound'] += 1
+            return None
+        self.counters['sequence_ratios'] += 1
+        return 2.0 * lcs / total
+    
+    def find_best_match(self, live_url, staging_urls):
+        """Find the best scoring Staging URL for a Live URL.
+        
+        Args:
+            live_url (str): Live URL to match
+            staging_urls (list): Staging URLs to compare against, in scan order
+            
+        Returns:
+            tuple: (best_match, best_score, best_match_type)
+        """
+        best_match = None
+        best_score = 0
+        best_match_type = "None"
+        # Built once per Live URL and shared by every pair it is scored in
+        masks = lcs_masks(live_url) if self.sequence_scorer == 'lcs' else None
+        
+        for staging_url in staging_urls:
+            if self.prune:
+                # Only a score above both the threshold and the current best can win
+                score, match_type = self.calculate_similarity(
+                    live_url, staging_url, floor=max(best_score, self.similarity_threshold), masks=masks)
+            else:
+                score, match_type = self.calculate_similarity(live_url, staging_url, masks=masks)
+            
+            if score > best_score:
+                best_score = score
+                best_match = staging_url
+                best_match_type = match_type
+                
+                # No score exceeds 1.0, so nothing later can replace a perfect match
+                if self.prune and best_score >= 1.0:
+                    break
+        
+        return best_match, best_score, best_match_type
+    
+    def score_methods(self, url1, url2, bar, masks=None):
+        """Score a URL pair with each partial matching method.
+        
+        Scores at or below candidate_floor are returned as 0, and so is a sequence
+        score that doesn't beat the path score: at any threshold where the path
+        method fails, such a sequence score fails too. When cheap upper bounds
+        prove no method beats bar, the sequence comparison is skipped and all
+        three scores may be returned as 0.
+        
+        Args:
+            url1 (str): Live URL
+            url2 (str): Staging URL
+            bar (float): Score the pair has to beat to be kept (>= candidate_floor)
+            masks (dict): Optional lcs_masks() of url1 for the lcs sequence
+                scorer, built here when not given
+            
+        Returns:
+            tuple: (path_score, sequence_score, substring_score)
+        """
+        floor = self.candidate_floor
+        self.counters['similarity_evaluations'] += 1
+        features1 = self.get_url_features(url1)
+        features2 = self.get_url_features(url2)
+        
+        path_similarity = 0
+        common_segments = not self.path_trie and features1.segment_set & features2.segment_set
+        if common_segments:
+            path_similarity = len(common_segments) / max(features1.segment_count, features2.segment_count)
+        
+        len1, len2 = features1.length, features2.length
+        substring_ratio = 0
+        if url1 in url2 or url2 in url1:
+            substring_ratio = min(len1, len2) / max(len1, len2)
+        
+        # A pair that is kept anyway needs its exact sequence score down to the floor
+        sequence_floor = max(path_similarity, floor if max(path_similarity, substring_ratio) > bar else bar)
+        sequence_similarity = 0
+        if 2.0 * min(len1, len2) / (len1 + len2) <= sequence_floor:
+            self.counters['pruned_by_length'] += 1
+        elif self.sequence_scorer == 'lcs':
+            if masks is None:
+                masks = lcs_masks(url1)
+            sequence_similarity = self.lcs_ratio(masks, len1, url2, sequence_floor) or 0
+        else:
+            sequence_matcher = SequenceMatcher(None, url1, url2)
+            if sequence_matcher.quick_ratio() <= sequence_floor:
+                self.counters['pruned_by_quick_ratio'] += 1
+            else:
+                self.counters['sequence_ratios'] += 1
+                sequence_similarity = sequence_matcher.ratio()
+        
+        return tuple(score if score > floor else 0 for score in (path_similarity, sequence_similarity, substring_ratio))
+    
+    def scan_candidates(self, live_url, staging_urls, positions, candidates):
+        """Add the best-scoring of some Staging URLs to a Live URL's candidates.
+        
+        Args:
+            live_url (str): Live URL to match
+            staging_urls (list): All Staging URLs
+            positions (iterable): Positions in staging_urls to score, in scan order
+            candidates (list): Candidates so far, as described on MatchCandidates
+            
+        Returns:
+            list: The updated candidates
+        """
+        keep = self.keep_candidates
+        # Built once per Live URL and shared by every pair it is scored in
+        masks = lcs_masks(live_url) if self.sequence_scorer == 'lcs' else None
+        for position in positions:
+            staging_url = staging_urls[position]
+            
+            # Once the list is full only a pair beating its weakest candidate is kept
+            full = len(candidates) >= keep
+            bar = max(max(candidates[-1][2:]), self.candidate_floor) if full else self.candidate_floor
+            if self.prune:
+                scores = self.score_methods(live_url, staging_url, bar, masks)
+            else:
+                scores = self.score_methods(live_url, staging_url, self.candidate_floor, masks)
+            best = max(scores)
+            if best <= bar:
+                continue
+            
+            # Later positions go after earlier ones with the same score
+            slot = len(candidates)
+            while slot > 0 and max(candidates[slot - 1][2:]) < best:
+                slot -= 1
+            candidates.insert(slot, [position, staging_url, *scores])
+            if full:
+                candidates.pop()
+                # Nothing can beat a full list of perfect scores
+                if self.prune and max(candidates[-1][2:]) >= 1.0:
+                    break
+        return candidates
+    
+    def pick_candidate(self, candidates):
+        """Pick the best match at the similarity threshold from a Live URL's candidates.
+        
+        Args:
+            candidates (list): Candidates as described on MatchCandidates
+            
+        Returns:
+            tuple: (best_match, best_score, best_match_type), or None if a full
+                candidate list can't rule out a Staging URL that didn't make it
+        """
+        best_position = None
+        best_top_score = 0
+        best = (None, 0, "None")
+        for position, staging_url, *scores in candidates:
+            score, match_type = method_score(scores, self.similarity_threshold, self.match_types)
+            if score > best[1] or (score == best[1] and score > 0 and position < best_position):
+                best_position = position
+                best_top_score = max(scores)
+                best = (staging_url, score, match_type)
+        
+        if candidates and len(candidates) >= self.keep_candidates:
+            # Staging URLs left out score at most as high as the weakest candidate,
+            # and one scoring exactly that comes after every candidate scoring it
+            weakest = max(candidates[-1][2:])
+            if weakest > self.similarity_threshold and \
+                    (best[1] < weakest or (best[1] == weakest and best_top_score > weakest)):
+                return None
+        return best
+    
+    def path_trie_match(self, live_url, staging_urls):
+        """Find the best prefix or slug match of a Live URL in the PathTries.
+        
+        Args:
+            live_url (str): Live URL to match
+            staging_urls (list): Staging URLs the tries were built over
+            
+        Returns:
+            tuple: (best_match, best_score, best_match_type), with a match type from
+                PATH_TRIE_MATCH_TYPES; prefix matches win ties
+        """
+        features = self.get_url_features(live_url)
+        best = (None, 0, "None")
+        for trie, match_type in zip(self.path_tries, PATH_TRIE_MATCH_TYPES):
+            found = trie.longest_match(features)
+            if found is not None and found[1] > self.similarity_threshold and found[1] > best[1]:
+                best = (staging_urls[found[0]], found[1], match_type)
+        return best
+    
+    def match_live_url(self, live_url, staging_urls, index=None):
+        """Find the best Staging URL for a Live URL.
+        
+        With path_trie set, a PathTrie match above the threshold takes precedence,
+        as the path method does in calculate_similarity, and the Staging URLs are
+        only scanned when candidates are kept. With blocking_fallback set, a Live
+        URL without a match in its block is scored against the other blocks too.
+        
+        Args:
+            live_url (str): Live URL to match
+            staging_urls (list): Staging URLs to compare against
+            index (StagingIndex): Candidate index over staging_urls for the indexed
+                engine, or the StagingBlocks of the exhaustive engine with blocking
+            
+        Returns:
+            tuple: ((best_match, best_score, best_match_type), candidates), where
+                candidates is None unless keep_candidates is set
+        """
+        if self.path_tries is not None:
+            trie_best = self.path_trie_match(live_url, staging_urls)
+            if trie_best[0] is not None:
+                self.counters['path_trie_matches'] += 1
+                candidates = self.score_live_url(live_url, staging_urls, index)[1] if self.keep_candidates else None
+                return trie_best, candidates
+        best, candidates = self.score_live_url(live_url, staging_urls, index)
+        if best[0] is None and self.blocking_fallback and isinstance(index, StagingBlocks):
+            best, candidates = self.score_outside_block(live_url, staging_urls, index, candidates)
+        return best, candidates
+    
+    def scan_live_url(self, live_url, staging_urls):
+        """Find the best Staging URL for a Live URL by comparing it with every Staging URL.
+        
+        Runs the same method cascade as match_live_url, PathTrie matches first
+        when path_trie is set, but without an index, blocks or candidates.
+        
+        Args:
+            live_url (str): Live URL to match
+            staging_urls (list): Staging URLs to compare against
+            
+        Returns:
+            tuple: (best_match, best_score, best_match_type)
+        """
+        if self.path_tries is not None:
+            trie_best = self.path_trie_match(live_url, staging_urls)
+            if trie_best[0] is not None:
+                return trie_best
+        return self.find_best_match(live_url, staging_urls)
+    
+    def score_outside_block(self, live_url, staging_urls, blocks, candidates):
+        """Score a Live URL left without a match in its block against every other block.
+        
+        Args:
+            live_url (str): Live URL to match
+            staging_urls (list): Staging URLs to compare against
+            blocks (StagingBlocks): Blocks of staging_urls
+            candidates (list): Candidates from the Live URL's block, or None
+            
+        Returns:
+            tuple: ((best_match, best_score, best_match_type), candidates) over
+                every Staging URL
+        """
+        self.counters['blocking_fallbacks'] += 1
+        positions = blocks.outside(self.get_url_features(live_url))
+        if candidates is None:
+            return self.find_best_match(live_url, [staging_urls[i] for i in positions]), None
+        
+        # Seeded candidates may already hold Staging URLs of other blocks
+        scored = {candidate[0] for candidate in candidates}
+        candidates = self.scan_candidates(live_url, staging_urls,
+                                          [position for position in positions if position not in scored], candidates)
+        best = self.pick_candidate(candidates)
+        if best is None:
+            self.counters['candidate_rescans'] += 1
+            best = self.find_best_match(live_url, staging_urls)
+        return best, candidates
+    
+    def score_live_url(self, live_url, staging_urls, index=None):
+        """Find the best scoring Staging URL for a Live URL using the configured engine.
+        
+        Args:
+            live_url (str): Live URL to match
+            staging_urls (list): Staging URLs to compare against
+            index (StagingIndex): Candidate index over staging_urls for the indexed engine
+            
+        Returns:
+            tuple: ((best_match, best_score, best_match_type), candidates), where
+                candidates is None unless keep_candidates is set
+        """
+        if not self.keep_candidates:
+            if index is not None:
+                positions = index.candidates(self.get_url_features(live_url), self.top_k)
+                staging_urls = [staging_urls[i] for i in positions]
+            return self.find_best_match(live_url, staging_urls), None
+        
+        seeded = None
+        if self.seed_candidates is not None:
+            seeded = self.seed_candidates.candidates.get(live_url)
+        
+        if seeded is not None:
+            self.counters['seed_candidate_hits'] += 1
+            # Only Staging URLs added since the seed was scored need scoring
+            candidates = self.scan_candidates(live_url, staging_urls,
+                                              range(self.seed_candidates.staging_count, len(staging_urls)),
+                                              [list(candidate) for candidate in seeded])
+        elif index is not None:
+            positions = index.candidates(self.get_url_features(live_url), self.top_k)
+            candidates = self.scan_candidates(live_url, staging_urls, positions, [])
+        else:
+            candidates = self.scan_candidates(live_url, staging_urls, range(len(staging_urls)), [])
+        
+        best = self.pick_candidate(candidates)
+        if best is None:
+            self.counters['candidate_rescans'] += 1
+            # The kept candidates can't settle it; rescore at the threshold
+            if index is not None:
+                positions = index.candidates(self.get_url_features(live_url), self.top_k)
+                staging_urls = [staging_urls[i] for i in positions]
+            best = self.find_best_match(live_url, staging_urls)
+        return best, candidates
+    
+    def iter_best_matches(self, live_urls, staging_urls, index=None, scan=False):
+        """Find the best Staging URL for each Live URL, in parallel when workers > 1.
+        
+        Live URLs are split into contiguous shards and the results are yielded in
+        input order, so the output is identical to the serial path. Progress is
+        reported after every shard.
+        
+        Args:
+            live_urls (list): Distinct Live URLs to match
+            staging_urls (list): Staging URLs to compare against
+            index (StagingIndex): Candidate index over staging_urls for the indexed engine
+            scan (bool): Compare every Live URL with every Staging URL using
+                scan_live_url, without index or candidates, and report progress
+                as the 'recall' stage (see estimate_recall)
+            
+        Yields:
+            tuple: (live_url, ((best_match, best_score, best_match_type), candidates))
+                as returned by match_live_url
+        """
+        stage = 'recall' if scan else 'partial'
+        if scan:
+            index = None
+        
+        # Several shards per worker keep the processes busy when shard costs differ,
+        # and bounded shards keep progress reports coming on large inputs
+        if isinstance(index, StagingBlocks):
+            comparisons_per_url = max(map(len, index.blocks.values()), default=0)
+        elif index is not None:
+            comparisons_per_url = min(self.top_k, len(staging_urls))
+        else:
+            comparisons_per_url = len(staging_urls)
+        shard_size = max(1, -(-len(live_urls) // (self.workers * 4)))
+        shard_size = min(shard_size, PROGRESS_SHARD_SIZE, max(1, PROGRESS_SHARD_PAIRS // max(comparisons_per_url, 1)))
+        shards = [live_urls[i:i + shard_size] for i in range(0, len(live_urls), shard_size)]
+        
+        scored = 0
+        self.report_progress(stage, 0, len(live_urls))
+        
+        if self.workers == 1 or len(shards) < 2:
+            for shard in shards:
+                for live_url in shard:
+                    if scan:
+                        yield live_url, (self.scan_live_url(live_url, staging_urls), None)
+                    else:
+                        yield live_url, self.match_live_url(live_url, staging_urls, index)
+                scored += len(shard)
+                self.report_progress(stage, scored, len(live_urls))
+            return
+        
+        logger.info(f"Scoring {len(live_urls)} Live URLs in {len(shards)} shards across {self.workers} workers")
+        
+        abort_event = multiprocessing.Event()
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_partial_worker,
+                                       initargs=(self, staging_urls, index, abort_event))
+        finished = False
+        try:
+            results = executor.map(_match_live_urls, shards, repeat(scan))
+            for shard, (best_matches, counters, (pid, rss)) in zip(shards, results):
+                self.counters.update(counters)
+                if rss is not None:
+                    self.worker_rss_mb[pid] = rss
+                yield from zip(shard, best_matches)
+                scored += len(shard)
+                self.report_progress(stage, scored, len(live_urls))
+            finished = True
+        finally:
+            if not finished:
+                # Matching stopped early: drop queued shards and cut running ones short
+                abort_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.worker_rss_mb = {}
+    
+    def iter_ngram_matches(self, live_urls, staging_urls, index):
+        """Find the most similar Staging URL for each Live URL with the ngram engine.
+        
+        Live URLs are vectorized and compared with every Staging URL in chunks of
+        about NGRAM_CHUNK_PAIRS pairs, one sparse matrix product per chunk. Live
+        URLs with seed candidates, or with a PathTrie match when no candidates
+        are kept, are not compared. Progress is reported after every chunk.
+        
+        Args:
+            live_urls (list): Distinct Live URLs to match
+            staging_urls (list): Distinct Staging URLs to compare against
+            index (NGramIndex): Vectors of staging_urls
+            
+        Yields:
+            tuple: (live_url, ((best_match, best_score, best_match_type), candidates))
+                as returned by match_live_url
+        """
+        chunk_size = max(1, NGRAM_CHUNK_PAIRS // max(len(staging_urls), 1))
+        keep = max(self.keep_candidates, 1)
+        floor = self.candidate_floor if self.keep_candidates else self.similarity_threshold
+        seeded = self.seed_candidates.candidates if self.seed_candidates is not None else {}
+        
+        scored = 0
+        self.report_progress('partial', 0, len(live_urls))
+        for start in range(0, len(live_urls), chunk_size):
+            chunk = live_urls[start:start + chunk_size]
+            results = {}
+            compared = []
+            for live_url in chunk:
+                trie_best = None
+                if self.path_tries is not None:
+                    trie_best = self.path_trie_match(live_url, staging_urls)
+                    if trie_best[0] is None:
+                        trie_best = None
+                    else:
+                        self.counters['path_trie_matches'] += 1
+                
+                if live_url in seeded:
+                    self.counters['seed_candidate_hits'] += 1
+                    candidates = [list(candidate) for candidate in seeded[live_url]]
+                    results[live_url] = (trie_best or self.pick_candidate(candidates), candidates)
+                elif trie_best is not None and not self.keep_candidates:
+                    results[live_url] = (trie_best, None)
+                else:
+                    compared.append((live_url, trie_best))
+            
+            if compared:
+                similarities = index.similarities([self.get_url_features(url) for url, _ in compared])
+                self.counters['similarity_evaluations'] += similarities.size
+                for (live_url, trie_best), row in zip(compared, similarities):
+                    candidates = [[position, staging_urls[position], score]
+                                  for position, score in index.top_k(row, keep, floor)]
+                    results[live_url] = (trie_best or self.pick_candidate(candidates),
+                                         candidates if self.keep_candidates else None)
+            
+            for live_url in chunk:
+                yield live_url, results[live_url]
+            scored += len(chunk)
+            self.report_progress('partial', scored, len(live_urls))
+    
     def find_partial_matches(self):
         """Find partial matches between Live and Staging URLs."""
-        logger.info("Finding partial matches")
+        logger.info(f"Finding partial matches ({self.engine} engine)")
         
         # Get all Live URLs that don't have exact matches
         live_urls = self.working_df_no_exact[self.working_df_no_exact['Live_URL'] != ""]['Live_URL'].tolist()
         
         # Get all Staging URLs
-        staging_urls = self.working_df[self.working_df['Staging_URL'] != ""]['Staging_URL'].tolist()
+        staging_urls = self.get_staging_urls()
+        
+        # Repeated Live URLs always get the same best match, so each is scored once
+        distinct_live_urls = list(dict.fromkeys(live_urls))
+        
+        index = None
+        if self.engine != 'exhaustive':
+            # Duplicate Staging URLs never win over their first occurrence, so
+            # only the distinct URLs are indexed, in first-seen order
+            staging_urls = list(dict.fromkeys(staging_urls))
+        if self.engine == 'indexed' and self.staging_library is not None:
+            index = self.staging_library.index()
+            logger.info(f"Using the index of staging library {self.staging_library.path} "
+                        f"({len(staging_urls)} Staging URLs, {len(index.token_hashes)} tokens)")
+        elif self.engine == 'indexed':
+            index = StagingIndex([self.get_url_features(url) for url in staging_urls])
+            logger.info(f"Indexed {len(staging_urls)} Staging URLs ({len(index.postings)} tokens)")
+        elif self.engine == 'ngram':
+            index = NGramIndex([self.get_url_features(url) for url in staging_urls])
+            logger.info(f"Vectorized {len(staging_urls)} Staging URLs ({len(index.vocabulary)} n-grams)")
+        elif self.engine == 'lsh':
+            index = MinHashIndex([self.get_url_features(url) for url in staging_urls], self.lsh_bands, self.lsh_rows)
+            logger.info(f"Signed {len(staging_urls)} Staging URLs ({self.lsh_bands} bands of {self.lsh_rows} rows)")
+        elif self.blocking:
+            index = StagingBlocks([self.get_url_features(url) for url in staging_urls], self.blocking, self.blocking_map)
+            pairs = index.pairs([self.get_url_features(url) for url in distinct_live_urls])
+            logger.info(f"Split {len(staging_urls)} Staging URLs into {len(index.blocks)} blocks by {self.blocking}; "
+                        f"{pairs} URL pairs to compare instead of {len(distinct_live_urls) * len(staging_urls)}")
+        
+        if self.path_trie:
+            staging_features = [self.get_url_features(url) for url in staging_urls]
+            self.path_tries = (PathTrie(staging_features), PathTrie(staging_features, reverse=True))
+        
+        if self.keep_candidates:
+            if self.seed_candidates is not None:
+                reason = self.seed_candidates.unusable_reason(self, staging_urls)
+                if reason:
+                    logger.warning(f"Not reusing the seed candidates: {reason}")
+                    self.seed_candidates = None
+                else:
+                    # Keep extending the seed's candidates with the same floor
+                    self.candidate_floor = self.seed_candidates.floor
+                    logger.info(f"Reusing candidates of {len(self.seed_candidates.candidates)} Live URLs "
+                                f"scored against {self.seed_candidates.staging_count} Staging URLs")
+            self.candidates = MatchCandidates(self.candidate_floor, self.keep_candidates, self.engine, self.top_k,
+                                              len(staging_urls),
+                                              self.staging_library.digest if self.staging_library is not None
+                                              else MatchCandidates.digest(staging_urls),
+                                              path_trie=self.path_trie,
+                                              lsh=[self.lsh_bands, self.lsh_rows] if self.engine == 'lsh' else None,
+                                              sequence_scorer=self.sequence_scorer,
+                                              blocking=self.blocking_settings())
+        
+        best_matches = {}
+        if self.engine == 'ngram':
+            matches = self.iter_ngram_matches(distinct_live_urls, staging_urls, index)
+        elif isinstance(index, StagingBlocks):
+            # Keep each block's Live URLs together, so shards (and worker processes)
+            # match the blocks independently
+            blocked_live_urls = sorted(distinct_live_urls, key=lambda url: index.block(self.get_url_features(url)))
+            matches = self.iter_best_matches(blocked_live_urls, staging_urls, index)
+        else:
+            matches = self.iter_best_matches(distinct_live_urls, staging_urls, index)
+        try:
+            for live_url, (best, candidates) in matches:
+                self.counters['live_urls_scored'] += 1
+                best_matches[live_url] = best
+                if candidates is not None:
+                    self.candidates.candidates[live_url] = candidates
+        finally:
+            # Record whatever was scored, so an aborted run still reports its partial matches
+            scored_matches = best_matches
+            if self.assignment != 'best':
+                best_matches = self.assign_matches(distinct_live_urls, best_matches)
+            partial_matches = self.record_partial_matches(live_urls, best_matches)
+        
+        logger.info(f"Found {len(partial_matches)} partial matches")
+        
+        # Recall measures candidate generation, so it compares the matches found
+        # before one-to-one assignment took some of them away
+        if self.engine == 'lsh' and self.recall_sample:
+            self.estimate_recall(scored_matches, staging_urls)
+        return partial_matches
+    
+    def estimate_recall(self, best_matches, staging_urls):
+        """Estimate the lsh engine's recall by matching a sample of Live URLs exhaustively.
+        
+        A sampled Live URL counts as recalled when the lsh engine found a match
+        scoring at least as high as the best match of an exhaustive scan. The
+        scan runs on the same worker processes as partial matching and reports
+        progress as the 'recall' stage. Its similarity evaluations are counted
+        as recall_sample_evaluations, not similarity_evaluations.
+        
+        Args:
+            best_matches (dict): Best (match, score, match type) per Live URL found by the
+                lsh engine, before assignment
+            staging_urls (list): Staging URLs the lsh engine matched against
+            
+        Returns:
+            dict: 'sample' (Live URLs scanned), 'matched' (those with an exhaustive
+                match above the threshold) and 'recall' (None without any)
+        """
+        sample = random.Random(0).sample(sorted(best_matches), min(self.recall_sample, len(best_matches)))
+        counters, self.counters = self.counters, Counter()
+        matched = recalled = 0
+        try:
+            for live_url, ((_, score, _), _) in self.iter_best_matches(sample, staging_urls, scan=True):
+                if score > self.similarity_threshold:
+                    matched += 1
+                    recalled += best_matches[live_url][1] >= score
+        finally:
+            counters['recall_sample_evaluations'] += self.counters['similarity_evaluations']
+            self.counters = counters
+        
+        self.estimated_recall = {'sample': len(sample), 'matched': matched,
+                                 'recall': recalled / matched if matched else None}
+        if matched:
+            logger.info(f"Estimated lsh recall: {recalled} of {matched} sampled Live URLs with an exhaustive "
+                        f"match were matched at least as well ({recalled / matched:.1%})")
+        return self.estimated_recall
+    
+    def assignment_edges(self, live_url, best):
+        """Get the Staging URLs a Live URL can be assigned to, best first.
+        
+        Args:
+            live_url (str): Scored Live URL
+            best (tuple): Its best (match, score, match type) from match_live_url
+            
+        Returns:
+            list: (score, match_type, staging_url) tuples above the threshold,
+                ordered by score and then scan order, with the best match first
+                among equal scores
+        """
+        edges = []
+        seen = set()
+        if best[1] > self.similarity_threshold:
+            edges.append((best[1], best[2], best[0], -1))
+            seen.add(best[0])
+        for position, staging_url, *scores in self.candidates.candidates.get(live_url, ()):
+            score, match_type = method_score(scores, self.similarity_threshold, self.match_types)
+            if score > self.similarity_threshold and staging_url not in seen:
+                edges.append((score, match_type, staging_url, position))
+                seen.add(staging_url)
+        edges.sort(key=lambda edge: (-edge[0], edge[3]))
+        return [edge[:3] for edge in edges]
+    
+    def assign_matches(self, live_urls, best_matches):
+        """Assign each Staging URL to at most one Live URL.
+        
+        Works on the sparse graph of every Live URL's kept candidates (and best
+        match) above the threshold. Staging URLs taken by exact matches are left
+        out. 'greedy' repeatedly takes the highest-scoring pair whose URLs are
+        both free, using a heap of each Live URL's next best candidate. 'optimal'
+        splits the graph into connected components and maximizes each one's
+        total score with solve_assignment; components without competing Live
+        URLs keep their best matches. Repeated rows of a Live URL share its
+        assignment.
+        
+        Args:
+            live_urls (list): Distinct Live URLs, in input order
+            best_matches (dict): Best (match, score, match type) per scored Live URL
+            
+        Returns:
+            dict: Assigned (match, score, match type) per scored Live URL, with
+                (None, 0, "None") for Live URLs left without a Staging URL
+        """
+        taken = {match['Staging_URL'] for match in self.results['exact_matches']}
+        edges = {}
+        for live_url in live_urls:
+            if live_url in best_matches:
+                edges[live_url] = [edge for edge in self.assignment_edges(live_url, best_matches[live_url])
+                                   if edge[2] not in taken]
+        
+        if self.assignment == 'greedy':
+            assigned = self.assign_greedily(edges, taken)
+        else:
+            assigned = {}
+            components = self.assignment_components(edges)
+            self.counters['assignment_components'] += len(components)
+            for component in components:
+                assigned.update(self.assign_component(component, edges, taken))
+        
+        assignment = {}
+        for live_url in edges:
+            assignment[live_url] = assigned.get(live_url, (None, 0, "None"))
+            if assignment[live_url][0] != best_matches[live_url][0] and best_matches[live_url][1] > self.similarity_threshold:
+                self.counters['assignment_reassigned'] += 1
+        logger.info(f"Assigned {len(assigned)} of {len(edges)} Live URLs one-to-one ({self.assignment}); "
+                    f"{self.counters['assignment_reassigned']} moved off their best match")
+        return assignment
+    
+    def assign_greedily(self, edges, taken):
+        """Assign the highest-scoring free pairs first.
+        
+        Args:
+            edges (dict): Edges per Live URL as returned by assignment_edges, in input order
+            taken (set): Staging URLs that can't be assigned; assigned ones are added
+            
+        Returns:
+            dict: Assigned (match, score, match type) per Live URL
+        """
+        order = {live_url: i for i, live_url in enumerate(edges)}
+        # Each Live URL has its next untried edge on the heap; earlier Live URLs win ties
+        heap = [(-live_edges[0][0], order[live_url], 0, live_url) for live_url, live_edges in edges.items() if live_edges]
+        heapq.heapify(heap)
+        assigned = {}
+        while heap:
+            _, position, rank, live_url = heapq.heappop(heap)
+            score, match_type, staging_url = edges[live_url][rank]
+            if staging_url not in taken:
+                taken.add(staging_url)
+                assigned[live_url] = (staging_url, score, match_type)
+            elif rank + 1 < len(edges[live_url]):
+                heapq.heappush(heap, (-edges[live_url][rank + 1][0], position, rank + 1, live_url))
+        return assigned
+    
+    @staticmethod
+    def assignment_components(edges):
+        """Split the candidate graph into connected components.
+        
+        Args:
+            edges (dict): Edges per Live URL as returned by assignment_edges
+            
+        Returns:
+            list: Lists of the Live URLs of each component with edges, in input order
+        """
+        # Union-find over Staging URLs, with each Live URL joining its edges' Staging URLs
+        parent = {}
         
+        def find(url):
+            root = url
+            while parent.setdefault(root, root) != root:
+                root = parent[root]
+            while parent[url] != root:
+                parent[url], url = root, parent[url]
+            return root
+        
+        for live_edges in edges.values():
+            first = find(live_edges[0][2]) if live_edges else None
+            for _, _, staging_url in live_edges[1:]:
+                root = find(staging_url)
+                if root != first:
+                    parent[root] = first
+        
+        components = {}
+        for live_url, live_edges in edges.items():
+            if live_edges:
+                components.setdefault(find(live_edges[0][2]), []).append(live_url)
+        return list(components.values())
+    
+    def assign_component(self, live_urls, edges, taken):
+        """Find the highest-scoring assignment of one connected component.
+        
+        Args:
+            live_urls (list): Live URLs of the component, in input order
+            edges (dict): Edges per Live URL as returned by assignment_edges
+            taken (set): Staging URLs that can't be assigned; assigned ones are added
+            
+        Returns:
+            dict: Assigned (match, score, match type) per Live URL
+        """
+        # Without competition every Live URL keeps its best match, which is optimal
+        top_choices = {edges[live_url][0][2] for live_url in live_urls}
+        if len(top_choices) == len(live_urls):
+            return self.assign_greedily({live_url: edges[live_url] for live_url in live_urls}, taken)
+        
+        self.counters['assignment_solved_components'] += 1
+        staging_urls = list(dict.fromkeys(edge[2] for live_url in live_urls for edge in edges[live_url]))
+        columns = {staging_url: i for i, staging_url in enumerate(staging_urls)}
+        solution = solve_assignment([[(columns[edge[2]], edge[0]) for edge in edges[live_url]] for live_url in live_urls],
+                                    len(staging_urls))
+        
+        assigned = {}
+        for live_url, column in zip(live_urls, solution):
+            if column is not None:
+                score, match_type, staging_url = next(edge for edge in edges[live_url] if edge[2] == staging_urls[column])
+                taken.add(staging_url)
+                assigned[live_url] = (staging_url, score, match_type)
+        return assigned
+    
+    def record_partial_matches(self, live_urls, best_matches):
+        """Store the partial matches found above the threshold and mark their rows.
+        
+        Args:
+            live_urls (list): Live URLs without an exact match, one per row
+            best_matches (dict): Best (match, score, match type) per scored Live URL
+            
+        Returns:
+            list: Partial match records
+        """
         partial_matches = []
+        matched_types = {}
         
         # For each Live URL without an exact match
         for live_url in live_urls:
-            best_match = None
-            best_score = 0
-            best_match_type = "None"
-            
-            # Compare with each Staging URL
-            for staging_url in staging_urls:
-                score, match_type = self.calculate_similarity(live_url, staging_url)
-                
-                if score > best_score:
-                    best_score = score
-                    best_match = staging_url
-                    best_match_type = match_type
+            if live_url not in best_matches:
+                continue
+            best_match, best_score, best_match_type = best_matches[live_url]
             
             # If we found a good match
             if best_score > self.similarity_threshold:
@@ -244,15 +2557,15 @@ class URLMatcher:
                     'Match_Type': best_match_type
                 }
                 partial_matches.append(match)
-                
-                # Update the match type in the working dataframe
-                live_indices = self.working_df_no_exact[self.working_df_no_exact['Live_URL'] == live_url].index
-                self.working_df.loc[live_indices, 'Match_Type'] = best_match_type
+                matched_types[live_url] = best_match_type
+        
+        # Update the match type in the working dataframe
+        live_column = self.working_df_no_exact['Live_URL']
+        matched_rows = live_column[live_column.isin(matched_types)]
+        self.working_df.loc[matched_rows.index, 'Match_Type'] = matched_rows.map(matched_types)
         
         # Store partial matches in results
         self.results['partial_matches'] = partial_matches
-        
-        logger.info(f"Found {len(partial_matches)} partial matches")
         return partial_matches
     
     def identify_unmatched_urls(self):
@@ -266,11 +2579,10 @@ class URLMatcher:
         ]['Live_URL'].tolist()
         
         # Find Staging URLs with no corresponding Live URL
-        all_matched_staging = [m['Staging_URL'] for m in self.results['exact_matches']] + \
-                             [m['Staging_URL'] for m in self.results['partial_matches']]
+        all_matched_staging = {m['Staging_URL'] for m in self.results['exact_matches']} | \
+                              {m['Staging_URL'] for m in self.results['partial_matches']}
         
-        unmatched_staging = [url for url in self.working_df['Staging_URL'].tolist() 
-                           if url and url not in all_matched_staging]
+        unmatched_staging = [url for url in self.get_staging_urls() if url not in all_matched_staging]
         
         no_matches = {
             'unmatched_live': unmatched_live,
@@ -283,24 +2595,12 @@ class URLMatcher:
         logger.info(f"Found {len(unmatched_live)} unmatched Live URLs and {len(unmatched_staging)} unmatched Staging URLs")
         return no_matches
     
-    def generate_report(self):
-        """Generate a comprehensive report of the matching results."""
-        logger.info("Generating report")
+    def summarize(self):
+        """Count the matching results.
         
-        # Create a timestamp for the output files
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        # 1. Create a CSV with all URLs and their match status
-        output_df = self.df.copy()
-        
-        # Add match type column from working_df
-        output_df['Match_Type'] = self.working_df['Match_Type']
-        
-        # Save to CSV
-        output_csv_path = os.path.join(self.output_dir, f"url_matching_results_{timestamp}.csv")
-        output_df.to_csv(output_csv_path, index=False)
-        
-        # 2. Create a summary report
+        Returns:
+            tuple: (summary, match_types) as described on MatchRunResult
+        """
         summary = {
             'total_urls': len(self.df),
             'exact_matches': len(self.results['exact_matches']),
@@ -316,6 +2616,90 @@ class URLMatcher:
             summary['partial_match_percentage'] = (summary['partial_matches'] / total_live) * 100
             summary['unmatched_percentage'] = (summary['unmatched_live'] / total_live) * 100
         
+        match_types = {}
+        for match in self.results['partial_matches']:
+            match_type = match['Match_Type']
+            if match_type not in match_types:
+                match_types[match_type] = 0
+            match_types[match_type] += 1
+        
+        return summary, match_types
+    
+    def report_rows(self):
+        """Get the rows of the per-category reports.
+        
+        Returns:
+            dict: (columns, row iterator) per report, keyed like generate_report()
+        """
+        no_matches = self.results['no_matches']
+        return {
+            'exact_matches': (['Live_URL', 'Staging_URL'],
+                              ((m['Live_URL'], m['Staging_URL']) for m in self.results['exact_matches'])),
+            'partial_matches': (['Live_URL', 'Staging_URL', 'Similarity', 'Match_Type'],
+                                ((m['Live_URL'], m['Staging_URL'], m['Similarity'], m['Match_Type'])
+                                 for m in self.results['partial_matches'])),
+            'unmatched_live': (['Live_URL'], ((url,) for url in no_matches['unmatched_live'])),
+            'unmatched_staging': (['Staging_URL'], ((url,) for url in no_matches['unmatched_staging'])),
+        }
+    
+    def write_parquet_report(self, path):
+        """Write every match and unmatched URL to a single parquet file.
+        
+        Rows are streamed out in record batches of REPORT_BATCH_SIZE. Unmatched
+        Live URLs have Match_Type 'No Match' and unmatched Staging URLs
+        'Unmatched Staging'; Similarity is only set for partial matches.
+        
+        Args:
+            path (str): Path of the parquet file
+        """
+        schema = pa.schema([
+            ('Live_URL', pa.string()),
+            ('Staging_URL', pa.string()),
+            ('Similarity', pa.float64()),
+            ('Match_Type', pa.string()),
+        ])
+        no_matches = self.results['no_matches']
+        rows = {
+            'exact_matches': ((m['Live_URL'], m['Staging_URL'], None, 'Exact')
+                              for m in self.results['exact_matches']),
+            'partial_matches': ((m['Live_URL'], m['Staging_URL'], m['Similarity'], m['Match_Type'])
+                                for m in self.results['partial_matches']),
+            'unmatched_live': ((url, None, None, 'No Match') for url in no_matches['unmatched_live']),
+            'unmatched_staging': ((None, url, None, 'Unmatched Staging') for url in no_matches['unmatched_staging']),
+        }
+        
+        with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+            for category_rows in rows.values():
+                while True:
+                    batch = list(islice(category_rows, REPORT_BATCH_SIZE))
+                    if not batch:
+                        break
+                    columns = [pa.array(column, type=field.type) for column, field in zip(zip(*batch), schema)]
+                    writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=schema))
+    
+    def generate_report(self):
+        """Generate a comprehensive report of the matching results.
+        
+        Returns:
+            dict: Paths of the report files. The CSV formats write 'summary',
+                'full_results', 'exact_matches', 'partial_matches', 'unmatched_live'
+                and 'unmatched_staging'; the parquet format writes 'summary' and 'matches'.
+                Both add 'candidates' when keep_candidates is set
+        """
+        logger.info("Generating report")
+        
+        # Create a timestamp for the output files
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        
+        # 1. Create a summary report
+        summary, match_types = self.summarize()
+        
+        candidate_paths = {}
+        if self.candidates is not None:
+            # Scored candidates, to re-match at another threshold or with added rows
+            candidate_paths['candidates'] = os.path.join(self.output_dir, f"candidates_{timestamp}.json.gz")
+            self.candidates.save(candidate_paths['candidates'])
+        
         # Save summary to a text file
         summary_path = os.path.join(self.output_dir, f"url_matching_summary_{timestamp}.txt")
         
@@ -347,70 +2731,207 @@ class URLMatcher:
             f.write("PARTIAL MATCHES BY TYPE\n")
             f.write("=====================\n\n")
             
-            match_types = {}
-            for match in self.results['partial_matches']:
-                match_type = match['Match_Type']
-                if match_type not in match_types:
-                    match_types[match_type] = 0
-                match_types[match_type] += 1
-            
             for match_type, count in match_types.items():
                 f.write(f"{match_type}: {count}\n")
         
-        # 3. Create detailed reports for each category
-        # Exact matches
-        exact_path = os.path.join(self.output_dir, f"exact_matches_{timestamp}.csv")
-        pd.DataFrame(self.results['exact_matches']).to_csv(exact_path, index=False)
+        if self.report_format == 'parquet':
+            # 2. Write all matches and unmatched URLs to one columnar file
+            matches_path = os.path.join(self.output_dir, f"url_matching_results_{timestamp}.parquet")
+            self.write_parquet_report(matches_path)
+            logger.info(f"Reports saved to {self.output_dir}")
+            return {
+                'summary': summary_path,
+                'matches': matches_path,
+                **candidate_paths
+            }
         
-        # Partial matches
-        partial_path = os.path.join(self.output_dir, f"partial_matches_{timestamp}.csv")
-        pd.DataFrame(self.results['partial_matches']).to_csv(partial_path, index=False)
+        extension = self.report_format
+        report_paths = {'summary': summary_path}
         
-        # Unmatched Live URLs
-        unmatched_live_path = os.path.join(self.output_dir, f"unmatched_live_{timestamp}.csv")
-        pd.DataFrame({'Live_URL': self.results['no_matches']['unmatched_live']}).to_csv(unmatched_live_path, index=False)
+        # 2. Create a CSV with all URLs and their match status
+        output_csv_path = os.path.join(self.output_dir, f"url_matching_results_{timestamp}.{extension}")
+        with open_report_file(output_csv_path, self.report_format) as f:
+            self.df.assign(Match_Type=self.working_df['Match_Type']).to_csv(f, index=False)
+        report_paths['full_results'] = output_csv_path
         
-        # Unmatched Staging URLs
-        unmatched_staging_path = os.path.join(self.output_dir, f"unmatched_staging_{timestamp}.csv")
-        pd.DataFrame({'Staging_URL': self.results['no_matches']['unmatched_staging']}).to_csv(unmatched_staging_path, index=False)
+        # 3. Create detailed reports for each category, streaming the rows out
+        for category, (columns, rows) in self.report_rows().items():
+            path = os.path.join(self.output_dir, f"{category}_{timestamp}.{extension}")
+            with open_report_file(path, self.report_format) as f:
+                writer = csv.writer(f, lineterminator='\n')
+                writer.writerow(columns)
+                writer.writerows(rows)
+            report_paths[category] = path
         
+        report_paths.update(candidate_paths)
         logger.info(f"Reports saved to {self.output_dir}")
         
+        return report_paths
+    
+    @contextmanager
+    def time_stage(self, stage):
+        """Time a pipeline stage: wall-clock and CPU seconds, and resident memory at its end.
+        
+        Stages may be nested, and a nested stage's time is not counted in the
+        stage around it. Timing the same stage again adds to its time.
+        
+        Args:
+            stage (str): Stage name
+        """
+        # Start times, and the time spent in stages nested in this one
+        frame = [time.monotonic(), cpu_seconds(), 0.0, 0.0]
+        self._stage_stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stage_stack.pop()
+            wall = time.monotonic() - frame[0]
+            cpu = cpu_seconds() - frame[1]
+            if self._stage_stack:
+                self._stage_stack[-1][2] += wall
+                self._stage_stack[-1][3] += cpu
+            metrics = self.stage_metrics.setdefault(stage, {'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+            metrics['wall_seconds'] += wall - frame[2]
+            metrics['cpu_seconds'] += cpu - frame[3]
+            metrics['rss_mb'] = current_rss_mb()
+            self.timings[stage] = metrics['wall_seconds']
+    
+    def collect_metrics(self):
+        """Collect the instrumentation of the run so far.
+        
+        Returns:
+            dict: 'stages' (wall_seconds, cpu_seconds and rss_mb at the end of each
+                stage; CPU time includes finished worker processes), 'counters'
+                (similarity_evaluations, sequence_ratios, pruned_by_length,
+                pruned_by_quick_ratio, pruned_by_lcs_bound, feature_cache_misses (URLs parsed), live_urls_scored,
+                seed_candidate_hits, candidate_rescans, path_trie_matches,
+                blocking_fallbacks and the assignment_* counts;
+                across worker processes),
+                'similarity_evaluations_per_second' of the partial stage,
+                'cache_hit_rates', 'peak_rss_mb' and the lsh engine's
+                'estimated_recall' (see estimate_recall)
+        """
+        counters = dict(self.counters)
+        evaluations = counters.get('similarity_evaluations', 0)
+        partial_seconds = self.timings.get('partial')
+        live_urls_scored = counters.get('live_urls_scored', 0)
         return {
-            'summary': summary_path,
-            'full_results': output_csv_path,
-            'exact_matches': exact_path,
-            'partial_matches': partial_path,
-            'unmatched_live': unmatched_live_path,
-            'unmatched_staging': unmatched_staging_path
+            'stages': {stage: dict(self.stage_metrics[stage])
+                       for stage in PIPELINE_STAGES if stage in self.stage_metrics},
+            'counters': counters,
+            'similarity_evaluations_per_second': evaluations / partial_seconds if partial_seconds else None,
+            'cache_hit_rates': {
+                'seed_candidates': (counters.get('seed_candidate_hits', 0) / live_urls_scored
+                                    if self.seed_candidates is not None and live_urls_scored else None),
+            },
+            'peak_rss_mb': peak_rss_mb(),
+            'estimated_recall': self.estimated_recall,
         }
     
-    def run(self):
-        """Run the complete URL matching process."""
-        logger.info("Starting URL matching process")
+    def build_result(self, write_reports=True, aborted=None):
+        """Identify unmatched URLs and collect the run's results.
         
-        # Step 1: Load and prepare data
-        if not self.load_data():
-            logger.error("Failed to load data. Exiting.")
-            return False
+        Args:
+            write_reports (bool): Write the report files with generate_report()
+            aborted (str): MatchAborted reason if the run stopped early
+            
+        Returns:
+            MatchRunResult: The run's results
+        """
+        with self.time_stage('report'):
+            self.identify_unmatched_urls()
+            artifacts = self.generate_report() if write_reports else {}
+            summary, match_types = self.summarize()
+        timings = {stage: self.timings[stage] for stage in PIPELINE_STAGES if stage in self.timings}
+        timings['total'] = self.timings['total'] = time.monotonic() - self.started_at
+        self.result = MatchRunResult(summary, match_types, timings, artifacts,
+                                     self.results, aborted=aborted, metrics=self.collect_metrics())
+        return self.result
+    
+    def write_profile(self, profiler):
+        """Write a run's cProfile stats to output_dir and add them to its result.
         
-        # Step 2: Find exact matches
-        self.find_exact_matches()
+        Args:
+            profiler (cProfile.Profile): Stopped profiler of the run
+            
+        Returns:
+            str: Path of the stats file, readable with pstats or snakeviz
+        """
+        path = os.path.join(self.output_dir, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+        profiler.dump_stats(path)
+        if self.result is not None:
+            self.result.artifacts['profile'] = path
+        logger.info(f"Profile saved to {path}")
+        return path
+    
+    def run(self, write_reports=True):
+        """Run the complete URL matching process.
         
-        # Step 3: Find partial matches
-        self.find_partial_matches()
+        Args:
+            write_reports (bool): Write the report files to output_dir; pass False
+                to only get the results back in memory
+            
+        Returns:
+            MatchRunResult: The run's results, or None if the data could not be loaded
+            
+        Raises:
+            MatchAborted: If the run was cancelled or went over budget. When matching
+                had already started, the results found so far are in self.result
+        """
+        logger.info("Starting URL matching process")
+        self.started_at = time.monotonic()
+        self.timings = {}
+        self.stage_metrics = {}
+        self.counters = Counter()
         
-        # Step 4: Identify unmatched URLs
-        self.identify_unmatched_urls()
+        profiler = cProfile.Profile() if self.profile else None
+        if profiler is not None:
+            profiler.enable()
         
-        # Step 5: Generate report
-        report_paths = self.generate_report()
+        try:
+            try:
+                # Step 1: Load and prepare data
+                with self.time_stage('load'):
+                    self.report_progress('load')
+                    if not self.load_data():
+                        logger.error("Failed to load data. Exiting.")
+                        return None
+                
+                # Step 2: Find exact matches
+                with self.time_stage('exact'):
+                    self.report_progress('exact')
+                    self.find_exact_matches()
+                
+                # Step 3: Find partial matches
+                with self.time_stage('partial'):
+                    self.find_partial_matches()
+            except MatchAborted as e:
+                logger.warning(f"URL matching aborted: {str(e)}")
+                # Flush the matches found so far when matching had started
+                if self.working_df_no_exact is not None:
+                    self.build_result(write_reports, aborted=e.reason)
+                    if write_reports:
+                        logger.info(f"Partial results saved to {self.output_dir}")
+                raise
+            
+            # Steps 4 and 5: Identify unmatched URLs and generate report
+            self.report_progress('report')
+            result = self.build_result(write_reports)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.write_profile(profiler)
         
         logger.info("URL matching process completed successfully")
-        logger.info(f"Summary report: {report_paths['summary']}")
-        logger.info(f"Full results: {report_paths['full_results']}")
+        if write_reports:
+            logger.info(f"Summary report: {result.artifacts['summary']}")
+            logger.info(f"Full results: {result.artifacts.get('full_results', result.artifacts.get('matches'))}")
+        
+        stages = ', '.join(f"{stage} {metrics['wall_seconds']:.2f}s" for stage, metrics in result.metrics['stages'].items())
+        logger.info(f"Stage timings: {stages}; {result.metrics['counters'].get('similarity_evaluations', 0)} "
+                    f"similarity evaluations; peak memory {result.metrics['peak_rss_mb'] or 0:.0f} MB")
         
-        return True
+        return result
 
 
 def main():
@@ -420,6 +2941,57 @@ def main():
     parser.add_argument('--output-dir', '-o', default='./output', help='Directory to save output files')
     parser.add_argument('--threshold', '-t', type=float, default=0.7, 
                         help='Similarity threshold for partial matching (0.0 to 1.0)')
+    parser.add_argument('--engine', '-e', choices=MATCH_ENGINES, default='exhaustive',
+                        help='Partial matching engine: compare every URL pair or only indexed candidates')
+    parser.add_argument('--top-k', type=int, default=50,
+                        help='Number of candidates scored per Live URL by the indexed and lsh engines')
+    parser.add_argument('--lsh-bands', type=int, default=32,
+                        help='LSH bands of the lsh engine; more bands raise recall and matching time')
+    parser.add_argument('--lsh-rows', type=int, default=4,
+                        help='MinHash values per LSH band of the lsh engine; more rows find fewer weak candidates')
+    parser.add_argument('--recall-sample', type=int, default=LSH_RECALL_SAMPLE,
+                        help='Live URLs the lsh engine also matches exhaustively to estimate its recall (0 disables)')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                        help='Number of processes used for partial matching')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Stream the CSV in chunks of this many rows to reduce memory use')
+    parser.add_argument('--no-prune', dest='prune', action='store_false',
+                        help='Score every URL pair in full instead of skipping pairs that cannot win')
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='Abort the run, keeping the results found so far, after this many seconds')
+    parser.add_argument('--max-memory-mb', type=float, default=None,
+                        help='Abort the run, keeping the results found so far, above this much resident memory '
+                             '(partial matching workers included)')
+    parser.add_argument('--report-format', choices=REPORT_FORMATS, default='csv',
+                        help='Format of the report files')
+    parser.add_argument('--keep-candidates', type=int, default=0,
+                        help='Save up to this many scored candidates per Live URL for later re-matching')
+    parser.add_argument('--candidate-floor', type=float, default=None,
+                        help='Lowest threshold the saved candidates can be re-matched at (default: --threshold)')
+    parser.add_argument('--seed-candidates', default=None,
+                        help='Candidates file of an earlier run over the same or fewer rows, to skip rescoring them')
+    parser.add_argument('--assignment', choices=ASSIGNMENT_MODES, default='best',
+                        help='Give each Live URL its best Staging URL, or assign each Staging URL to at most '
+                             'one Live URL greedily or with the highest total similarity')
+    parser.add_argument('--sequence-scorer', choices=SEQUENCE_SCORERS, default='difflib',
+                        help='Score the sequence method with difflib or with the faster bit-parallel '
+                             'longest common subsequence ratio')
+    parser.add_argument('--blocking', choices=BLOCKING_KEYS, default=None,
+                        help='Only compare URLs with the same normalized host or first path segment '
+                             '(exhaustive engine only)')
+    parser.add_argument('--blocking-map', default=None,
+                        help='JSON file mapping hosts or first path segments to the block they belong to')
+    parser.add_argument('--blocking-fallback', action='store_true',
+                        help='Compare Live URLs left unmatched in their block with the other blocks too')
+    parser.add_argument('--staging-library', default=None,
+                        help='Directory of a staging library to match against instead of the CSV\'s Staging URLs')
+    parser.add_argument('--build-staging-library', default=None, metavar='DIRECTORY',
+                        help='Build a staging library from the Staging URLs of csv_file into this directory and exit')
+    parser.add_argument('--path-trie', action='store_true',
+                        help='Match paths by their shared leading (prefix) or trailing (slug) segments, in order, '
+                             'instead of by unordered segment overlap')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the run with cProfile and save the stats to the output directory')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose logging')
     
     args = parser.parse_args()
@@ -428,16 +3000,52 @@ def main():
     if args.verbose:
         logger.setLevel(logging.DEBUG)
     
+    if args.build_staging_library:
+        library = StagingLibrary.build_from_csv(args.csv_file, args.build_staging_library, replace=True)
+        print(f"Built staging library {library.path} with {library.count} Staging URLs.")
+        return 0
+    
+    blocking_map = None
+    if args.blocking_map:
+        with open(args.blocking_map) as f:
+            blocking_map = json.load(f)
+    
     # Create and run the URL matcher
     matcher = URLMatcher(
         csv_path=args.csv_file,
         output_dir=args.output_dir,
-        similarity_threshold=args.threshold
+        similarity_threshold=args.threshold,
+        engine=args.engine,
+        top_k=args.top_k,
+        workers=args.workers,
+        chunksize=args.chunksize,
+        prune=args.prune,
+        max_seconds=args.max_seconds,
+        max_memory_mb=args.max_memory_mb,
+        report_format=args.report_format,
+        keep_candidates=args.keep_candidates,
+        candidate_floor=args.candidate_floor,
+        seed_candidates=MatchCandidates.load(args.seed_candidates) if args.seed_candidates else None,
+        profile=args.profile,
+        assignment=args.assignment,
+        path_trie=args.path_trie,
+        lsh_bands=args.lsh_bands,
+        lsh_rows=args.lsh_rows,
+        recall_sample=args.recall_sample,
+        sequence_scorer=args.sequence_scorer,
+        blocking=args.blocking,
+        blocking_map=blocking_map,
+        blocking_fallback=args.blocking_fallback,
+        staging_library=StagingLibrary(args.staging_library) if args.staging_library else None
     )
     
-    success = matcher.run()
+    try:
+        result = matcher.run()
+    except MatchAborted as e:
+        print(f"URL matching aborted: {str(e)}. Partial results, if any, are in {args.output_dir}.")
+        return 1
     
-    if success:
+    if result:
         print("URL matching completed successfully. See logs for details.")
         return 0
     else:
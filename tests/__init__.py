@@ -0,0 +1,73 @@
+"""
+Tests of the matcher module.
+
+Run them from the repository root with python -m pytest tests or
+python -m unittest discover tests.
+"""
+
+import logging
+import os
+import tempfile
+import unittest
+
+from benchmark import MigrationCorpus
+from matcher import URLMatcher
+
+# The matcher logs every stage at INFO, which drowns out test failures
+logging.getLogger('url_matcher').setLevel(logging.WARNING)
+
+
+def write_corpus(directory, rows=150, seed=7):
+    """Write a synthetic migration corpus (see benchmark.MigrationCorpus) to a CSV file.
+
+    Args:
+        directory (str): Directory to write the file to
+        rows (int): Number of Live URLs
+        seed (int): Random seed of the corpus
+
+    Returns:
+        str: Path of the CSV file
+    """
+    path = os.path.join(directory, f'corpus_{rows}_{seed}.csv')
+    MigrationCorpus(rows, seed).write_csv(path)
+    return path
+
+
+class CorpusTestCase(unittest.TestCase):
+    """Test case matching a synthetic migration corpus written once for the class.
+
+    The CSV file is at csv_path, in a temporary directory at directory.name.
+    """
+
+    # Number of Live URLs in the corpus
+    rows = 150
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.csv_path = write_corpus(cls.directory.name, rows=cls.rows)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+
+def run_matcher(csv_path, **options):
+    """Run the matcher without writing reports.
+
+    Args:
+        csv_path (str): CSV file to match
+        **options: URLMatcher keyword arguments
+
+    Returns:
+        URLMatcher: The matcher after its run, with results and candidates
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        matcher = URLMatcher(csv_path, output_dir=output_dir, **options)
+        matcher.run(write_reports=False)
+    return matcher
+
+
+def match_records(matcher):
+    """Get the exact matches, partial matches and unmatched URLs of a run, for comparison."""
+    return {name: matcher.results[name] for name in ('exact_matches', 'partial_matches', 'no_matches')}
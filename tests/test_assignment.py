@@ -0,0 +1,83 @@
+import random
+import unittest
+
+import numpy as np
+
+from matcher import solve_assignment
+
+from . import CorpusTestCase, run_matcher
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy is only required by the ngram engine
+    linear_sum_assignment = None
+
+
+def random_edges(rng, rows, columns, density):
+    """Random sparse (column, score) edges per row, with some tied scores."""
+    return [[(column, rng.choice((round(rng.random(), 2) or 0.01, 0.5, 1.0)))
+             for column in range(columns) if rng.random() < density]
+            for _ in range(rows)]
+
+
+@unittest.skipIf(linear_sum_assignment is None, "scipy is not installed")
+class SolveAssignmentTest(unittest.TestCase):
+    """solve_assignment must find an assignment as good as scipy's dense solver."""
+
+    def assert_optimal(self, row_edges, columns):
+        assigned = solve_assignment(row_edges, columns)
+        self.assertEqual(len(assigned), len(row_edges))
+
+        used = [column for column in assigned if column is not None]
+        self.assertEqual(len(used), len(set(used)))
+        scores = [dict(edges) for edges in row_edges]
+        # Rows are only ever assigned to one of their own columns
+        total = sum(scores[row][column] for row, column in enumerate(assigned) if column is not None)
+
+        # Missing edges score 0, the same as leaving the row unmatched
+        matrix = np.zeros((len(row_edges), columns))
+        for row, edges in enumerate(row_edges):
+            for column, score in edges:
+                matrix[row, column] = score
+        expected = matrix[linear_sum_assignment(matrix, maximize=True)].sum() if matrix.size else 0.0
+        self.assertAlmostEqual(total, expected, places=9)
+
+    def test_random_problems(self):
+        rng = random.Random(19)
+        for _ in range(500):
+            rows, columns = rng.randint(1, 12), rng.randint(1, 12)
+            self.assert_optimal(random_edges(rng, rows, columns, rng.choice((0.1, 0.3, 0.7, 1.0))), columns)
+
+    def test_larger_problems(self):
+        rng = random.Random(23)
+        for _ in range(20):
+            rows, columns = rng.randint(30, 60), rng.randint(30, 60)
+            self.assert_optimal(random_edges(rng, rows, columns, 0.15), columns)
+
+    def test_rows_without_edges(self):
+        self.assert_optimal([[], [(0, 0.9)], [], [(0, 0.8), (1, 0.2)]], 3)
+        self.assertEqual(solve_assignment([[], []], 0), [None, None])
+
+
+class OneToOneAssignmentTest(CorpusTestCase):
+    """One-to-one assignment modes must never give a Staging URL to two Live URLs."""
+
+    def assert_one_to_one(self, assignment):
+        matcher = run_matcher(self.csv_path, engine='indexed', assignment=assignment, similarity_threshold=0.5)
+        staging_urls = [match['Staging_URL'] for match in matcher.results['partial_matches']]
+        self.assertTrue(staging_urls)
+        self.assertEqual(len(staging_urls), len(set(staging_urls)))
+        # Staging URLs with an exact match are not assigned again
+        exact = {match['Staging_URL'] for match in matcher.results['exact_matches']}
+        self.assertFalse(exact & set(staging_urls))
+        return sum(match['Similarity'] for match in matcher.results['partial_matches'])
+
+    def test_greedy(self):
+        self.assert_one_to_one('greedy')
+
+    def test_optimal(self):
+        self.assertGreaterEqual(self.assert_one_to_one('optimal'), self.assert_one_to_one('greedy') - 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
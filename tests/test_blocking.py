@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+
+from matcher import StagingBlocks, URLFeatures
+
+from . import CorpusTestCase, match_records, run_matcher
+
+# Live URLs on the live host and their pages on a staging host with a port
+ROWS = [
+    ('https://www.example.com/about-us', 'http://staging.example.com:8080/about-us'),
+    ('https://www.example.com/blog/seo-guide', 'http://staging.example.com:8080/blog/seo-guide-2024'),
+    ('https://www.example.com/contact', 'http://staging.example.com:8080/contact-us'),
+    ('https://www.example.com/shop/running-shoes', 'http://staging.example.com:8080/shop/running-shoe'),
+]
+
+
+def features(urls):
+    """Parse URLs into the URLFeatures StagingBlocks are built from."""
+    return [URLFeatures(url) for url in urls]
+
+
+class StagingBlocksTest(unittest.TestCase):
+    """URLs are blocked by their normalized host or first path segment."""
+
+    STAGING_URLS = [
+        'https://WWW.Example.com:8443/Blog/seo',
+        'https://example.com/shop/shoes',
+        'https://staging.example.com/blog/news',
+        'https://example.com/',
+    ]
+
+    def test_host(self):
+        blocks = StagingBlocks(features(self.STAGING_URLS), 'host')
+        self.assertEqual(blocks.block_of, ['example.com', 'example.com', 'staging.example.com', 'example.com'])
+        self.assertEqual(blocks.candidates(URLFeatures('https://www.example.com/blog')), [0, 1, 3])
+        self.assertEqual(blocks.outside(URLFeatures('https://www.example.com/blog')), [2])
+        self.assertEqual(blocks.candidates(URLFeatures('https://other.com/blog')), [])
+
+    def test_section(self):
+        blocks = StagingBlocks(features(self.STAGING_URLS), 'section')
+        self.assertEqual(blocks.block_of, ['blog', 'shop', 'blog', ''])
+        self.assertEqual(blocks.candidates(URLFeatures('https://www.example.com/BLOG/x')), [0, 2])
+        self.assertEqual(blocks.candidates(URLFeatures('https://www.example.com')), [3])
+        self.assertEqual(blocks.outside(URLFeatures('https://www.example.com/shop/x')), [0, 2, 3])
+
+    def test_mapping(self):
+        blocks = StagingBlocks(features(self.STAGING_URLS), 'section', {'News': 'blog', 'store': 'shop'})
+        self.assertEqual(blocks.candidates(URLFeatures('https://www.example.com/news/x')), [0, 2])
+        self.assertEqual(blocks.candidates(URLFeatures('https://www.example.com/store/x')), [1])
+
+    def test_pairs(self):
+        blocks = StagingBlocks(features(self.STAGING_URLS), 'section')
+        live = features(['https://a.com/blog/1', 'https://a.com/blog/2', 'https://a.com/shop/1', 'https://a.com/x'])
+        self.assertEqual(blocks.pairs(live), 2 * 2 + 1 + 0)
+
+
+class BlockingFallbackTest(unittest.TestCase):
+    """Live URLs without a match in their block are matched against the other blocks."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.csv_path = os.path.join(cls.directory.name, 'urls.csv')
+        with open(cls.csv_path, 'w') as f:
+            f.write('Live_URL,Staging_URL\n')
+            f.writelines(f'{live_url},{staging_url}\n' for live_url, staging_url in ROWS)
+        cls.exhaustive = run_matcher(cls.csv_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_without_fallback(self):
+        # No Staging URL is on the live host, so every Live URL's block is empty
+        matcher = run_matcher(self.csv_path, blocking='host')
+        self.assertTrue(self.exhaustive.results['partial_matches'])
+        self.assertEqual(matcher.results['partial_matches'], [])
+
+    def test_fallback(self):
+        matcher = run_matcher(self.csv_path, blocking='host', blocking_fallback=True)
+        self.assertEqual(matcher.counters['blocking_fallbacks'], len(ROWS))
+        self.assertEqual(match_records(matcher), match_records(self.exhaustive))
+
+    def test_mapping(self):
+        matcher = run_matcher(self.csv_path, blocking='host', blocking_map={'staging.example.com': 'example.com'})
+        self.assertEqual(matcher.counters['blocking_fallbacks'], 0)
+        self.assertEqual(match_records(matcher), match_records(self.exhaustive))
+
+
+class BlockingCorpusTest(CorpusTestCase):
+    """Blocked matching must equal an exhaustive scan of each Live URL's block, then of the rest."""
+
+    def test_section_with_fallback(self):
+        matcher = run_matcher(self.csv_path, blocking='section', blocking_fallback=True)
+        self.assertGreater(matcher.counters['blocking_fallbacks'], 0)
+
+        staging_urls = matcher.get_staging_urls()
+        blocks = StagingBlocks(features(staging_urls), 'section')
+        matches = {match['Live_URL']: match for match in matcher.results['partial_matches']}
+        reference = run_matcher(self.csv_path)
+        fallbacks = 0
+        for live_url in {match['Live_URL'] for match in reference.results['partial_matches']} | set(matches):
+            live_features = URLFeatures(live_url)
+            best = reference.find_best_match(live_url, [staging_urls[i] for i in blocks.candidates(live_features)])
+            if best[0] is None:
+                fallbacks += 1
+                best = reference.find_best_match(live_url, [staging_urls[i] for i in blocks.outside(live_features)])
+            if best[0] is None:
+                self.assertNotIn(live_url, matches)
+            else:
+                self.assertEqual((matches[live_url]['Staging_URL'], matches[live_url]['Similarity'],
+                                  matches[live_url]['Match_Type']), best)
+        self.assertGreater(fallbacks, 0)
+
+    def test_single_block(self):
+        # Mapping the staging host to the live host puts every URL in one block
+        matcher = run_matcher(self.csv_path, blocking='host', blocking_fallback=True,
+                              blocking_map={'staging.example.com': 'example.com'})
+        self.assertEqual(matcher.counters['blocking_fallbacks'], 0)
+        self.assertEqual(match_records(matcher), match_records(run_matcher(self.csv_path)))
+
+
+if __name__ == '__main__':
+    unittest.main()
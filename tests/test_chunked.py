@@ -0,0 +1,28 @@
+import unittest
+
+from . import CorpusTestCase, match_records, run_matcher
+
+
+class ChunkedLoadingTest(CorpusTestCase):
+    """Streaming the CSV in chunks must match reading it whole."""
+
+    def assert_same_as_whole(self, **options):
+        whole = run_matcher(self.csv_path, **options)
+        # A chunk size that doesn't divide the row count leaves a short last chunk
+        chunked = run_matcher(self.csv_path, chunksize=37, **options)
+        self.assertEqual(match_records(chunked), match_records(whole))
+        self.assertEqual(chunked.working_df['Match_Type'].astype(object).tolist(),
+                         whole.working_df['Match_Type'].astype(object).tolist())
+
+    def test_indexed(self):
+        self.assert_same_as_whole(engine='indexed')
+
+    def test_indexed_with_workers(self):
+        self.assert_same_as_whole(engine='indexed', workers=2)
+
+    def test_exhaustive(self):
+        self.assert_same_as_whole(sequence_scorer='lcs')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import random
+import unittest
+from difflib import SequenceMatcher
+
+from matcher import lcs_length, lcs_masks
+
+from . import CorpusTestCase, match_records, run_matcher
+
+
+def dynamic_lcs(a, b):
+    """Length of the longest common subsequence by textbook dynamic programming."""
+    previous = [0] * (len(b) + 1)
+    for char in a:
+        current = [0]
+        for j, other in enumerate(b):
+            current.append(previous[j] + 1 if char == other else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def random_pairs(rng, count):
+    """Random string pairs over small alphabets, so they share long subsequences."""
+    for _ in range(count):
+        alphabet = rng.choice(('ab', 'abc', 'abcdefgh/-', 'é/ab'))
+        yield (''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 70))),
+               ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 70))))
+
+
+class LCSLengthTest(unittest.TestCase):
+    """The bit-parallel lcs_length must agree with the dynamic programming LCS."""
+
+    def test_random_pairs(self):
+        for pattern, text in random_pairs(random.Random(23), 2000):
+            self.assertEqual(lcs_length(lcs_masks(pattern), len(pattern), text), dynamic_lcs(pattern, text),
+                             (pattern, text))
+
+    def test_minimum(self):
+        # Below the minimum the scan may stop early, but must never stop at or above it
+        for pattern, text in random_pairs(random.Random(29), 300):
+            expected = dynamic_lcs(pattern, text)
+            masks = lcs_masks(pattern)
+            for minimum in range(expected + 3):
+                self.assertEqual(lcs_length(masks, len(pattern), text, minimum),
+                                 expected if expected >= minimum else None, (pattern, text, minimum))
+
+    def test_long_patterns(self):
+        # Patterns longer than a machine word use Python's arbitrary precision integers
+        rng = random.Random(31)
+        for _ in range(20):
+            pattern = ''.join(rng.choice('abcd/') for _ in range(rng.randint(100, 300)))
+            text = ''.join(rng.choice('abcd/') for _ in range(rng.randint(100, 300)))
+            self.assertEqual(lcs_length(lcs_masks(pattern), len(pattern), text), dynamic_lcs(pattern, text))
+
+    def test_at_least_difflib_ratio(self):
+        # difflib's matching blocks are a common subsequence, so they can't be longer than the LCS
+        for pattern, text in random_pairs(random.Random(37), 1000):
+            if pattern or text:
+                lcs_ratio = 2.0 * lcs_length(lcs_masks(pattern), len(pattern), text) / (len(pattern) + len(text))
+                self.assertGreaterEqual(lcs_ratio, SequenceMatcher(None, pattern, text).ratio() - 1e-12)
+
+
+class LCSScorerTest(CorpusTestCase):
+    """Pruning with the LCS bound must not change the matches of the lcs scorer."""
+
+    def test_pruned_matches_unpruned(self):
+        pruned = run_matcher(self.csv_path, sequence_scorer='lcs')
+        unpruned = run_matcher(self.csv_path, sequence_scorer='lcs', prune=False)
+        self.assertGreater(pruned.counters['pruned_by_lcs_bound'], 0)
+        self.assertEqual(match_records(pruned), match_records(unpruned))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import math
+import unittest
+from collections import Counter
+from unittest import mock
+
+import numpy as np
+
+import matcher
+from matcher import NGramIndex, URLFeatures, URLMatcher
+
+from . import CorpusTestCase, match_records, run_matcher
+
+# Tolerance for comparing the engine's float32 scores with the float64 reference
+TOLERANCE = 1e-5
+
+
+def cosine_similarities(live_url, staging_urls, ngram_size=3):
+    """Score a Live URL against every Staging URL by TF-IDF n-gram cosine, one pair at a time."""
+    def ngrams(url):
+        features = URLFeatures(url)
+        text = (features.host + features.path).lower()
+        return Counter(text[i:i + ngram_size] for i in range(len(text) - ngram_size + 1))
+
+    staging_counts = [ngrams(url) for url in staging_urls]
+    document_frequency = Counter(ngram for counts in staging_counts for ngram in counts)
+    idf = {ngram: math.log((1 + len(staging_urls)) / (1 + frequency)) + 1
+           for ngram, frequency in document_frequency.items()}
+
+    def vector(counts):
+        weights = {ngram: count * idf[ngram] for ngram, count in counts.items() if ngram in idf}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1
+        return {ngram: weight / norm for ngram, weight in weights.items()}
+
+    live_vector = vector(ngrams(live_url))
+    return [sum(weight * staging_vector.get(ngram, 0) for ngram, weight in live_vector.items())
+            for staging_vector in map(vector, staging_counts)]
+
+
+class NGramTopKTest(unittest.TestCase):
+    """NGramIndex.top_k keeps the k best Staging URLs above the floor in scan order."""
+
+    def test_truncation(self):
+        similarities = np.array([0.2, 0.9, 0.5, 0.9, 0.7, 0.5, 0.1], dtype=np.float32)
+        top = lambda k, floor: [position for position, _ in NGramIndex.top_k(similarities, k, floor)]
+        self.assertEqual(top(10, 0.0), [1, 3, 4, 2, 5, 0, 6])
+        self.assertEqual(top(3, 0.0), [1, 3, 4])
+        # Ties at the cut are broken by position
+        self.assertEqual(top(4, 0.0), [1, 3, 4, 2])
+        self.assertEqual(top(10, 0.5), [1, 3, 4])
+        self.assertEqual(top(1, 0.95), [])
+
+
+@unittest.skipIf(matcher.sparse is None, "scipy is not installed")
+class NGramEngineTest(CorpusTestCase):
+    """The ngram engine must find what an exhaustive scan of the same cosine score finds."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.ngram = run_matcher(cls.csv_path, engine='ngram', keep_candidates=3)
+        cls.staging_urls = list(dict.fromkeys(cls.ngram.get_staging_urls()))
+        cls.reference = {live_url: cosine_similarities(live_url, cls.staging_urls)
+                         for live_url in cls.ngram.candidates.candidates}
+
+    def test_candidates(self):
+        floor = self.ngram.candidate_floor
+        for live_url, similarities in self.reference.items():
+            expected = sorted((position for position, score in enumerate(similarities) if score > floor + TOLERANCE),
+                              key=lambda position: (-round(similarities[position], 5), position))[:3]
+            candidates = self.ngram.candidates.candidates[live_url]
+            self.assertEqual([position for position, *_ in candidates], expected, live_url)
+            for position, staging_url, score in candidates:
+                self.assertEqual(staging_url, self.staging_urls[position])
+                self.assertAlmostEqual(score, similarities[position], delta=TOLERANCE)
+
+    def test_best_matches(self):
+        threshold = self.ngram.similarity_threshold
+        matches = {match['Live_URL']: match for match in self.ngram.results['partial_matches']}
+        self.assertTrue(matches)
+        for live_url, similarities in self.reference.items():
+            best = max(similarities)
+            if best > threshold + TOLERANCE:
+                match = matches[live_url]
+                self.assertEqual(match['Match_Type'], 'Partial - NGram')
+                self.assertAlmostEqual(match['Similarity'], best, delta=TOLERANCE)
+                self.assertAlmostEqual(similarities[self.staging_urls.index(match['Staging_URL'])], best,
+                                       delta=TOLERANCE)
+            elif best <= threshold - TOLERANCE:
+                self.assertNotIn(live_url, matches)
+
+    def test_same_as_without_candidates(self):
+        self.assertEqual(match_records(run_matcher(self.csv_path, engine='ngram')), match_records(self.ngram))
+
+    def test_exact_matches(self):
+        exhaustive = run_matcher(self.csv_path)
+        self.assertEqual(self.ngram.results['exact_matches'], exhaustive.results['exact_matches'])
+
+    def test_chunks(self):
+        # Chunks of a few Live URLs each must not change the matches
+        with mock.patch.object(matcher, 'NGRAM_CHUNK_PAIRS', 7 * len(self.staging_urls)):
+            self.assertEqual(match_records(run_matcher(self.csv_path, engine='ngram', keep_candidates=3)),
+                             match_records(self.ngram))
+
+
+class NGramWithoutScipyTest(unittest.TestCase):
+    """The ngram engine refuses to run without scipy instead of failing mid-run."""
+
+    def test_requires_scipy(self):
+        with mock.patch.object(matcher, 'sparse', None):
+            with self.assertRaisesRegex(ImportError, 'requires scipy'):
+                URLMatcher('urls.csv', engine='ngram')
+            with self.assertRaisesRegex(ImportError, 'requires scipy'):
+                NGramIndex([URLFeatures('https://www.example.com/about-us')])
+
+
+if __name__ == '__main__':
+    unittest.main()
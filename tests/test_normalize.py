@@ -0,0 +1,45 @@
+import random
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from benchmark import MigrationCorpus
+from matcher import clean_url, normalize_urls
+
+# Characters that exercise every cleaning step: whitespace, schemes, slashes and escapes
+URL_ALPHABET = ['h', 't', 'p', 's', ':', '/', '/', '/', '.', 'a', '-', ' ', '\t', '%', '%2F', '%20', '%E9',
+                '%C3%A9', '%zz', 'é', '?', '#', 'www.', 'http://', 'https://']
+
+
+def random_url(rng):
+    return ''.join(rng.choice(URL_ALPHABET) for _ in range(rng.randint(0, 12)))
+
+
+class NormalizeURLsTest(unittest.TestCase):
+    """normalize_urls must clean every value exactly like clean_url."""
+
+    def assert_same_as_clean_url(self, urls):
+        series = pd.Series(urls, dtype=object, index=range(100, 100 + len(urls)))
+        cleaned = normalize_urls(series)
+        self.assertEqual(cleaned.index.tolist(), series.index.tolist())
+        self.assertEqual(cleaned.tolist(), [clean_url(url) for url in urls])
+
+    def test_random_urls(self):
+        rng = random.Random(4)
+        for _ in range(20):
+            urls = [random_url(rng) for _ in range(500)]
+            # Repeated values are normalized once and mapped back to every row
+            urls += rng.sample(urls, 50)
+            self.assert_same_as_clean_url(urls)
+
+    def test_missing_and_non_string_values(self):
+        self.assert_same_as_clean_url([None, np.nan, '', '  ', 42, 1.5, '/a', None, '/a'])
+
+    def test_corpus_urls(self):
+        corpus = MigrationCorpus(200, seed=3)
+        self.assert_same_as_clean_url(corpus.live_urls + corpus.staging_urls)
+
+
+if __name__ == '__main__':
+    unittest.main()
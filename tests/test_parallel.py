@@ -0,0 +1,35 @@
+import unittest
+
+from . import CorpusTestCase, match_records, run_matcher
+
+
+class ParallelMatchingTest(CorpusTestCase):
+    """Partial matching split across worker processes must match a single-process run."""
+
+    def assert_same_as_serial(self, **options):
+        serial = run_matcher(self.csv_path, **options)
+        parallel = run_matcher(self.csv_path, workers=2, **options)
+        self.assertTrue(serial.results['partial_matches'])
+        self.assertEqual(match_records(parallel), match_records(serial))
+
+    def test_exhaustive(self):
+        self.assert_same_as_serial()
+
+    def test_indexed(self):
+        self.assert_same_as_serial(engine='indexed')
+
+    def test_lsh(self):
+        self.assert_same_as_serial(engine='lsh', recall_sample=0)
+
+    def test_blocking(self):
+        self.assert_same_as_serial(blocking='section', blocking_fallback=True)
+
+    def test_candidates(self):
+        options = {'engine': 'indexed', 'keep_candidates': 5, 'candidate_floor': 0.5}
+        serial = run_matcher(self.csv_path, **options)
+        parallel = run_matcher(self.csv_path, workers=2, **options)
+        self.assertEqual(parallel.candidates.candidates, serial.candidates.candidates)
+
+
+if __name__ == '__main__':
+    unittest.main()
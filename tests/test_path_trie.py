@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from difflib import SequenceMatcher
+
+from matcher import PATH_TRIE_MATCH_TYPES, PathTrie, URLFeatures
+
+from . import CorpusTestCase, run_matcher
+
+# Live URL, Staging URL rows, and the PathTrie matches of the Live URLs at threshold 0.4
+ROWS = [
+    ('https://www.example.com/about-us', 'https://www.example.com/about-us'),
+    ('https://www.example.com/blog/seo-guide/2024', 'https://www.example.com/blog/seo-guide'),
+    ('https://www.example.com/running-shoes', 'https://www.example.com/shop/running-shoes'),
+    ('https://www.example.com/contact', 'https://www.example.com/contact-us'),
+]
+TRIE_MATCHES = {
+    'https://www.example.com/blog/seo-guide/2024': ('https://www.example.com/blog/seo-guide', 2 / 3, 'Partial - Prefix'),
+    'https://www.example.com/running-shoes': ('https://www.example.com/shop/running-shoes', 0.5, 'Partial - Slug'),
+}
+
+
+def features(urls):
+    """Parse URLs into the URLFeatures a PathTrie is built from."""
+    return [URLFeatures(url) for url in urls]
+
+
+class PathTrieTest(unittest.TestCase):
+    """PathTrie lookups find the Staging URL sharing the most leading or trailing segments."""
+
+    STAGING_URLS = [
+        'https://s.com/blog/seo-guide/part-2',
+        'https://s.com/blog/seo-guide',
+        'https://s.com/blog',
+        'https://s.com/shop/running-shoes',
+        'https://s.com/sale/running-shoes',
+    ]
+
+    def test_prefix(self):
+        trie = PathTrie(features(self.STAGING_URLS))
+        # The shortest Staging URL under the deepest shared node wins
+        self.assertEqual(trie.longest_match(URLFeatures('https://l.com/blog/seo-guide/2024')), (1, 2 / 3))
+        self.assertEqual(trie.longest_match(URLFeatures('https://l.com/blog/news')), (2, 0.5))
+        self.assertEqual(trie.longest_match(URLFeatures('https://l.com/blog')), (2, 1.0))
+        self.assertIsNone(trie.longest_match(URLFeatures('https://l.com/news/blog')))
+        self.assertIsNone(trie.longest_match(URLFeatures('https://l.com/')))
+
+    def test_slug(self):
+        trie = PathTrie(features(self.STAGING_URLS), reverse=True)
+        # Equally short Staging URLs are won by the first in scan order
+        self.assertEqual(trie.longest_match(URLFeatures('https://l.com/products/running-shoes')), (3, 0.5))
+        self.assertEqual(trie.longest_match(URLFeatures('https://l.com/sale/running-shoes')), (4, 1.0))
+        self.assertEqual(trie.longest_match(URLFeatures('https://l.com/guides/seo-guide')), (1, 0.5))
+        self.assertIsNone(trie.longest_match(URLFeatures('https://l.com/running-shoes/red')))
+
+
+class PathTrieMatchingTest(unittest.TestCase):
+    """PathTrie matches take the path method's place at the head of the method cascade."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.csv_path = os.path.join(cls.directory.name, 'urls.csv')
+        with open(cls.csv_path, 'w') as f:
+            f.write('Live_URL,Staging_URL\n')
+            f.writelines(f'{live_url},{staging_url}\n' for live_url, staging_url in ROWS)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def matches(self, **options):
+        matcher = run_matcher(self.csv_path, similarity_threshold=0.4, **options)
+        self.assertEqual([match['Live_URL'] for match in matcher.results['exact_matches']], [ROWS[0][0]])
+        return {match['Live_URL']: (match['Staging_URL'], match['Similarity'], match['Match_Type'])
+                for match in matcher.results['partial_matches']}
+
+    def test_match_types(self):
+        matches = self.matches(path_trie=True)
+        for live_url, match in TRIE_MATCHES.items():
+            self.assertEqual(matches[live_url][0], match[0])
+            self.assertAlmostEqual(matches[live_url][1], match[1])
+            self.assertEqual(matches[live_url][2], match[2])
+        # Like the path method, a PathTrie match comes first in the cascade, ahead
+        # of the pair's higher sequence score
+        live_url, (staging_url, score, _) = next(iter(TRIE_MATCHES.items()))
+        self.assertGreater(SequenceMatcher(None, live_url, staging_url).ratio(), score)
+        # Without a shared leading or trailing segment the sequence method decides
+        self.assertEqual(matches[ROWS[3][0]][2], 'Partial - Sequence')
+
+    def test_indexed(self):
+        self.assertEqual(self.matches(path_trie=True, engine='indexed'), self.matches(path_trie=True))
+
+
+class PathTrieCorpusTest(CorpusTestCase):
+    """On a migration corpus the PathTrie match types replace the path method's."""
+
+    def test_match_types(self):
+        matcher = run_matcher(self.csv_path, path_trie=True, similarity_threshold=0.5)
+        match_types = {match['Match_Type'] for match in matcher.results['partial_matches']}
+        self.assertTrue(match_types & set(PATH_TRIE_MATCH_TYPES))
+        self.assertNotIn('Partial - Path', match_types)
+        self.assertEqual(matcher.counters['path_trie_matches'],
+                         sum(match['Match_Type'] in PATH_TRIE_MATCH_TYPES
+                             for match in matcher.results['partial_matches']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from . import CorpusTestCase, match_records, run_matcher
+
+
+class PruningTest(CorpusTestCase):
+    """Skipping pairs by the length and quick_ratio bounds must not change the matches."""
+
+    def assert_same_as_unpruned(self, **options):
+        pruned = run_matcher(self.csv_path, **options)
+        unpruned = run_matcher(self.csv_path, prune=False, **options)
+        self.assertGreater(pruned.counters['pruned_by_length'] + pruned.counters['pruned_by_quick_ratio'], 0)
+        self.assertLess(pruned.counters['sequence_ratios'], unpruned.counters['sequence_ratios'])
+        self.assertEqual(match_records(pruned), match_records(unpruned))
+        return pruned, unpruned
+
+    def test_exhaustive(self):
+        pruned, _ = self.assert_same_as_unpruned()
+        self.assertGreater(pruned.counters['pruned_by_quick_ratio'], 0)
+
+    def test_low_threshold(self):
+        self.assert_same_as_unpruned(similarity_threshold=0.5)
+
+    def test_candidates(self):
+        pruned, unpruned = self.assert_same_as_unpruned(keep_candidates=5, candidate_floor=0.5)
+        self.assertEqual(pruned.candidates.candidates, unpruned.candidates.candidates)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+
+from matcher import ASSIGNMENT_CANDIDATES, PATH_TRIE_MATCH_TYPES
+
+from . import CorpusTestCase, run_matcher
+
+LSH_OPTIONS = {'engine': 'lsh', 'similarity_threshold': 0.5, 'recall_sample': 150}
+
+
+class RecallEstimateTest(CorpusTestCase):
+    """The lsh recall estimate must measure candidate generation with the run's own scoring."""
+
+    def test_ignores_assignment(self):
+        best = run_matcher(self.csv_path, keep_candidates=ASSIGNMENT_CANDIDATES, **LSH_OPTIONS)
+        greedy = run_matcher(self.csv_path, assignment='greedy', **LSH_OPTIONS)
+        # Some Live URLs lose their best match to another one
+        self.assertGreater(greedy.counters['assignment_reassigned'], 0)
+        self.assertEqual(greedy.estimated_recall, best.estimated_recall)
+        self.assertTrue(best.estimated_recall['matched'])
+
+    def test_scan_runs_path_tries(self):
+        matcher = run_matcher(self.csv_path, path_trie=True, similarity_threshold=0.5)
+        partial_matches = matcher.results['partial_matches']
+        self.assertTrue(any(match['Match_Type'] in PATH_TRIE_MATCH_TYPES for match in partial_matches))
+
+        staging_urls = matcher.get_staging_urls()
+        for match in partial_matches:
+            self.assertEqual(matcher.scan_live_url(match['Live_URL'], staging_urls),
+                             (match['Staging_URL'], match['Similarity'], match['Match_Type']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import unittest
+
+from matcher import MatchCandidates
+
+from . import CorpusTestCase, match_records, run_matcher, write_corpus
+
+CANDIDATE_OPTIONS = {'keep_candidates': 5, 'candidate_floor': 0.5}
+
+
+class SeededRematchTest(CorpusTestCase):
+    """A run seeded with an earlier run's candidates must match a fresh run."""
+
+    rows = 100
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        # The same file with the rows of another corpus appended
+        cls.extended_path = os.path.join(cls.directory.name, 'extended.csv')
+        with open(cls.csv_path) as base, open(write_corpus(cls.directory.name, rows=20, seed=11)) as delta:
+            delta.readline()
+            with open(cls.extended_path, 'w') as extended:
+                extended.write(base.read() + delta.read())
+
+    def seed(self, **options):
+        """Run the base file and round-trip its candidates through a file, as a re-match does."""
+        path = os.path.join(self.directory.name, 'candidates.json.gz')
+        run_matcher(self.csv_path, similarity_threshold=0.7, **CANDIDATE_OPTIONS, **options).candidates.save(path)
+        return MatchCandidates.load(path)
+
+    def assert_same_as_fresh(self, csv_path, threshold, **options):
+        seeded = run_matcher(csv_path, similarity_threshold=threshold, seed_candidates=self.seed(**options),
+                             **CANDIDATE_OPTIONS, **options)
+        fresh = run_matcher(csv_path, similarity_threshold=threshold, **CANDIDATE_OPTIONS, **options)
+        self.assertGreater(seeded.counters['seed_candidate_hits'], 0)
+        self.assertLess(seeded.counters['similarity_evaluations'], fresh.counters['similarity_evaluations'])
+        self.assertEqual(match_records(seeded), match_records(fresh))
+        self.assertEqual(seeded.candidates.candidates, fresh.candidates.candidates)
+
+    def test_lower_threshold(self):
+        self.assert_same_as_fresh(self.csv_path, 0.6)
+
+    def test_higher_threshold(self):
+        self.assert_same_as_fresh(self.csv_path, 0.8)
+
+    def test_appended_rows(self):
+        self.assert_same_as_fresh(self.extended_path, 0.7)
+
+    def test_indexed(self):
+        self.assert_same_as_fresh(self.csv_path, 0.6, engine='indexed')
+
+    def test_greedy_assignment(self):
+        self.assert_same_as_fresh(self.extended_path, 0.6, assignment='greedy')
+
+    def test_indexed_appended_rows_are_rescored(self):
+        # Added Staging URLs change the indexed engine's candidates, so the seed can't be used
+        seeded = run_matcher(self.extended_path, engine='indexed', seed_candidates=self.seed(engine='indexed'),
+                             **CANDIDATE_OPTIONS)
+        self.assertIsNone(seeded.seed_candidates)
+
+    def test_other_engine_is_ignored(self):
+        seeded = run_matcher(self.csv_path, engine='indexed', seed_candidates=self.seed(), **CANDIDATE_OPTIONS)
+        self.assertIsNone(seeded.seed_candidates)
+        self.assertEqual(match_records(seeded),
+                         match_records(run_matcher(self.csv_path, engine='indexed', **CANDIDATE_OPTIONS)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from matcher import StagingIndex, StagingLibrary, URLFeatures
+
+from . import CorpusTestCase, match_records, run_matcher
+
+
+def library_inode(path):
+    """Get the inode of a library's metadata file, which a rebuild replaces."""
+    return os.stat(os.path.join(path, 'library.json')).st_ino
+
+
+def build_library(csv_path, path):
+    """Build a library in a worker process and return the inode it saw."""
+    return library_inode(StagingLibrary.build_from_csv(csv_path, path).path)
+
+
+class StagingLibraryTest(CorpusTestCase):
+    """Matching against a saved staging library must match against the CSV's Staging URLs."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.library = StagingLibrary.build_from_csv(cls.csv_path, os.path.join(cls.directory.name, 'library'))
+
+    def assert_same_as_csv(self, **options):
+        from_csv = match_records(run_matcher(self.csv_path, **options))
+        from_library = match_records(run_matcher(self.csv_path, staging_library=self.library, **options))
+        self.assertTrue(from_csv['partial_matches'])
+        # Without a Staging column there are no same-row exact matches to list first
+        key = lambda match: (match['Live_URL'], match['Staging_URL'])
+        self.assertEqual(sorted(from_library.pop('exact_matches'), key=key),
+                         sorted(from_csv.pop('exact_matches'), key=key))
+        self.assertEqual(from_library, from_csv)
+
+    def test_indexed(self):
+        self.assert_same_as_csv(engine='indexed')
+
+    def test_indexed_with_workers(self):
+        self.assert_same_as_csv(engine='indexed', workers=2)
+
+    def test_exhaustive(self):
+        self.assert_same_as_csv()
+
+    def test_mapped_index(self):
+        staging_urls = self.library.urls()
+        self.assertEqual(len(staging_urls), self.library.count)
+        self.assertEqual(len(set(staging_urls)), len(staging_urls))
+
+        index = StagingIndex([URLFeatures(url) for url in staging_urls])
+        mapped = self.library.index()
+        for live_url in run_matcher(self.csv_path).df['Live_URL'][:50]:
+            features = URLFeatures(live_url)
+            self.assertEqual(mapped.candidates(features, 10), index.candidates(features, 10))
+
+    def test_repeated_build_keeps_library(self):
+        path = os.path.join(self.directory.name, 'repeated')
+        first = StagingLibrary.build_from_csv(self.csv_path, path)
+        inode = library_inode(path)
+        StagingLibrary.build_from_csv(self.csv_path, path)
+        self.assertEqual(library_inode(path), inode)
+        # Nothing is left behind next to the library
+        self.assertEqual(sorted(name for name in os.listdir(self.directory.name) if name.startswith('repeated')),
+                         ['repeated'])
+
+        replaced = StagingLibrary.build_from_csv(self.csv_path, path, replace=True)
+        self.assertEqual(replaced.digest, first.digest)
+        self.assertNotEqual(library_inode(path), inode)
+        self.assertEqual(sorted(name for name in os.listdir(self.directory.name) if name.startswith('repeated')),
+                         ['repeated'])
+
+    def test_concurrent_builds_share_library(self):
+        path = os.path.join(self.directory.name, 'concurrent')
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            inodes = list(executor.map(build_library, [self.csv_path] * 8, [path] * 8))
+        # The first library saved was never replaced, and every build returned it
+        self.assertEqual(set(inodes), {library_inode(path)})
+        self.assertEqual(sorted(name for name in os.listdir(self.directory.name) if name.startswith('concurrent')),
+                         ['concurrent'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,14 @@
+"""
+Gunicorn settings for the URL Matcher web service.
+
+Command line options given in docker-entrypoint.sh take precedence.
+"""
+
+import os
+
+
+def child_exit(server, worker):
+    """Mark an exited worker's Prometheus samples as dead so they are merged or dropped."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,14 +1,26 @@
 from django import forms
+from django.conf import settings
+from .models import StagingLibrary, URLMatcherJob
 
 class CSVUploadForm(forms.Form):
     """Form for uploading CSV files for URL matching."""
     
     csv_file = forms.FileField(
         label='Select a CSV file',
-        help_text='Must be a valid CSV file containing Live and Staging URLs',
+        help_text='Must be a valid CSV file containing Live and Staging URLs, or only Live URLs '
+                  'when matching against a staging library',
         widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv'})
     )
     
+    staging_library = forms.ModelChoiceField(
+        label='Staging Library',
+        help_text='Match against a previously uploaded set of Staging URLs instead of the CSV\'s Staging URLs',
+        queryset=StagingLibrary.objects.order_by('name'),
+        required=False,
+        empty_label='None (use the Staging URLs in the CSV)',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
     similarity_threshold = forms.FloatField(
         label='Similarity Threshold',
         help_text='Threshold for partial matching (0.0 to 1.0)',
@@ -17,3 +29,80 @@ class CSVUploadForm(forms.Form):
         max_value=1.0,
         widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.05'})
     )
+    
+    report_format = forms.ChoiceField(
+        label='Report Format',
+        help_text='Format of the downloadable report files',
+        choices=URLMatcherJob.REPORT_FORMAT_CHOICES,
+        initial=settings.URL_MATCHER_REPORT_FORMAT,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
+    engine = forms.ChoiceField(
+        label='Matching Engine',
+        help_text='How Live URLs without an exact match are compared with the Staging URLs',
+        choices=URLMatcherJob.ENGINE_CHOICES,
+        initial='exhaustive',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
+    assignment = forms.ChoiceField(
+        label='Partial Match Assignment',
+        help_text='Let several Live URLs share a Staging URL, or assign each Staging URL at most once',
+        choices=URLMatcherJob.ASSIGNMENT_CHOICES,
+        initial='best',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
+    workers = forms.IntegerField(
+        label='Worker Processes',
+        help_text='Number of processes used for partial matching',
+        initial=1,
+        min_value=1,
+        max_value=settings.URL_MATCHER_MAX_WORKERS,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '1'})
+    )
+    
+    profile = forms.BooleanField(
+        label='Profile this job',
+        help_text='Save a cProfile dump of the run, downloadable from the results page',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+
+
+class StagingLibraryForm(forms.Form):
+    """Form for uploading a set of Staging URLs that jobs can match against."""
+    
+    name = forms.CharField(
+        label='Name',
+        help_text='Shown when choosing the library for a job, e.g. the staging site\'s host',
+        max_length=255,
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    
+    csv_file = forms.FileField(
+        label='Select a CSV file',
+        help_text='CSV file with a Staging_URL column, or a single column of Staging URLs',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv'})
+    )
+
+
+class RematchForm(forms.Form):
+    """Form for re-matching a completed job at a new threshold, optionally with added rows."""
+    
+    similarity_threshold = forms.FloatField(
+        label='Similarity Threshold',
+        help_text='Threshold for partial matching (0.0 to 1.0)',
+        min_value=0.0,
+        max_value=1.0,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.05'})
+    )
+    
+    delta_file = forms.FileField(
+        label='Added Rows',
+        help_text='Optional CSV with the same columns, holding rows to add to the original CSV',
+        required=False,
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv'})
+    )
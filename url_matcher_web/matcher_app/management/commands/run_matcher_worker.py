@@ -0,0 +1,125 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from matcher_app.models import URLMatcherJob
+from matcher_app.tasks import claim_next_job, process_url_matcher_job, requeue_stale_jobs
+
+logger = logging.getLogger(__name__)
+
+
+def run_job(job_id):
+    """Run a single claimed job inside its own process."""
+    # The worker's graceful-stop handlers are inherited through fork; a job
+    # process should simply die when the worker terminates it
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    job = URLMatcherJob.objects.get(pk=job_id)
+    process_url_matcher_job(job)
+
+
+class Command(BaseCommand):
+    """Run queued URL matcher jobs outside the web server processes."""
+    
+    help = 'Claim pending URL matcher jobs from the database queue and run them'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.URL_MATCHER_WORKER_CONCURRENCY,
+            help='Maximum number of jobs run at the same time',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.URL_MATCHER_WORKER_POLL_SECONDS,
+            help='Seconds to wait between queue polls',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once the queue is empty and all claimed jobs have finished',
+        )
+    
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        poll_interval = options['poll_interval']
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        
+        # Each job runs in a forked process so a crash or memory blow-up only takes down that job
+        context = multiprocessing.get_context('fork')
+        running = {}
+        self.stopping = False
+        
+        def stop(signum, frame):
+            logger.info(f"Worker {worker_id} received signal {signum}, stopping")
+            self.stopping = True
+        
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        
+        logger.info(f"Worker {worker_id} started with concurrency {concurrency}")
+        self.stdout.write(f"URL matcher worker {worker_id} started (concurrency {concurrency})")
+        
+        while not self.stopping:
+            try:
+                self.reap(running)
+                
+                if running:
+                    URLMatcherJob.objects.filter(pk__in=list(running)).update(heartbeat_at=timezone.now())
+                requeue_stale_jobs()
+                
+                while len(running) < concurrency and not self.stopping:
+                    job = claim_next_job(worker_id)
+                    if job is None:
+                        break
+                    
+                    logger.info(f"Worker {worker_id} claimed job {job.id} (attempt {job.attempts})")
+                    # Forked children must not share the parent's database connections
+                    connections.close_all()
+                    process = context.Process(target=run_job, args=(job.pk,))
+                    process.start()
+                    running[job.pk] = process
+                
+                if options['once'] and not running:
+                    break
+            except Exception as e:
+                logger.error(f"Worker {worker_id} loop error: {str(e)}")
+                connections.close_all()
+            
+            time.sleep(poll_interval)
+        
+        self.shutdown(running)
+        self.stdout.write(f"URL matcher worker {worker_id} stopped")
+    
+    def reap(self, running):
+        """Forget finished job processes, failing jobs whose process died mid-run."""
+        for job_id, process in list(running.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del running[job_id]
+            
+            if process.exitcode != 0:
+                URLMatcherJob.objects.filter(pk=job_id, status='processing').update(
+                    status='failed',
+                    error_message=f'Worker process exited with code {process.exitcode}',
+                    updated_at=timezone.now(),
+                )
+    
+    def shutdown(self, running):
+        """Stop running job processes and put their jobs back on the queue."""
+        for job_id, process in running.items():
+            process.terminate()
+            process.join()
+            URLMatcherJob.objects.filter(pk=job_id, status='processing').update(
+                status='pending',
+                worker_id=None,
+                updated_at=timezone.now(),
+            )
+            logger.info(f"Returned job {job_id} to the queue")
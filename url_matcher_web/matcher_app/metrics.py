@@ -0,0 +1,158 @@
+"""
+Prometheus metrics for the URL Matcher web service and job pipeline.
+
+Request latency is measured in the gunicorn processes. With
+PROMETHEUS_MULTIPROC_DIR set, every process writes its samples to that
+directory and a scrape of any process reports all of them.
+
+Job metrics are read from the database at scrape time. Jobs run in
+run_matcher_worker processes, possibly in another container, and record
+their stage timings and metrics on the job row, so every web process
+reports the same values.
+"""
+
+import functools
+import os
+import time
+
+from django.db.models import Count, FloatField, Min, Q, Sum
+from django.db.models.fields.json import KeyTextTransform, KeyTransform
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+try:
+    from prometheus_client import CollectorRegistry, Histogram, generate_latest, multiprocess
+    from prometheus_client import CONTENT_TYPE_LATEST
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+    from prometheus_client.utils import floatToGoString
+except ImportError:  # Only needed for the /metrics endpoint
+    CollectorRegistry = None
+
+# Stages of URLMatcher.run() as recorded in URLMatcherJob.stage_timings; only
+# lsh jobs estimating their recall record 'recall'
+JOB_STAGES = ('load', 'clean', 'exact', 'partial', 'recall', 'report', 'total')
+
+JOB_STAGE_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600)
+JOB_INPUT_ROWS_BUCKETS = (100, 1000, 10000, 50000, 100000, 500000, 1000000)
+
+if CollectorRegistry is not None:
+    # Not registered globally: metrics_registry() adds it to each scrape's registry
+    REQUEST_LATENCY = Histogram(
+        'url_matcher_request_duration_seconds',
+        'Time spent handling requests, by view',
+        ['view'],
+        registry=None,
+    )
+
+
+def track_latency(view_name):
+    """Decorate a view to record its latency in url_matcher_request_duration_seconds."""
+    def decorator(view):
+        if CollectorRegistry is None:
+            return view
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                REQUEST_LATENCY.labels(view=view_name).observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def _float_key(field, *keys):
+    """Cast a number stored under nested keys of a JSONField to a float."""
+    expression = field
+    for key in keys[:-1]:
+        expression = KeyTransform(key, expression)
+    return Cast(KeyTextTransform(keys[-1], expression), FloatField())
+
+
+class JobMetricsCollector:
+    """Collect job counts and finished-job histograms from the database."""
+
+    def collect(self):
+        from .models import URLMatcherJob
+
+        jobs = URLMatcherJob.objects
+        counts = dict(jobs.values_list('status').annotate(count=Count('id')).order_by())
+
+        by_status = GaugeMetricFamily('url_matcher_jobs', 'Jobs by status', labels=['status'])
+        for status, _ in URLMatcherJob.STATUS_CHOICES:
+            by_status.add_metric([status], counts.get(status, 0))
+        yield by_status
+
+        # A count of rows, not of events: a gauge, since deleting jobs lowers it
+        finished = GaugeMetricFamily('url_matcher_jobs_finished', 'Jobs in the database that reached a final status',
+                                     labels=['status'])
+        for status in ('completed', 'failed', 'cancelled'):
+            finished.add_metric([status], counts.get(status, 0))
+        yield finished
+
+        oldest = jobs.filter(status='pending').aggregate(oldest=Min('created_at'))['oldest']
+        yield GaugeMetricFamily('url_matcher_oldest_pending_job_age_seconds',
+                                'Age of the oldest job waiting in the queue',
+                                value=(timezone.now() - oldest).total_seconds() if oldest else 0)
+
+        # Jobs the matcher actually ran; jobs served from the result cache have no timings
+        ran = jobs.filter(cache_hit=False).exclude(stage_timings={})
+        aggregates = {
+            'count': Count('id'),
+            'rows': Sum('total_urls'),
+            'evaluations': Sum(_float_key('metrics', 'counters', 'similarity_evaluations')),
+        }
+        for bound in JOB_INPUT_ROWS_BUCKETS:
+            aggregates[f'rows_le_{bound}'] = Count('id', filter=Q(total_urls__lte=bound))
+        for stage in JOB_STAGES:
+            aggregates[f'{stage}_count'] = Count('id', filter=Q(**{f'stage_timings__{stage}__isnull': False}))
+            aggregates[f'{stage}_sum'] = Sum(_float_key('stage_timings', stage))
+            for bound in JOB_STAGE_BUCKETS:
+                aggregates[f'{stage}_le_{bound}'] = Count('id', filter=Q(**{f'stage_timings__{stage}__lte': bound}))
+        totals = ran.aggregate(**aggregates)
+
+        rows = HistogramMetricFamily('url_matcher_job_input_rows', 'CSV rows of the jobs the matcher ran')
+        rows.add_metric([], [(floatToGoString(bound), totals[f'rows_le_{bound}']) for bound in JOB_INPUT_ROWS_BUCKETS]
+                        + [('+Inf', totals['count'])], totals['rows'] or 0)
+        yield rows
+
+        stages = HistogramMetricFamily('url_matcher_job_stage_duration_seconds',
+                                       'Wall-clock time of each matcher stage of the jobs the matcher ran',
+                                       labels=['stage'])
+        for stage in JOB_STAGES:
+            stages.add_metric([stage], [(floatToGoString(bound), totals[f'{stage}_le_{bound}'])
+                                        for bound in JOB_STAGE_BUCKETS]
+                              + [('+Inf', totals[f'{stage}_count'])], totals[f'{stage}_sum'] or 0)
+        yield stages
+
+        # rate() of evaluations over rate() of partial matching seconds gives comparisons per second
+        yield CounterMetricFamily('url_matcher_similarity_evaluations', 'URL pairs scored by partial matching',
+                                  value=totals['evaluations'] or 0)
+        yield CounterMetricFamily('url_matcher_rows', 'CSV rows of the jobs the matcher ran',
+                                  value=totals['rows'] or 0)
+
+
+def metrics_registry():
+    """Build the registry of one scrape: request latency of every process, plus job metrics."""
+    registry = CollectorRegistry()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry.register(REQUEST_LATENCY)
+    registry.register(JobMetricsCollector())
+    return registry
+
+
+def render_metrics():
+    """Render all metrics in the Prometheus text format.
+
+    Returns:
+        tuple: (body, content type)
+    
+    Raises:
+        ImportError: If prometheus_client is not installed
+    """
+    if CollectorRegistry is None:
+        raise ImportError("The metrics endpoint requires prometheus_client")
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
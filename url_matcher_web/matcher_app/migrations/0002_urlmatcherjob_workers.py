@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='workers',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0002_urlmatcherjob_workers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='worker_id',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='urlmatcherjob',
+            index=models.Index(fields=['status', 'created_at'], name='matcher_app_status_2dceeb_idx'),
+        ),
+    ]
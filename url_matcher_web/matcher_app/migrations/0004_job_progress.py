@@ -0,0 +1,43 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0003_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='progress_current',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='progress_eta_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='progress_rate',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='progress_stage',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='progress_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='progress_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
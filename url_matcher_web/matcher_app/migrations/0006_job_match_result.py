@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0005_job_cancellation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='match_type_counts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
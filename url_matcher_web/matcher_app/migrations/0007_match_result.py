@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-18 14:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0006_job_match_result'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('live_url', models.TextField()),
+                ('staging_url', models.TextField()),
+                ('similarity', models.FloatField()),
+                ('match_type', models.CharField(max_length=50)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='match_results', to='matcher_app.urlmatcherjob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'similarity', 'id'], name='matcher_app_job_id_08842d_idx'), models.Index(fields=['job', 'match_type', 'similarity', 'id'], name='matcher_app_job_id_b2ad49_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0007_match_result'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='report_format',
+            field=models.CharField(choices=[('csv', 'CSV'), ('csv.gz', 'Gzip-compressed CSV'), ('csv.zst', 'Zstandard-compressed CSV'), ('parquet', 'Parquet (single file)')], default='csv', max_length=10),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0009_result_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='base_job',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rematches', to='matcher_app.urlmatcherjob'),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='candidates_file',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='delta_file',
+            field=models.FileField(blank=True, upload_to='csv_uploads/'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0010_job_rematch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='profile',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='profile_file',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+    ]
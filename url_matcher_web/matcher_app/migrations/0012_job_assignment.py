@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 21:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0011_job_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='assignment',
+            field=models.CharField(choices=[('best', 'Best match per Live URL'), ('greedy', 'One-to-one, highest scores first'), ('optimal', 'One-to-one, highest total similarity')], default='best', max_length=10),
+        ),
+    ]
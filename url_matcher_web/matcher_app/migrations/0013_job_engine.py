@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 21:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0012_job_assignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='engine',
+            field=models.CharField(choices=[('exhaustive', 'Exhaustive (compare every URL pair)'), ('indexed', 'Indexed (compare top candidates only)'), ('ngram', 'N-gram TF-IDF (vectorized cosine similarity)')], default='exhaustive', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 21:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0013_job_engine'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='urlmatcherjob',
+            name='engine',
+            field=models.CharField(choices=[('exhaustive', 'Exhaustive (compare every URL pair)'), ('indexed', 'Indexed (compare top candidates only)'), ('ngram', 'N-gram TF-IDF (vectorized cosine similarity)'), ('lsh', 'MinHash LSH (approximate, for very large sites)')], default='exhaustive', max_length=10),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.20 on 2026-10-18 15:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0014_job_engine_lsh'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StagingLibrary',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255)),
+                ('csv_file', models.FileField(upload_to='staging_uploads/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('url_count', models.IntegerField(default=0)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='urlmatcherjob',
+            name='staging_library',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='jobs', to='matcher_app.staginglibrary'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matcher_app', '0015_staging_library'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='matchresult',
+            index=models.Index(fields=['job', 'id'], name='matcher_app_job_id_beae02_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchresult',
+            index=models.Index(fields=['job', 'match_type', 'id'], name='matcher_app_job_id_0fd5b7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchresult',
+            index=models.Index(condition=models.Q(('match_type', 'Exact'), _negated=True), fields=['job', 'similarity', 'id'], name='matcher_app_partial_sim_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchresult',
+            index=models.Index(condition=models.Q(('match_type', 'Exact'), _negated=True), fields=['job', 'id'], name='matcher_app_partial_id_idx'),
+        ),
+    ]
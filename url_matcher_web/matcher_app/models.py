@@ -7,21 +7,75 @@ from django.conf import settings
 class URLMatcherJob(models.Model):
     """Model to track URL matcher job status and results."""
     
+    REPORT_FORMAT_CHOICES = (
+        ('csv', 'CSV'),
+        ('csv.gz', 'Gzip-compressed CSV'),
+        ('csv.zst', 'Zstandard-compressed CSV'),
+        ('parquet', 'Parquet (single file)'),
+    )
+    
+    ENGINE_CHOICES = (
+        ('exhaustive', 'Exhaustive (compare every URL pair)'),
+        ('indexed', 'Indexed (compare top candidates only)'),
+        ('ngram', 'N-gram TF-IDF (vectorized cosine similarity)'),
+        ('lsh', 'MinHash LSH (approximate, for very large sites)'),
+    )
+    
+    ASSIGNMENT_CHOICES = (
+        ('best', 'Best match per Live URL'),
+        ('greedy', 'One-to-one, highest scores first'),
+        ('optimal', 'One-to-one, highest total similarity'),
+    )
+    
     STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('processing', 'Processing'),
         ('completed', 'Completed'),
         ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
     )
     
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     csv_file = models.FileField(upload_to='csv_uploads/')
     similarity_threshold = models.FloatField(default=0.7)
+    workers = models.PositiveSmallIntegerField(default=1)
+    report_format = models.CharField(max_length=10, choices=REPORT_FORMAT_CHOICES, default='csv')
+    engine = models.CharField(max_length=10, choices=ENGINE_CHOICES, default='exhaustive')
+    assignment = models.CharField(max_length=10, choices=ASSIGNMENT_CHOICES, default='best')
+    profile = models.BooleanField(default=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     error_message = models.TextField(blank=True, null=True)
     
+    # Queue bookkeeping, maintained by the run_matcher_worker command
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    worker_id = models.CharField(max_length=255, blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    cancel_requested = models.BooleanField(default=False)
+    
+    # Re-matching: the job whose scored candidates this job reuses, and the rows
+    # uploaded to append to that job's CSV
+    base_job = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='rematches')
+    delta_file = models.FileField(upload_to='csv_uploads/', blank=True)
+    
+    # Staging URLs uploaded once and matched against instead of the CSV's Staging column
+    staging_library = models.ForeignKey('StagingLibrary', on_delete=models.PROTECT, blank=True, null=True,
+                                        related_name='jobs')
+    
+    # Result cache: key of the CSV content and parameters, and whether the results were reused
+    cache_key = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    cache_hit = models.BooleanField(default=False)
+    
+    # Live progress, written by the matcher while the job runs
+    progress_stage = models.CharField(max_length=20, blank=True, default='')
+    progress_current = models.IntegerField(default=0)
+    progress_total = models.IntegerField(default=0)
+    progress_rate = models.FloatField(default=0)
+    progress_eta_seconds = models.FloatField(blank=True, null=True)
+    progress_updated_at = models.DateTimeField(blank=True, null=True)
+    
     # Result paths
     summary_file = models.CharField(max_length=255, blank=True, null=True)
     results_file = models.CharField(max_length=255, blank=True, null=True)
@@ -29,6 +83,8 @@ class URLMatcherJob(models.Model):
     partial_matches_file = models.CharField(max_length=255, blank=True, null=True)
     unmatched_live_file = models.CharField(max_length=255, blank=True, null=True)
     unmatched_staging_file = models.CharField(max_length=255, blank=True, null=True)
+    candidates_file = models.CharField(max_length=255, blank=True, null=True)
+    profile_file = models.CharField(max_length=255, blank=True, null=True)
     
     # Statistics
     total_urls = models.IntegerField(default=0)
@@ -36,6 +92,40 @@ class URLMatcherJob(models.Model):
     partial_matches = models.IntegerField(default=0)
     unmatched_live = models.IntegerField(default=0)
     unmatched_staging = models.IntegerField(default=0)
+    match_type_counts = models.JSONField(default=dict, blank=True)
+    stage_timings = models.JSONField(default=dict, blank=True)
+    # Per-stage wall/CPU time and memory, similarity evaluation counts and cache hit rates
+    metrics = models.JSONField(default=dict, blank=True)
+    
+    # Report name -> field holding the path of that report file
+    REPORT_FILE_FIELDS = {
+        'summary': 'summary_file',
+        'results': 'results_file',
+        'exact_matches': 'exact_matches_file',
+        'partial_matches': 'partial_matches_file',
+        'unmatched_live': 'unmatched_live_file',
+        'unmatched_staging': 'unmatched_staging_file',
+        'candidates': 'candidates_file',
+    }
+    
+    STATISTICS_FIELDS = [
+        'total_urls', 'exact_matches', 'partial_matches',
+        'unmatched_live', 'unmatched_staging', 'match_type_counts',
+    ]
+    
+    # Fields a worker saves when it finishes a job. The progress columns and
+    # cancel_requested are left out: they are updated by other processes while
+    # the job runs, and saving the worker's stale copies would undo them
+    OUTCOME_FIELDS = [
+        'status', 'error_message', 'updated_at', 'csv_file', 'cache_key', 'cache_hit',
+        *REPORT_FILE_FIELDS.values(), 'profile_file',
+        *STATISTICS_FIELDS, 'stage_timings', 'metrics',
+    ]
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
     
     def __str__(self):
         return f"URL Matcher Job {self.id} - {self.status}"
@@ -47,9 +137,115 @@ class URLMatcherJob(models.Model):
             os.makedirs(job_output_dir)
         return job_output_dir
     
+    def get_progress(self):
+        """Get the job's progress as a JSON-serializable dict."""
+        percent = None
+        if self.progress_total:
+            percent = round(100.0 * self.progress_current / self.progress_total, 1)
+        return {
+            'stage': self.progress_stage,
+            'current': self.progress_current,
+            'total': self.progress_total,
+            'percent': percent,
+            'rate': round(self.progress_rate, 1),
+            'eta_seconds': round(self.progress_eta_seconds) if self.progress_eta_seconds is not None else None,
+            'updated_at': self.progress_updated_at.isoformat() if self.progress_updated_at else None,
+        }
+    
+    def get_report_files(self):
+        """Get the report files of this job that exist on disk, keyed by report name."""
+        report_files = {name: getattr(self, field) for name, field in self.REPORT_FILE_FIELDS.items()}
+        # Profiles are never cached, so they aren't in REPORT_FILE_FIELDS
+        report_files['profile'] = self.profile_file
+        return {name: path for name, path in report_files.items() if path and os.path.exists(path)}
+    
     def get_summary_content(self):
         """Get the content of the summary file."""
         if self.summary_file and os.path.exists(self.summary_file):
             with open(self.summary_file, 'r') as f:
                 return f.read()
         return None
+
+
+class StagingLibrary(models.Model):
+    """A set of Staging URLs uploaded once and shared by the jobs that match against it.
+    
+    The first job that uses it cleans and indexes the URLs into a matcher
+    StagingLibrary directory under get_dir(); later jobs, and their worker
+    processes, memory-map that directory.
+    """
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=255)
+    csv_file = models.FileField(upload_to='staging_uploads/')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Set once the on-disk library has been built
+    url_count = models.IntegerField(default=0)
+    built_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return self.name
+    
+    def get_dir(self):
+        """Get the directory holding this library's cleaned URLs and index."""
+        return os.path.join(settings.URL_MATCHER_STAGING_LIBRARY_DIR, str(self.id))
+
+
+class ResultCacheEntry(models.Model):
+    """Report files and statistics of a completed job, reusable by jobs with the same cache key."""
+    
+    key = models.CharField(max_length=64, unique=True)
+    # Job field name -> path of the cached copy of that report file
+    files = models.JSONField(default=dict)
+    # Values of URLMatcherJob.STATISTICS_FIELDS
+    statistics = models.JSONField(default=dict)
+    size_bytes = models.BigIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"Result cache entry {self.key}"
+    
+    def get_dir(self):
+        """Get the directory holding this entry's report files."""
+        return os.path.join(settings.URL_MATCHER_RESULT_CACHE_DIR, self.key)
+
+
+class MatchResult(models.Model):
+    """A single exact or partial match found by a URL matcher job."""
+    
+    EXACT = 'Exact'
+    
+    job = models.ForeignKey(URLMatcherJob, on_delete=models.CASCADE, related_name='match_results')
+    live_url = models.TextField()
+    staging_url = models.TextField()
+    similarity = models.FloatField()
+    match_type = models.CharField(max_length=50)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', 'similarity', 'id']),
+            models.Index(fields=['job', 'match_type', 'similarity', 'id']),
+            # The 'file' sort, with and without a match type filter
+            models.Index(fields=['job', 'id']),
+            models.Index(fields=['job', 'match_type', 'id']),
+            # The 'partial' filter excludes exact matches, which no match_type prefix covers
+            models.Index(fields=['job', 'similarity', 'id'], condition=~models.Q(match_type='Exact'),
+                         name='matcher_app_partial_sim_idx'),
+            models.Index(fields=['job', 'id'], condition=~models.Q(match_type='Exact'),
+                         name='matcher_app_partial_id_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.live_url} -> {self.staging_url} ({self.match_type})"
+    
+    def to_dict(self):
+        """Get the match as a JSON-serializable dict."""
+        return {
+            'live_url': self.live_url,
+            'staging_url': self.staging_url,
+            'similarity': self.similarity,
+            'match_type': self.match_type,
+        }
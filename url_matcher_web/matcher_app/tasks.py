@@ -1,16 +1,486 @@
+import codecs
+import fcntl
 import os
 import sys
+import shutil
 import pandas as pd
 import logging
+import time
 import traceback
+from datetime import timedelta
+from itertools import islice
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
 
 # Add the parent directory to sys.path to import the matcher module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-from matcher import URLMatcher
+from matcher import URLMatcher, MatchAborted, MatchCandidates, StagingLibrary, read_report_file, result_cache_key
 
 logger = logging.getLogger(__name__)
 
+
+class JobProgressReporter:
+    """
+    Progress callback for URLMatcher that stores progress on a URLMatcherJob.
+    
+    Writes are rate-limited to one per URL_MATCHER_PROGRESS_INTERVAL_SECONDS,
+    except at stage changes and stage completion, and touch only the progress
+    columns. Throughput and ETA are measured from the start of each stage.
+    """
+    
+    def __init__(self, job):
+        self.job_id = job.pk
+        self.min_interval = settings.URL_MATCHER_PROGRESS_INTERVAL_SECONDS
+        self.stage = None
+        self.stage_started = 0
+        self.last_write = 0
+    
+    def __call__(self, stage, current, total):
+        from .models import URLMatcherJob
+        
+        now = time.monotonic()
+        if stage != self.stage:
+            self.stage = stage
+            self.stage_started = now
+        elif now - self.last_write < self.min_interval and not (total and current >= total):
+            return
+        
+        elapsed = now - self.stage_started
+        rate = current / elapsed if current and elapsed > 0 else 0
+        eta = (total - current) / rate if rate and total else None
+        
+        URLMatcherJob.objects.filter(pk=self.job_id).update(
+            progress_stage=stage,
+            progress_current=current,
+            progress_total=total,
+            progress_rate=rate,
+            progress_eta_seconds=eta,
+            progress_updated_at=timezone.now(),
+        )
+        self.last_write = now
+
+
+class JobCancelCheck:
+    """
+    Cancellation check for URLMatcher that polls a URLMatcherJob's cancel flag.
+    
+    The database is queried at most once per URL_MATCHER_CANCEL_CHECK_SECONDS.
+    """
+    
+    def __init__(self, job):
+        self.job_id = job.pk
+        self.min_interval = settings.URL_MATCHER_CANCEL_CHECK_SECONDS
+        self.last_check = 0
+        self.cancelled = False
+    
+    def __call__(self):
+        from .models import URLMatcherJob
+        
+        now = time.monotonic()
+        if not self.cancelled and now - self.last_check >= self.min_interval:
+            self.cancelled = URLMatcherJob.objects.filter(pk=self.job_id, cancel_requested=True).exists()
+            self.last_check = now
+        return self.cancelled
+
+
+def store_match_result(job, result):
+    """
+    Record a matcher run's report files and statistics on a job.
+    
+    Args:
+        job: URLMatcherJob instance
+        result: MatchRunResult returned by URLMatcher.run()
+    """
+    # Update job with file paths
+    job.summary_file = result.artifacts.get('summary', '')
+    # The parquet format writes a single file holding every match
+    job.results_file = result.artifacts.get('full_results', result.artifacts.get('matches', ''))
+    job.exact_matches_file = result.artifacts.get('exact_matches', '')
+    job.partial_matches_file = result.artifacts.get('partial_matches', '')
+    job.unmatched_live_file = result.artifacts.get('unmatched_live', '')
+    job.unmatched_staging_file = result.artifacts.get('unmatched_staging', '')
+    job.candidates_file = result.artifacts.get('candidates', '')
+    
+    # Update statistics
+    job.total_urls = result.summary['total_urls']
+    job.exact_matches = result.summary['exact_matches']
+    job.partial_matches = result.summary['partial_matches']
+    job.unmatched_live = result.summary['unmatched_live']
+    job.unmatched_staging = result.summary['unmatched_staging']
+    job.match_type_counts = result.match_types
+    job.stage_timings = result.timings
+    job.metrics = result.metrics
+    job.profile_file = result.artifacts.get('profile', '')
+
+
+def iter_match_records(exact_matches, partial_matches):
+    """
+    Yield (live_url, staging_url, similarity, match_type) for every match.
+    
+    Args:
+        exact_matches: Records with Live_URL and Staging_URL
+        partial_matches: Records that also have Similarity and Match_Type
+    """
+    for match in exact_matches:
+        yield match['Live_URL'], match['Staging_URL'], 1.0, 'Exact'
+    for match in partial_matches:
+        yield match['Live_URL'], match['Staging_URL'], float(match['Similarity']), match['Match_Type']
+
+
+def store_match_rows(job, records):
+    """
+    Replace a job's MatchResult rows, inserting them in batches.
+    
+    Args:
+        job: URLMatcherJob instance
+        records: Iterable of (live_url, staging_url, similarity, match_type)
+    
+    Returns:
+        int: Number of rows stored
+    """
+    from .models import MatchResult
+    
+    batch_size = settings.URL_MATCHER_RESULT_BATCH_SIZE
+    records = iter(records)
+    stored = 0
+    with transaction.atomic():
+        # A retried job starts from scratch
+        MatchResult.objects.filter(job=job).delete()
+        while True:
+            batch = [
+                MatchResult(job=job, live_url=live_url, staging_url=staging_url,
+                            similarity=similarity, match_type=match_type)
+                for live_url, staging_url, similarity, match_type in islice(records, batch_size)
+            ]
+            if not batch:
+                break
+            MatchResult.objects.bulk_create(batch, batch_size=batch_size)
+            stored += len(batch)
+    return stored
+
+
+def store_match_results(job, result):
+    """
+    Store the matches of a matcher run as MatchResult rows.
+    
+    Args:
+        job: URLMatcherJob instance
+        result: MatchRunResult returned by URLMatcher.run()
+    
+    Returns:
+        int: Number of rows stored
+    """
+    return store_match_rows(job, iter_match_records(result.results['exact_matches'],
+                                                    result.results['partial_matches']))
+
+
+def import_match_result_files(job):
+    """
+    Store the matches of a job from its exact and partial match report files.
+    
+    Used for jobs served from the result cache, and for jobs that finished
+    before matches were stored in the database.
+    
+    Args:
+        job: URLMatcherJob instance
+    
+    Returns:
+        int: Number of rows stored
+    """
+    if job.report_format == 'parquet':
+        matches = read_report_file(job.results_file)
+        exact = matches[matches['Match_Type'] == 'Exact']
+        partial = matches[matches['Match_Type'].str.startswith('Partial')]
+        return store_match_rows(job, iter_match_records(exact.to_dict('records'), partial.to_dict('records')))
+    
+    frames = []
+    for path in (job.exact_matches_file, job.partial_matches_file):
+        if path and os.path.exists(path) and os.path.getsize(path) > 1:
+            frames.append(read_report_file(path).to_dict('records'))
+        else:
+            frames.append([])
+    return store_match_rows(job, iter_match_records(*frames))
+
+
+def link_or_copy(path, directory):
+    """
+    Hard-link a file into a directory, copying it if it can't be linked.
+    
+    Args:
+        path: Path of the file
+        directory: Directory to place it in
+    
+    Returns:
+        str: Path of the linked or copied file
+    """
+    target = os.path.join(directory, os.path.basename(path))
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(path, target)
+    except OSError:
+        shutil.copy2(path, target)
+    return target
+
+
+def get_job_cache_key(job):
+    """
+    Get the result cache key of a job: its CSV content and the parameters that affect its results.
+    
+    Args:
+        job: URLMatcherJob instance
+    
+    Returns:
+        str: Cache key
+    """
+    return result_cache_key(job.csv_file.path, {
+        'similarity_threshold': job.similarity_threshold,
+        'report_format': job.report_format,
+        'engine': job.engine,
+        'assignment': job.assignment,
+        # Decide whether a candidates file is kept for later re-matches
+        'keep_candidates': settings.URL_MATCHER_KEEP_CANDIDATES,
+        'candidate_floor': settings.URL_MATCHER_CANDIDATE_FLOOR,
+        # Chunked loading keeps only the URL columns of the CSV in the reports
+        'chunksize': settings.URL_MATCHER_CSV_CHUNKSIZE or None,
+        # Libraries are never changed after upload, so their ID stands for their content
+        'staging_library': str(job.staging_library_id) if job.staging_library_id else None,
+    })
+
+
+def serve_from_result_cache(job):
+    """
+    Complete a job with the cached results of an earlier job with the same cache key.
+    
+    The cached report files are hard-linked into the job's output directory, its
+    statistics copied over and its MatchResult rows imported from the report
+    files. The rows are stored in the transaction that saves the completed job,
+    so its results are never viewed without them.
+    
+    Args:
+        job: URLMatcherJob instance
+    
+    Returns:
+        bool: True if the job was completed from the cache
+    """
+    from .models import ResultCacheEntry, URLMatcherJob
+    
+    if not settings.URL_MATCHER_RESULT_CACHE_MAX_MB:
+        return False
+    if not job.cache_key:
+        job.cache_key = get_job_cache_key(job)
+    # A profiled job is run to be measured; its results are still cached for others
+    if job.profile:
+        return False
+    
+    entry = ResultCacheEntry.objects.filter(key=job.cache_key).first()
+    if entry is None:
+        return False
+    
+    output_dir = job.get_output_dir()
+    try:
+        files = {field: link_or_copy(path, output_dir) for field, path in entry.files.items()}
+    except OSError as e:
+        logger.warning(f"Dropping unreadable result cache entry {entry.key}: {str(e)}")
+        evict_result_cache_entries([entry])
+        return False
+    
+    for field, path in files.items():
+        setattr(job, field, path)
+    for field, value in entry.statistics.items():
+        setattr(job, field, value)
+    job.status = 'completed'
+    job.cache_hit = True
+    with transaction.atomic():
+        import_match_result_files(job)
+        job.save(update_fields=URLMatcherJob.OUTCOME_FIELDS)
+    
+    ResultCacheEntry.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    logger.info(f"URL matcher job {job.id} served from result cache entry {entry.key}")
+    return True
+
+
+def store_in_result_cache(job):
+    """
+    Add the report files and statistics of a completed job to the result cache.
+    
+    Args:
+        job: Completed URLMatcherJob instance with a cache key
+    """
+    from .models import ResultCacheEntry, URLMatcherJob
+    
+    if not settings.URL_MATCHER_RESULT_CACHE_MAX_MB or not job.cache_key:
+        return
+    if ResultCacheEntry.objects.filter(key=job.cache_key).exists():
+        return
+    
+    entry = ResultCacheEntry(key=job.cache_key)
+    cache_dir = entry.get_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        for field in URLMatcherJob.REPORT_FILE_FIELDS.values():
+            path = getattr(job, field)
+            if path and os.path.exists(path):
+                entry.files[field] = link_or_copy(path, cache_dir)
+                entry.size_bytes += os.path.getsize(path)
+        entry.statistics = {field: getattr(job, field) for field in URLMatcherJob.STATISTICS_FIELDS}
+        entry.save()
+    except (OSError, IntegrityError) as e:
+        # Another worker cached the same results first, or the files are gone
+        logger.warning(f"Could not cache results of URL matcher job {job.id}: {str(e)}")
+        if not ResultCacheEntry.objects.filter(key=job.cache_key).exists():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        return
+    
+    evict_result_cache()
+
+
+def evict_result_cache_entries(entries):
+    """
+    Delete result cache entries and their report files.
+    
+    Jobs served from an entry keep their own hard links or copies of the files.
+    
+    Args:
+        entries: ResultCacheEntry instances
+    """
+    for entry in entries:
+        shutil.rmtree(entry.get_dir(), ignore_errors=True)
+        entry.delete()
+
+
+def evict_result_cache():
+    """
+    Evict result cache entries by age, then by total size.
+    
+    Entries unused for URL_MATCHER_RESULT_CACHE_MAX_AGE_DAYS are evicted first,
+    then the least recently used entries until the cache fits in
+    URL_MATCHER_RESULT_CACHE_MAX_MB.
+    
+    Returns:
+        int: Number of entries evicted
+    """
+    from .models import ResultCacheEntry
+    
+    cutoff = timezone.now() - timedelta(days=settings.URL_MATCHER_RESULT_CACHE_MAX_AGE_DAYS)
+    evicted = list(ResultCacheEntry.objects.filter(last_used_at__lt=cutoff))
+    
+    remaining = ResultCacheEntry.objects.filter(last_used_at__gte=cutoff)
+    total_bytes = remaining.aggregate(total=Sum('size_bytes'))['total'] or 0
+    max_bytes = settings.URL_MATCHER_RESULT_CACHE_MAX_MB * 1024 * 1024
+    if total_bytes > max_bytes:
+        for entry in remaining.order_by('last_used_at'):
+            if total_bytes <= max_bytes:
+                break
+            evicted.append(entry)
+            total_bytes -= entry.size_bytes
+    
+    evict_result_cache_entries(evicted)
+    if evicted:
+        logger.info(f"Evicted {len(evicted)} result cache entries")
+    return len(evicted)
+
+
+def combine_delta_csv(job):
+    """
+    Point a re-match job with a delta CSV at its base job's CSV with the delta rows appended.
+    
+    The combined file is named after the job, so a retried job reuses it.
+    
+    Args:
+        job: URLMatcherJob instance with a base job and a delta file
+    
+    Raises:
+        ValueError: If the delta CSV's columns differ from the base job's CSV
+    """
+    combined_name = f'csv_uploads/combined_{job.id}.csv'
+    combined_path = job.csv_file.storage.path(combined_name)
+    
+    if not os.path.exists(combined_path):
+        with open(job.base_job.csv_file.path, 'rb') as base, open(job.delta_file.path, 'rb') as delta:
+            header = base.readline()
+            if delta.readline().lstrip(codecs.BOM_UTF8).strip() != header.lstrip(codecs.BOM_UTF8).strip():
+                raise ValueError("The delta CSV's columns don't match the base job's CSV")
+            
+            # Written under a temporary name so a crash never leaves a truncated file behind
+            partial_path = combined_path + '.part'
+            with open(partial_path, 'w+b') as combined:
+                combined.write(header)
+                shutil.copyfileobj(base, combined)
+                combined.seek(-1, os.SEEK_END)
+                if combined.read(1) != b'\n':
+                    combined.write(b'\n')
+                shutil.copyfileobj(delta, combined)
+            os.replace(partial_path, combined_path)
+    
+    job.csv_file.name = combined_name
+
+
+def load_seed_candidates(job):
+    """
+    Load the scored candidates of a job's base job, if it kept them.
+    
+    Args:
+        job: URLMatcherJob instance
+    
+    Returns:
+        MatchCandidates: The base job's candidates, or None
+    """
+    base_job = job.base_job
+    if base_job is None or not base_job.candidates_file or not os.path.exists(base_job.candidates_file):
+        return None
+    try:
+        return MatchCandidates.load(base_job.candidates_file)
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"Could not load the candidates of URL matcher job {base_job.id}: {str(e)}")
+        return None
+
+
+def load_staging_library(job):
+    """
+    Open the on-disk index of a job's staging library, building it on first use.
+    
+    Builds hold an exclusive lock on a file next to the library, so job processes
+    that find the same library unbuilt build it once and don't replace a library
+    other jobs have open.
+    
+    Args:
+        job: URLMatcherJob instance
+    
+    Returns:
+        StagingLibrary: The memory-mapped library, or None if the job has none
+    """
+    library = job.staging_library
+    if library is None:
+        return None
+    
+    path = library.get_dir()
+    try:
+        return StagingLibrary(path)
+    except (OSError, ValueError):
+        # Not built yet, or built by a matcher with another library format
+        pass
+    
+    os.makedirs(settings.URL_MATCHER_STAGING_LIBRARY_DIR, exist_ok=True)
+    with open(f'{path}.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # Built by another job while this one waited for the lock
+            return StagingLibrary(path)
+        except (OSError, ValueError):
+            pass
+        # No job can open a library that is missing or in another format, so replacing it is safe
+        built = StagingLibrary.build_from_csv(library.csv_file.path, path, replace=True)
+    
+    library.url_count = built.count
+    library.built_at = timezone.now()
+    library.save(update_fields=['url_count', 'built_at'])
+    logger.info(f"Built staging library {library.id} with {built.count} Staging URLs")
+    return built
+
+
 def process_url_matcher_job(job):
     """
     Process a URL matcher job in the background.
@@ -24,9 +494,13 @@ def process_url_matcher_job(job):
     from .models import URLMatcherJob
     
     try:
-        # Update job status
-        job.status = 'processing'
-        job.save()
+        # A re-match with added rows matches the base job's CSV plus those rows
+        if job.delta_file and job.base_job is not None:
+            combine_delta_csv(job)
+        
+        # An identical job may have completed while this one was queued
+        if serve_from_result_cache(job):
+            return True
         
         # Get the file path
         csv_file_path = job.csv_file.path
@@ -38,64 +512,51 @@ def process_url_matcher_job(job):
         matcher = URLMatcher(
             csv_path=csv_file_path,
             output_dir=output_dir,
-            similarity_threshold=job.similarity_threshold
+            similarity_threshold=job.similarity_threshold,
+            engine=job.engine,
+            workers=min(job.workers, settings.URL_MATCHER_MAX_WORKERS),
+            chunksize=settings.URL_MATCHER_CSV_CHUNKSIZE or None,
+            progress_callback=JobProgressReporter(job),
+            cancel_check=JobCancelCheck(job),
+            max_seconds=settings.URL_MATCHER_JOB_MAX_SECONDS or None,
+            max_memory_mb=settings.URL_MATCHER_JOB_MAX_MEMORY_MB or None,
+            report_format=job.report_format,
+            keep_candidates=settings.URL_MATCHER_KEEP_CANDIDATES,
+            candidate_floor=settings.URL_MATCHER_CANDIDATE_FLOOR,
+            seed_candidates=load_seed_candidates(job),
+            profile=job.profile,
+            assignment=job.assignment,
+            recall_sample=settings.URL_MATCHER_LSH_RECALL_SAMPLE,
+            staging_library=load_staging_library(job)
         )
         
-        success = matcher.run()
+        try:
+            result = matcher.run()
+        except MatchAborted as e:
+            # Keep the partial results the matcher flushed before stopping
+            if matcher.result is not None:
+                store_match_result(job, matcher.result)
+                store_match_results(job, matcher.result)
+            job.status = 'cancelled' if e.reason == 'cancelled' else 'failed'
+            job.error_message = str(e)
+            job.save(update_fields=URLMatcherJob.OUTCOME_FIELDS)
+            logger.info(f"URL matcher job {job.id} aborted: {str(e)}")
+            return False
         
-        if success:
+        if result:
             # Update job with results
             job.status = 'completed'
             
-            # Get the latest report files (most recent by timestamp)
-            report_files = {}
-            for file in os.listdir(output_dir):
-                if file.startswith('url_matching_summary_'):
-                    report_files['summary'] = os.path.join(output_dir, file)
-                elif file.startswith('url_matching_results_'):
-                    report_files['results'] = os.path.join(output_dir, file)
-                elif file.startswith('exact_matches_'):
-                    report_files['exact_matches'] = os.path.join(output_dir, file)
-                elif file.startswith('partial_matches_'):
-                    report_files['partial_matches'] = os.path.join(output_dir, file)
-                elif file.startswith('unmatched_live_'):
-                    report_files['unmatched_live'] = os.path.join(output_dir, file)
-                elif file.startswith('unmatched_staging_'):
-                    report_files['unmatched_staging'] = os.path.join(output_dir, file)
+            store_match_result(job, result)
+            store_match_results(job, result)
             
-            # Update job with file paths
-            job.summary_file = report_files.get('summary', '')
-            job.results_file = report_files.get('results', '')
-            job.exact_matches_file = report_files.get('exact_matches', '')
-            job.partial_matches_file = report_files.get('partial_matches', '')
-            job.unmatched_live_file = report_files.get('unmatched_live', '')
-            job.unmatched_staging_file = report_files.get('unmatched_staging', '')
-            
-            # Update statistics
-            if job.summary_file and os.path.exists(job.summary_file):
-                # Parse the summary file to extract statistics
-                with open(job.summary_file, 'r') as f:
-                    summary_content = f.read()
-                    
-                    # Extract statistics from summary content
-                    for line in summary_content.split('\n'):
-                        if 'Total URLs analyzed:' in line:
-                            job.total_urls = int(line.split(':')[1].strip())
-                        elif 'Exact matches:' in line:
-                            job.exact_matches = int(line.split(':')[1].strip().split(' ')[0])
-                        elif 'Partial matches:' in line:
-                            job.partial_matches = int(line.split(':')[1].strip().split(' ')[0])
-                        elif 'Unmatched Live URLs:' in line:
-                            job.unmatched_live = int(line.split(':')[1].strip().split(' ')[0])
-                        elif 'Unmatched Staging URLs:' in line:
-                            job.unmatched_staging = int(line.split(':')[1].strip().split(' ')[0])
-            
-            job.save()
+            job.save(update_fields=URLMatcherJob.OUTCOME_FIELDS)
+            store_in_result_cache(job)
             return True
         else:
             job.status = 'failed'
             job.error_message = 'URL matcher failed to run successfully'
-            job.save()
+            job.save(update_fields=URLMatcherJob.OUTCOME_FIELDS)
             return False
     
     except Exception as e:
@@ -106,6 +567,79 @@ def process_url_matcher_job(job):
         # Update job status
         job.status = 'failed'
         job.error_message = str(e)
-        job.save()
+        job.save(update_fields=URLMatcherJob.OUTCOME_FIELDS)
         
         return False
+
+
+def claim_next_job(worker_id):
+    """
+    Claim the oldest pending job for a worker.
+    
+    On PostgreSQL the row is locked with SELECT ... FOR UPDATE SKIP LOCKED so
+    concurrent workers never wait on each other. Backends without row locks
+    (SQLite) ignore the locking clause, and the conditional status update still
+    guarantees a job is claimed only once.
+    
+    Args:
+        worker_id: Identifier of the claiming worker
+    
+    Returns:
+        URLMatcherJob: The claimed job, or None if the queue is empty
+    """
+    from .models import URLMatcherJob
+    
+    with transaction.atomic():
+        job = (URLMatcherJob.objects
+               .select_for_update(skip_locked=True)
+               .filter(status='pending')
+               .order_by('created_at')
+               .first())
+        if job is None:
+            return None
+        
+        now = timezone.now()
+        claimed = URLMatcherJob.objects.filter(pk=job.pk, status='pending').update(
+            status='processing',
+            claimed_at=now,
+            heartbeat_at=now,
+            worker_id=worker_id,
+            attempts=F('attempts') + 1,
+        )
+        if not claimed:
+            return None
+    
+    job.refresh_from_db()
+    return job
+
+
+def requeue_stale_jobs():
+    """
+    Return jobs whose worker stopped sending heartbeats to the queue.
+    
+    Jobs that already used up URL_MATCHER_JOB_MAX_ATTEMPTS are failed instead.
+    
+    Returns:
+        int: Number of jobs requeued or failed
+    """
+    from .models import URLMatcherJob
+    
+    cutoff = timezone.now() - timedelta(seconds=settings.URL_MATCHER_JOB_STALE_SECONDS)
+    stale = URLMatcherJob.objects.filter(status='processing').filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, updated_at__lt=cutoff)
+    )
+    
+    failed = stale.filter(attempts__gte=settings.URL_MATCHER_JOB_MAX_ATTEMPTS).update(
+        status='failed',
+        error_message='Job was abandoned by its worker too many times',
+        updated_at=timezone.now(),
+    )
+    requeued = stale.filter(attempts__lt=settings.URL_MATCHER_JOB_MAX_ATTEMPTS).update(
+        status='pending',
+        worker_id=None,
+        updated_at=timezone.now(),
+    )
+    
+    if failed or requeued:
+        logger.warning(f"Requeued {requeued} and failed {failed} stale URL matcher jobs")
+    return failed + requeued
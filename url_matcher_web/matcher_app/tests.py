@@ -1,3 +1,406 @@
+import fcntl
+import logging
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipIf
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from . import metrics, tasks
+from .models import MatchResult, StagingLibrary, URLMatcherJob
+from .tasks import MatchAborted, URLMatcher, claim_next_job, process_url_matcher_job, requeue_stale_jobs
+
+# Importing tasks put the matcher module on the path
+from matcher import check_report_format  # noqa: E402
+
+# The matcher logs every stage at INFO, which drowns out test failures
+logging.getLogger('url_matcher').setLevel(logging.WARNING)
+
+SAMPLE_CSV = b"""Live_URL,Staging_URL
+https://www.example.com/about-us,https://www.example.com/about-us
+https://www.example.com/contact,https://www.example.com/contact-us
+https://www.example.com/blog/seo-guide,https://www.example.com/news/seo-guide
+https://www.example.com/products/shoes,https://www.example.com/shop/running-shoes
+"""
+
+
+class MatcherTestCase(TestCase):
+    """Test case that keeps uploads and reports in a temporary media directory."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = self.settings(
+            MEDIA_ROOT=media.name,
+            URL_MATCHER_OUTPUT_DIR=os.path.join(media.name, 'url_matcher_output'),
+            URL_MATCHER_RESULT_CACHE_DIR=os.path.join(media.name, 'url_matcher_cache'),
+            URL_MATCHER_STAGING_LIBRARY_DIR=os.path.join(media.name, 'staging_libraries'),
+            URL_MATCHER_MAX_WORKERS=1,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_job(self, content=SAMPLE_CSV, created_minutes_ago=0, **fields):
+        """Create a job for a CSV upload, created the given number of minutes ago."""
+        job = URLMatcherJob(**fields)
+        job.csv_file.save('urls.csv', ContentFile(content), save=False)
+        job.save()
+        if created_minutes_ago:
+            URLMatcherJob.objects.filter(pk=job.pk).update(
+                created_at=timezone.now() - timedelta(minutes=created_minutes_ago))
+        return job
+
+
+class JobQueueTest(MatcherTestCase):
+    """Jobs are claimed once, oldest first, and put back when their worker goes away."""
+
+    def test_claims_oldest_pending_job(self):
+        newer = self.create_job(created_minutes_ago=1)
+        older = self.create_job(created_minutes_ago=2)
+        self.create_job(status='completed', created_minutes_ago=3)
+
+        claimed = claim_next_job('worker-1')
+        self.assertEqual(claimed.pk, older.pk)
+        self.assertEqual(claimed.status, 'processing')
+        self.assertEqual(claimed.worker_id, 'worker-1')
+        self.assertEqual(claimed.attempts, 1)
+        self.assertIsNotNone(claimed.heartbeat_at)
+
+        self.assertEqual(claim_next_job('worker-2').pk, newer.pk)
+        self.assertIsNone(claim_next_job('worker-3'))
+
+    def test_requeues_stale_jobs(self):
+        job = self.create_job()
+        claim_next_job('worker-1')
+        stale = timezone.now() - timedelta(hours=1)
+        URLMatcherJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+
+        with self.settings(URL_MATCHER_JOB_STALE_SECONDS=60, URL_MATCHER_JOB_MAX_ATTEMPTS=2):
+            self.assertEqual(requeue_stale_jobs(), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'pending')
+            self.assertIsNone(job.worker_id)
+
+            # Out of attempts: failed instead of requeued
+            claim_next_job('worker-2')
+            URLMatcherJob.objects.filter(pk=job.pk).update(heartbeat_at=stale)
+            self.assertEqual(requeue_stale_jobs(), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'failed')
+
+    def test_leaves_live_jobs_alone(self):
+        self.create_job()
+        claim_next_job('worker-1')
+        with self.settings(URL_MATCHER_JOB_STALE_SECONDS=60):
+            self.assertEqual(requeue_stale_jobs(), 0)
+
+    def test_processes_claimed_job(self):
+        job = self.create_job()
+        self.assertTrue(process_url_matcher_job(claim_next_job('worker-1')))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.total_urls, 4)
+        self.assertEqual(job.exact_matches, 1)
+        self.assertEqual(job.match_results.count(), job.exact_matches + job.partial_matches)
+        self.assertTrue(os.path.exists(job.summary_file))
+
+    def test_reports_keep_extra_columns(self):
+        rows = SAMPLE_CSV.decode().splitlines()
+        content = '\n'.join([rows[0] + ',Notes'] + [f'{row},note {i}' for i, row in enumerate(rows[1:])])
+        job = self.create_job(content=content.encode())
+        self.assertTrue(process_url_matcher_job(claim_next_job('worker-1')))
+
+        job.refresh_from_db()
+        full_results = tasks.read_report_file(job.get_report_files()['results'])
+        self.assertEqual(list(full_results['Notes']), [f'note {i}' for i in range(len(rows) - 1)])
+
+
+class JobCancelTest(MatcherTestCase):
+    """Cancelling stops pending jobs outright and running jobs at their next checkpoint."""
+
+    def cancel(self, job):
+        return self.client.post(reverse('cancel_job', kwargs={'job_id': job.id}))
+
+    def test_cancels_pending_job(self):
+        job = self.create_job()
+        self.assertEqual(self.cancel(job).json()['status'], 'cancelled')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'cancelled')
+        self.assertIsNone(claim_next_job('worker-1'))
+
+    def test_cancel_during_run_is_kept(self):
+        job = self.create_job()
+        claimed = claim_next_job('worker-1')
+        # Cancelled after the worker loaded the job, e.g. while it builds a staging library
+        self.assertEqual(self.cancel(job).json()['status'], 'cancelling')
+
+        self.assertFalse(process_url_matcher_job(claimed))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'cancelled')
+        self.assertTrue(job.cancel_requested)
+
+    def test_finished_job_is_not_cancelled(self):
+        job = self.create_job(status='completed')
+        response = self.cancel(job)
+        self.assertEqual(response.status_code, 409)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed')
+        self.assertFalse(job.cancel_requested)
+
+
+class ResultCacheTest(MatcherTestCase):
+    """Repeat uploads are completed from the result cache by the worker, not in the request."""
+
+    def upload(self, **fields):
+        data = {'similarity_threshold': 0.7, 'report_format': 'csv', 'engine': 'exhaustive',
+                'assignment': 'best', 'workers': 1, **fields}
+        data['csv_file'] = SimpleUploadedFile('urls.csv', SAMPLE_CSV, content_type='text/csv')
+        self.client.post(reverse('matcher_app:upload_csv'), data)
+        return URLMatcherJob.objects.latest('created_at')
+
+    def run_next_job(self):
+        job = claim_next_job('worker-1')
+        process_url_matcher_job(job)
+        job.refresh_from_db()
+        return job
+
+    def test_repeat_upload_is_served_by_worker(self):
+        first = self.upload()
+        self.assertFalse(self.run_next_job().cache_hit)
+
+        repeat = self.upload()
+        # The upload request leaves hashing the CSV to the worker
+        self.assertEqual(repeat.status, 'pending')
+        self.assertEqual(repeat.cache_key, '')
+
+        repeat = self.run_next_job()
+        first.refresh_from_db()
+        self.assertEqual(repeat.status, 'completed')
+        self.assertTrue(repeat.cache_hit)
+        self.assertEqual(repeat.cache_key, first.cache_key)
+        self.assertEqual(repeat.partial_matches, first.partial_matches)
+        # The worker stores the matches, so viewing them doesn't parse the reports
+        self.assertEqual(sorted(repeat.match_results.values_list('live_url', 'staging_url', 'similarity', 'match_type')),
+                         sorted(first.match_results.values_list('live_url', 'staging_url', 'similarity', 'match_type')))
+
+    def test_settings_that_change_output_change_key(self):
+        self.upload()
+        first = self.run_next_job()
+        for setting in ({'URL_MATCHER_CSV_CHUNKSIZE': 2}, {'URL_MATCHER_KEEP_CANDIDATES': 0},
+                        {'URL_MATCHER_CANDIDATE_FLOOR': 0.5}):
+            with self.settings(**setting):
+                self.upload()
+                job = self.run_next_job()
+            self.assertFalse(job.cache_hit, setting)
+            self.assertNotEqual(job.cache_key, first.cache_key, setting)
+
+
+class MatchPageTest(MatcherTestCase):
+    """Keyset pages of a job's matches add up to its whole filtered, sorted match list."""
+
+    MATCH_TYPES = [MatchResult.EXACT, 'Partial - Path', 'Partial - Sequence', 'Partial - Substring']
+
+    def setUp(self):
+        super().setUp()
+        self.job = self.create_job(status='completed')
+        # Repeated similarities make the id tie-breaker matter
+        MatchResult.objects.bulk_create(
+            MatchResult(job=self.job, live_url=f'https://live/{i}', staging_url=f'https://staging/{i}',
+                        similarity=1.0 if i % 4 == 0 else 0.7 + (i % 3) / 10,
+                        match_type=self.MATCH_TYPES[i % 4])
+            for i in range(23))
+        self.create_job(status='completed').match_results.create(
+            live_url='https://other', staging_url='https://other', similarity=1.0, match_type=MatchResult.EXACT)
+
+    def get_all_pages(self, page_size=5, **params):
+        url = reverse('matcher_app:match_results', kwargs={'job_id': self.job.id})
+        results, after = [], None
+        while True:
+            query = {'page_size': page_size, **params, **({'after': after} if after else {})}
+            response = self.client.get(url, query)
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertLessEqual(len(page['results']), page_size)
+            results += [match['live_url'] for match in page['results']]
+            after = page['next']
+            if after is None:
+                return results
+
+    def expected(self, sort='file', match_filter=None):
+        matches = [match for match in self.job.match_results.all() if not match_filter or match_filter(match)]
+        if sort == 'file':
+            matches.sort(key=lambda match: match.id)
+        elif sort == 'similarity':
+            matches.sort(key=lambda match: (match.similarity, match.id))
+        else:
+            matches.sort(key=lambda match: (match.similarity, match.id), reverse=True)
+        return [match.live_url for match in matches]
+
+    def test_pages_follow_each_sort(self):
+        for sort in ('file', 'similarity', '-similarity'):
+            self.assertEqual(self.get_all_pages(sort=sort), self.expected(sort), sort)
+
+    def test_pages_apply_filters(self):
+        filters = [
+            ({'type': 'exact'}, lambda match: match.match_type == MatchResult.EXACT),
+            ({'type': 'partial'}, lambda match: match.match_type != MatchResult.EXACT),
+            ({'type': 'Partial - Path'}, lambda match: match.match_type == 'Partial - Path'),
+            ({'min_similarity': 0.8, 'max_similarity': 0.9}, lambda match: 0.8 <= match.similarity <= 0.9),
+        ]
+        for params, match_filter in filters:
+            for sort in ('file', 'similarity', '-similarity'):
+                self.assertEqual(self.get_all_pages(page_size=3, sort=sort, **params),
+                                 self.expected(sort, match_filter), (params, sort))
+
+    def test_invalid_parameters_are_rejected(self):
+        url = reverse('matcher_app:match_results', kwargs={'job_id': self.job.id})
+        for params in ({'after': 'x'}, {'sort': 'similarity', 'after': '0.5'}, {'sort': 'live_url'},
+                       {'page_size': 'all'}, {'min_similarity': 'high'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.json()['status'], 'error')
+
+
+class BudgetAbortTest(MatcherTestCase):
+    """A job stopped by its budget fails but keeps showing the results found until then."""
+
+    def test_results_of_stopped_job_are_shown(self):
+        def report_progress(matcher, stage, current=0, total=0):
+            # Stop once the exact matches are found, as a budget checkpoint would
+            if stage == 'partial':
+                raise MatchAborted('time_budget', "Job exceeded its time budget of 1 seconds")
+
+        job = self.create_job()
+        with mock.patch.object(URLMatcher, 'report_progress', report_progress):
+            self.assertFalse(process_url_matcher_job(claim_next_job('worker-1')))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('time budget', job.error_message)
+        self.assertTrue(job.summary_file)
+        self.assertEqual(job.match_results.count(), 1)
+
+        response = self.client.get(reverse('matcher_app:results', kwargs={'job_id': job.id}))
+        self.assertTemplateUsed(response, 'matcher_app/results.html')
+        self.assertContains(response, 'Partial results')
+        status = self.client.get(reverse('check_job_status', kwargs={'job_id': job.id})).json()
+        self.assertEqual(status['redirect'], reverse('matcher_app:results', kwargs={'job_id': job.id}))
+
+    def test_failed_job_without_results_shows_error(self):
+        job = self.create_job(status='failed', error_message='Boom')
+        response = self.client.get(reverse('matcher_app:results', kwargs={'job_id': job.id}))
+        self.assertTemplateUsed(response, 'matcher_app/error.html')
+
+
+class StagingLibraryJobTest(MatcherTestCase):
+    """Jobs match against a staging library built once, by the first job that needs it."""
+
+    def setUp(self):
+        super().setUp()
+        self.library = StagingLibrary(name='Example staging')
+        self.library.csv_file.save('staging.csv', ContentFile(SAMPLE_CSV), save=False)
+        self.library.save()
+        build = mock.patch.object(tasks.StagingLibrary, 'build_from_csv', wraps=tasks.StagingLibrary.build_from_csv)
+        self.build = build.start()
+        self.addCleanup(build.stop)
+
+    def run_job(self):
+        job = self.create_job(staging_library=self.library)
+        self.assertTrue(process_url_matcher_job(claim_next_job('worker-1')))
+        job.refresh_from_db()
+        return job
+
+    def test_matches_like_csv(self):
+        job = self.run_job()
+        self.library.refresh_from_db()
+        self.assertEqual(self.library.url_count, 4)
+        self.assertIsNotNone(self.library.built_at)
+
+        csv_job = self.create_job()
+        process_url_matcher_job(claim_next_job('worker-1'))
+        fields = ('live_url', 'staging_url', 'similarity', 'match_type')
+        self.assertEqual(sorted(job.match_results.values_list(*fields)),
+                         sorted(csv_job.match_results.values_list(*fields)))
+
+    def test_later_jobs_reuse_library(self):
+        self.run_job()
+        self.run_job()
+        self.assertEqual(self.build.call_count, 1)
+
+    def test_library_built_while_waiting_is_kept(self):
+        path = self.library.get_dir()
+
+        def flock(lock, operation):
+            # Another job builds the library while this one waits for the lock
+            if operation == fcntl.LOCK_EX:
+                tasks.StagingLibrary.build_from_csv(self.library.csv_file.path, path)
+
+        job = self.create_job(staging_library=self.library)
+        with mock.patch.object(tasks.fcntl, 'flock', side_effect=flock):
+            self.assertEqual(tasks.load_staging_library(job).path, path)
+        self.assertEqual(self.build.call_count, 1)
+
+
+class ReportFormatTest(MatcherTestCase):
+    """Matches stored from the reports of each format equal the matches of the run."""
+
+    FIELDS = ('live_url', 'staging_url', 'similarity', 'match_type')
+
+    def test_round_trip(self):
+        for report_format, _ in URLMatcherJob.REPORT_FORMAT_CHOICES:
+            with self.subTest(report_format):
+                try:
+                    check_report_format(report_format)
+                except ImportError as e:
+                    self.skipTest(str(e))
+                job = self.create_job(report_format=report_format)
+                self.assertTrue(process_url_matcher_job(claim_next_job('worker-1')))
+                job.refresh_from_db()
+                report_files = job.get_report_files()
+                self.assertIn('results', report_files)
+                for name, path in report_files.items():
+                    # The summary is text and the candidates are JSON in every format
+                    if name not in ('summary', 'candidates'):
+                        self.assertTrue(path.endswith(report_format), name)
+                        tasks.read_report_file(path)
+
+                stored = sorted(job.match_results.values_list(*self.FIELDS))
+                self.assertTrue(job.partial_matches)
+                self.assertEqual(len(stored), job.exact_matches + job.partial_matches)
+                job.match_results.all().delete()
+                self.assertEqual(tasks.import_match_result_files(job), len(stored))
+                self.assertEqual(sorted(job.match_results.values_list(*self.FIELDS)), stored)
+
+
+@skipIf(metrics.CollectorRegistry is None, "prometheus_client is not installed")
+class MetricsTest(MatcherTestCase):
+    """Job metrics are read from the job rows at scrape time."""
+
+    def scrape(self):
+        from prometheus_client.parser import text_string_to_metric_families
+
+        body, _ = metrics.render_metrics()
+        return {family.name: family for family in text_string_to_metric_families(body.decode())}
+
+    def test_job_metrics(self):
+        self.create_job()
+        self.create_job(status='completed', total_urls=4,
+                        stage_timings={'load': 0.2, 'partial': 2.0, 'recall': 0.4, 'report': 0.1, 'total': 2.7})
+        self.create_job(status='failed')
+        families = self.scrape()
+
+        finished = families['url_matcher_jobs_finished']
+        self.assertEqual(finished.type, 'gauge')
+        self.assertEqual({sample.labels['status']: sample.value for sample in finished.samples},
+                         {'completed': 1, 'failed': 1, 'cancelled': 0})
 
-# Create your tests here.
+        stages = {(sample.labels['stage'], sample.labels.get('le')): sample.value
+                  for sample in families['url_matcher_job_stage_duration_seconds'].samples}
+        self.assertEqual(stages[('recall', '0.5')], 1)
+        self.assertEqual(stages[('recall', '+Inf')], 1)
+        self.assertEqual(stages[('clean', '+Inf')], 0)
@@ -5,5 +5,9 @@ app_name = 'matcher_app'
 
 urlpatterns = [
     path('', views.upload_csv, name='upload_csv'),
+    path('libraries/', views.staging_libraries, name='staging_libraries'),
     path('results/<str:job_id>/', views.results, name='results'),
+    path('results/<str:job_id>/matches/', views.match_results, name='match_results'),
+    path('results/<str:job_id>/download/<str:report>/', views.download_report, name='download_report'),
+    path('results/<str:job_id>/rematch/', views.rematch_job, name='rematch_job'),
 ]
@@ -1,16 +1,22 @@
 import os
-import pandas as pd
-import threading
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
-from django.http import HttpResponse, JsonResponse
+from django.db import transaction
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
-from .forms import CSVUploadForm
-from .models import URLMatcherJob
-from .tasks import process_url_matcher_job
+from django.views.decorators.http import require_POST
+from .forms import CSVUploadForm, RematchForm, StagingLibraryForm
+from .metrics import render_metrics, track_latency
+from .models import MatchResult, StagingLibrary, URLMatcherJob
+from .tasks import import_match_result_files
 
+# Orders the matches of a job can be listed in; 'file' keeps the report order
+MATCH_RESULT_SORTS = ('file', 'similarity', '-similarity')
 
+
+@track_latency('upload_csv')
 @ensure_csrf_cookie
 @csrf_exempt
 def upload_csv(request):
@@ -21,15 +27,21 @@ def upload_csv(request):
         if form.is_valid():
             # Create a new job
             job = URLMatcherJob(
-                csv_file=request.FILES['csv_file'],
-                similarity_threshold=form.cleaned_data['similarity_threshold']
+                similarity_threshold=form.cleaned_data['similarity_threshold'],
+                workers=form.cleaned_data['workers'],
+                report_format=form.cleaned_data['report_format'],
+                engine=form.cleaned_data['engine'],
+                assignment=form.cleaned_data['assignment'],
+                staging_library=form.cleaned_data['staging_library'],
+                profile=form.cleaned_data['profile']
             )
-            job.save()
+            csv_file = request.FILES['csv_file']
+            job.csv_file.save(csv_file.name, csv_file, save=False)
             
-            # Process the job in a background thread
-            thread = threading.Thread(target=process_url_matcher_job, args=(job,))
-            thread.daemon = True
-            thread.start()
+            # Saved as pending; a run_matcher_worker process picks it up and serves
+            # it from the result cache if the same file was already matched with
+            # the same parameters, so large uploads aren't hashed in the request
+            job.save()
             
             # Redirect to results page
             return redirect(reverse('matcher_app:results', kwargs={'job_id': job.id}))
@@ -39,6 +51,7 @@ def upload_csv(request):
     return render(request, 'matcher_app/upload.html', {'form': form})
 
 
+@track_latency('results')
 def results(request, job_id):
     """View for displaying URL matcher results."""
     job = get_object_or_404(URLMatcherJob, id=job_id)
@@ -47,36 +60,289 @@ def results(request, job_id):
     if job.status == 'pending' or job.status == 'processing':
         return render(request, 'matcher_app/processing.html', {'job': job})
     
-    # Check if the job failed
-    if job.status == 'failed':
+    # Check if the job failed or was cancelled before any results were saved; a job
+    # stopped by its time or memory budget keeps the results found until then
+    if job.status in ('failed', 'cancelled') and not job.summary_file:
         return render(request, 'matcher_app/error.html', {'job': job})
     
+    ensure_match_results(job)
+    
+    try:
+        page = get_match_page(job, request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    
     # Load the results data
     results_data = {
         'job': job,
         'summary': job.get_summary_content(),
+        'report_files': [(name, name.replace('_', ' ').capitalize()) for name in job.get_report_files()],
+        'matches': page['matches'],
+        'filters': page['filters'],
+        'match_type_options': ['exact', 'partial'] + sorted(job.match_type_counts),
+        'sort_options': MATCH_RESULT_SORTS,
+        'show_matches': any(key in request.GET for key in page['filters']) or 'after' in request.GET,
+        'first_query': None,
+        'next_query': None,
+        'rematch_form': RematchForm(initial={'similarity_threshold': job.similarity_threshold}),
     }
     
-    # Load exact matches
-    if job.exact_matches_file and os.path.exists(job.exact_matches_file):
-        exact_matches_df = pd.read_csv(job.exact_matches_file)
-        results_data['exact_matches'] = exact_matches_df.to_dict('records')
-    
-    # Load partial matches
-    if job.partial_matches_file and os.path.exists(job.partial_matches_file):
-        partial_matches_df = pd.read_csv(job.partial_matches_file)
-        results_data['partial_matches'] = partial_matches_df.to_dict('records')
+    # Keyset pagination links keep the current filters
+    query = request.GET.copy()
+    if 'after' in query:
+        query.pop('after')
+        results_data['first_query'] = query.urlencode()
+    if page['next']:
+        query['after'] = page['next']
+        results_data['next_query'] = query.urlencode()
     
     return render(request, 'matcher_app/results.html', results_data)
 
 
+@require_POST
+def rematch_job(request, job_id):
+    """
+    Re-match a completed job at a new threshold, optionally with rows added to its CSV.
+    
+    The new job reuses the scored candidates the base job kept, so only
+    pairs the candidates can't decide and the added rows are scored again.
+    """
+    base_job = get_object_or_404(URLMatcherJob, id=job_id)
+    if base_job.status != 'completed':
+        return HttpResponseBadRequest("Only completed jobs can be re-matched")
+    
+    form = RematchForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+    
+    job = URLMatcherJob(
+        base_job=base_job,
+        csv_file=base_job.csv_file.name,
+        similarity_threshold=form.cleaned_data['similarity_threshold'],
+        workers=base_job.workers,
+        report_format=base_job.report_format,
+        engine=base_job.engine,
+        assignment=base_job.assignment,
+        staging_library=base_job.staging_library
+    )
+    delta_file = form.cleaned_data['delta_file']
+    if delta_file:
+        # The worker appends the rows to the base job's CSV before matching
+        job.delta_file.save(delta_file.name, delta_file, save=False)
+    job.save()
+    
+    return redirect(reverse('matcher_app:results', kwargs={'job_id': job.id}))
+
+
+def staging_libraries(request):
+    """
+    List the staging libraries and upload new ones.
+    
+    An uploaded library is cleaned and indexed by the worker that runs the
+    first job using it.
+    """
+    if request.method == 'POST':
+        form = StagingLibraryForm(request.POST, request.FILES)
+        if form.is_valid():
+            library = StagingLibrary(name=form.cleaned_data['name'])
+            csv_file = request.FILES['csv_file']
+            library.csv_file.save(csv_file.name, csv_file, save=False)
+            library.save()
+            return redirect(reverse('matcher_app:staging_libraries'))
+    else:
+        form = StagingLibraryForm()
+    
+    return render(request, 'matcher_app/staging_libraries.html', {
+        'form': form,
+        'libraries': StagingLibrary.objects.order_by('name'),
+    })
+
+
+def ensure_match_results(job):
+    """Store the matches of jobs that finished before matches were kept in the database."""
+    if job.status in ('completed', 'cancelled') and (job.exact_matches or job.partial_matches) \
+            and not job.match_results.exists():
+        with transaction.atomic():
+            # Lock the job so concurrent first views import its matches once
+            URLMatcherJob.objects.select_for_update().get(pk=job.pk)
+            if not job.match_results.exists():
+                import_match_result_files(job)
+
+
+def _float_param(params, name):
+    """Get an optional float query parameter."""
+    value = params.get(name, '')
+    if value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number")
+
+
+def get_match_page(job, params):
+    """
+    Get one page of a job's matches.
+    
+    Pages are found with keyset pagination: the 'after' cursor holds the sort
+    key of the last match of the previous page, so every page is a single
+    index range scan regardless of how deep into the results it is.
+    
+    Args:
+        job: URLMatcherJob instance
+        params: Query parameters: type ('exact', 'partial' or a match type),
+            min_similarity, max_similarity, sort (one of MATCH_RESULT_SORTS),
+            page_size and after
+    
+    Returns:
+        dict: matches, the applied filters and the cursor of the next page (None on the last page)
+    
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    queryset = job.match_results.all()
+    
+    match_type = params.get('type', '')
+    if match_type == 'exact':
+        queryset = queryset.filter(match_type=MatchResult.EXACT)
+    elif match_type == 'partial':
+        queryset = queryset.exclude(match_type=MatchResult.EXACT)
+    elif match_type:
+        queryset = queryset.filter(match_type=match_type)
+    
+    min_similarity = _float_param(params, 'min_similarity')
+    if min_similarity is not None:
+        queryset = queryset.filter(similarity__gte=min_similarity)
+    max_similarity = _float_param(params, 'max_similarity')
+    if max_similarity is not None:
+        queryset = queryset.filter(similarity__lte=max_similarity)
+    
+    sort = params.get('sort') or 'file'
+    if sort not in MATCH_RESULT_SORTS:
+        raise ValueError(f"sort must be one of: {', '.join(MATCH_RESULT_SORTS)}")
+    
+    try:
+        page_size = int(params.get('page_size') or settings.URL_MATCHER_RESULTS_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("page_size must be an integer")
+    page_size = max(1, min(page_size, settings.URL_MATCHER_RESULTS_MAX_PAGE_SIZE))
+    
+    after = params.get('after', '')
+    try:
+        if sort == 'file':
+            queryset = queryset.order_by('id')
+            if after:
+                queryset = queryset.filter(id__gt=int(after))
+        else:
+            if after:
+                last_similarity, _, last_id = after.partition(':')
+                last_similarity, last_id = float(last_similarity), int(last_id)
+            if sort == 'similarity':
+                queryset = queryset.order_by('similarity', 'id')
+                if after:
+                    queryset = queryset.filter(Q(similarity__gt=last_similarity) |
+                                               Q(similarity=last_similarity, id__gt=last_id))
+            else:
+                queryset = queryset.order_by('-similarity', '-id')
+                if after:
+                    queryset = queryset.filter(Q(similarity__lt=last_similarity) |
+                                               Q(similarity=last_similarity, id__lt=last_id))
+    except ValueError:
+        raise ValueError("Invalid after cursor")
+    
+    # Fetch one extra match to know whether there is a next page
+    matches = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(matches) > page_size:
+        matches = matches[:page_size]
+        last = matches[-1]
+        next_cursor = str(last.id) if sort == 'file' else f"{last.similarity!r}:{last.id}"
+    
+    return {
+        'matches': matches,
+        'filters': {
+            'type': match_type,
+            'min_similarity': min_similarity,
+            'max_similarity': max_similarity,
+            'sort': sort,
+            'page_size': page_size,
+        },
+        'next': next_cursor,
+    }
+
+
+def match_results(request, job_id):
+    """JSON endpoint serving a page of a job's matches (see get_match_page)."""
+    try:
+        job = URLMatcherJob.objects.get(id=job_id)
+    except URLMatcherJob.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+    
+    ensure_match_results(job)
+    
+    try:
+        page = get_match_page(job, request.GET)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    return JsonResponse({
+        'status': job.status,
+        'filters': page['filters'],
+        'results': [match.to_dict() for match in page['matches']],
+        'next': page['next'],
+    })
+
+
+def download_report(request, job_id, report):
+    """Download one of a job's report files as written, in the job's report format."""
+    job = get_object_or_404(URLMatcherJob, id=job_id)
+    path = job.get_report_files().get(report)
+    if path is None:
+        raise Http404("Report not found")
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+
+
+@track_latency('check_job_status')
 def check_job_status(request, job_id):
     """AJAX endpoint to check job status."""
     try:
         job = URLMatcherJob.objects.get(id=job_id)
         return JsonResponse({
             'status': job.status,
-            'redirect': reverse('matcher_app:results', kwargs={'job_id': job.id}) if job.status == 'completed' else None
+            'progress': job.get_progress(),
+            'redirect': reverse('matcher_app:results', kwargs={'job_id': job.id})
+                        if job.status == 'completed' or job.summary_file else None
         })
     except URLMatcherJob.DoesNotExist:
         return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+
+
+@require_POST
+def cancel_job(request, job_id):
+    """AJAX endpoint to cancel a pending or running job."""
+    try:
+        job = URLMatcherJob.objects.get(id=job_id)
+    except URLMatcherJob.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+    
+    # Pending jobs are cancelled outright; running jobs stop at their next checkpoint
+    if URLMatcherJob.objects.filter(pk=job.pk, status='pending').update(status='cancelled', cancel_requested=True):
+        return JsonResponse({'status': 'cancelled'})
+    if URLMatcherJob.objects.filter(pk=job.pk, status='processing').update(cancel_requested=True):
+        return JsonResponse({'status': 'cancelling'})
+    
+    job.refresh_from_db()
+    return JsonResponse({'status': job.status, 'message': 'Job is no longer running'}, status=409)
+
+
+def metrics(request):
+    """Prometheus metrics of the web service and the job pipeline (see matcher_app.metrics)."""
+    token = settings.URL_MATCHER_METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    
+    try:
+        body, content_type = render_metrics()
+    except ImportError as e:
+        return HttpResponse(str(e), status=503, content_type='text/plain')
+    return HttpResponse(body, content_type=content_type)
@@ -129,6 +129,63 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Directory for URL matcher output
 URL_MATCHER_OUTPUT_DIR = os.path.join(MEDIA_ROOT, 'url_matcher_output')
 
+# Upper bound on the partial matching processes a single job may use
+URL_MATCHER_MAX_WORKERS = int(os.environ.get('URL_MATCHER_MAX_WORKERS', os.cpu_count() or 1))
+
+# Stream uploaded CSVs in chunks of this many rows (0 reads them whole). Chunked
+# loading bounds memory on very large uploads, but its reports keep only the Live
+# and Staging URL columns, so it is off unless set
+URL_MATCHER_CSV_CHUNKSIZE = int(os.environ.get('URL_MATCHER_CSV_CHUNKSIZE', 0))
+
+# Job queue: jobs a run_matcher_worker process runs at once, how often it polls
+# for new jobs, and when a job whose worker stopped sending heartbeats is retried
+URL_MATCHER_WORKER_CONCURRENCY = int(os.environ.get('URL_MATCHER_WORKER_CONCURRENCY', 2))
+URL_MATCHER_WORKER_POLL_SECONDS = float(os.environ.get('URL_MATCHER_WORKER_POLL_SECONDS', 2))
+URL_MATCHER_JOB_STALE_SECONDS = int(os.environ.get('URL_MATCHER_JOB_STALE_SECONDS', 300))
+URL_MATCHER_JOB_MAX_ATTEMPTS = int(os.environ.get('URL_MATCHER_JOB_MAX_ATTEMPTS', 3))
+
+# Minimum seconds between two progress writes of a running job
+URL_MATCHER_PROGRESS_INTERVAL_SECONDS = float(os.environ.get('URL_MATCHER_PROGRESS_INTERVAL_SECONDS', 2))
+
+# Minimum seconds between two checks of a running job's cancel flag
+URL_MATCHER_CANCEL_CHECK_SECONDS = float(os.environ.get('URL_MATCHER_CANCEL_CHECK_SECONDS', 2))
+
+# Per-job budgets; a job over budget stops with the results found so far (0 disables)
+URL_MATCHER_JOB_MAX_SECONDS = float(os.environ.get('URL_MATCHER_JOB_MAX_SECONDS', 3600))
+URL_MATCHER_JOB_MAX_MEMORY_MB = float(os.environ.get('URL_MATCHER_JOB_MAX_MEMORY_MB', 0))
+
+# Default format of the report files (csv, csv.gz, csv.zst or parquet)
+URL_MATCHER_REPORT_FORMAT = os.environ.get('URL_MATCHER_REPORT_FORMAT', 'csv')
+
+# Live URLs an lsh job also matches against every Staging URL to estimate its
+# recall (0 disables); the sample is scanned after partial matching, adding to its time
+URL_MATCHER_LSH_RECALL_SAMPLE = int(os.environ.get('URL_MATCHER_LSH_RECALL_SAMPLE', 0))
+
+# Top-scoring Staging URL candidates kept per Live URL (0 disables), scored down to
+# CANDIDATE_FLOOR, so a job can be re-matched at any threshold >= the floor or with
+# added rows without rescoring every pair
+URL_MATCHER_KEEP_CANDIDATES = int(os.environ.get('URL_MATCHER_KEEP_CANDIDATES', 5))
+URL_MATCHER_CANDIDATE_FLOOR = float(os.environ.get('URL_MATCHER_CANDIDATE_FLOOR', 0.6))
+
+# Results of completed jobs are reused by uploads of the same file with the same
+# parameters; entries unused for MAX_AGE_DAYS are evicted, then the least recently
+# used ones while the cache is over MAX_MB (0 disables the cache)
+URL_MATCHER_RESULT_CACHE_DIR = os.path.join(MEDIA_ROOT, 'url_matcher_cache')
+URL_MATCHER_RESULT_CACHE_MAX_AGE_DAYS = float(os.environ.get('URL_MATCHER_RESULT_CACHE_MAX_AGE_DAYS', 30))
+URL_MATCHER_RESULT_CACHE_MAX_MB = float(os.environ.get('URL_MATCHER_RESULT_CACHE_MAX_MB', 2048))
+
+# Staging URL sets uploaded once and shared by jobs are cleaned and indexed into
+# memory-mappable files here
+URL_MATCHER_STAGING_LIBRARY_DIR = os.path.join(MEDIA_ROOT, 'staging_libraries')
+
+# Matches are stored in the database in batches of this size and served in pages
+URL_MATCHER_RESULT_BATCH_SIZE = int(os.environ.get('URL_MATCHER_RESULT_BATCH_SIZE', 5000))
+URL_MATCHER_RESULTS_PAGE_SIZE = int(os.environ.get('URL_MATCHER_RESULTS_PAGE_SIZE', 100))
+URL_MATCHER_RESULTS_MAX_PAGE_SIZE = int(os.environ.get('URL_MATCHER_RESULTS_MAX_PAGE_SIZE', 1000))
+
+# Bearer token required to scrape /metrics (empty leaves the endpoint open)
+URL_MATCHER_METRICS_TOKEN = os.environ.get('URL_MATCHER_METRICS_TOKEN', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -19,12 +19,14 @@ from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
-from matcher_app.views import check_job_status
+from matcher_app.views import cancel_job, check_job_status, metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('matcher_app.urls')),
     path('check-job-status/<str:job_id>/', check_job_status, name='check_job_status'),
+    path('cancel-job/<str:job_id>/', cancel_job, name='cancel_job'),
+    path('metrics', metrics, name='metrics'),
     # Handle favicon.ico requests
     re_path(r'^favicon\.ico$', RedirectView.as_view(url='/static/matcher_app/img/favicon.ico', permanent=True)),
 ]